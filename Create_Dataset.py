@@ -1,12 +1,21 @@
 # Overview: use both Oireachtas and Wikipedia to seed dataset. 
 import pandas as pd
-path = "C:/Users/josep/VS-code-projects/Oireachtas_Collect_Analyse/debates_all_2020-01-01_to_2025-01-01.csv"
+from oireachtas_parquet import INPUT_CSV, PARQUET_DIR, parquet_available
+N_ROWS = 100_000  # Limit to 100k ga rows for testing
+SEED = 42
 
-df = pd.read_csv(path, encoding="utf-8", nrows=100_000)  # Limit to 100k rows for testing
+if parquet_available(PARQUET_DIR):
+    # ga partition + text column only (see oireachtas_parquet.py)
+    df = pd.read_parquet(PARQUET_DIR, columns=["text"], filters=[("lang", "==", "ga")])
+    texts = df['text']
+else:
+    # same source (debates_all_with_lang.csv) and filter as the Parquet branch
+    texts = pd.concat(
+        chunk.loc[chunk['lang'] == 'ga', 'text']  # filter by 'lang' == 'ga'
+        for chunk in pd.read_csv(INPUT_CSV, usecols=["lang", "text"], encoding="utf-8", chunksize=N_ROWS)
+    )
 
-# filter by 'lang' == 'ga'
-#df_ga = df[df['lang'] == 'ga']
-df_ga_txt = df['text'].tolist()
+# random rows, not the head: the Parquet rows are grouped by text length
+df_ga_txt = texts.sample(n=min(N_ROWS, len(texts)), random_state=SEED).tolist()
 
 print(df_ga_txt[:5])  # Print first 5 entries for debugging
-
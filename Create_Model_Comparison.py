@@ -1,26 +1,44 @@
 # generate_pairs.py
 # JSON-native, using OpenAI structured outputs, Anthropic tools (input_schema),
 # and the new Google GenAI SDK (google-genai) with GenerateContentConfig.
-
+# All (model, source, chunk) jobs run concurrently on asyncio with the async
+# SDK clients, capped per provider and per model; rows are queued to a single
+# batching writer thread (batch_writer.py) as each job completes.
+# --batch sends the same jobs through the provider batch APIs instead
+# (provider_batch.py): submit, poll with checkpointed job ids, ingest.
+
+import argparse
+import asyncio
 import csv
+import hashlib
 import json
 import random
 import time
 import uuid
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Dict, List
 
 # --- Provider SDKs (install as needed) ---
-from openai import OpenAI
+from openai import AsyncOpenAI
 import anthropic
 from google import genai
 from google.genai import types
 
+from batch_writer import BatchWriter, repair_tail
+from llm_cache import CacheMiss, ResponseCache, add_cache_args
+import hedging
+import llm_clients
+import llm_ledger
+import provider_batch
+from rate_limiter import DEFAULT_MAX_OUTPUT, acquire_async, limiter_stats, on_error, record_usage
+
 # ================== CONFIG (edit here) ==================
 N_PER_MODEL_PER_SOURCE = 2  
+SAMPLES_PER_REQUEST = 1  # candidate pairs per (model, chunk) request; --samples
 SEED_DIR = Path("./seed_data")
 OUT_DIR = Path("./outputs")
 OUT_CSV = OUT_DIR / "pairs.csv"
+BATCH_CHECKPOINT = OUT_DIR / "batch_jobs.json"  # --batch job ids, for resuming
 
 # Models to run
 OPENAI_MODELS = ["gpt-5", "gpt-5-mini"]
@@ -58,6 +76,11 @@ Return strict JSON with exactly:
 MAX_RETRIES = 2
 RETRY_SLEEP_SEC = 2.0
 RANDOM_SEED = 42
+
+# Concurrency caps: in-flight requests per provider, and per model within it
+PROVIDER_CONCURRENCY = {"openai": 16, "anthropic": 8, "google": 16}
+MODEL_CONCURRENCY = 4
+MODEL_CONCURRENCY_OVERRIDES: Dict[str, int] = {}  # e.g. {"gemini-2.5-flash": 8}
 # =======================================================
 
 random.seed(RANDOM_SEED)
@@ -98,18 +121,57 @@ def build_prompt(chunk_text: str) -> str:
     return PROMPT_TEMPLATE.format(TEXT=chunk_text)
 
 
-def ensure_outfile():
+OUT_COLUMNS = ["run_id", "model", "source_type", "instruction", "response", "text", "text_hash", "sample_idx"]
+
+
+def sha1_short(t: str, length: int = 16) -> str:
+    # same text_hash as combined_LLM_annotation.py
+    return hashlib.sha1(t.encode("utf-8")).hexdigest()[:length]
+
+
+def ensure_outfile() -> BatchWriter:
+    """Create/repair/migrate OUT_CSV and return the writer appending to it."""
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     if not OUT_CSV.exists():
         with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
-            w.writerow(["run_id", "model", "source_type", "instruction", "response", "text"])
-
-
-def append_row(run_id, model, source_type, instruction, response, chunk):
-    with open(OUT_CSV, "a", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow([run_id, model, source_type, instruction, response, chunk])
+            w.writerow(OUT_COLUMNS)
+        return BatchWriter(OUT_CSV, repair=False)
+    repair_tail(OUT_CSV)  # drop a torn final row from a crashed run
+    with open(OUT_CSV, "r", newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    if header != OUT_COLUMNS:
+        # one-time migration of pre-index files: add text_hash / sample_idx
+        import pandas as pd
+        df = pd.read_csv(OUT_CSV, dtype=str, keep_default_na=False)
+        df["text_hash"] = df["text"].map(sha1_short)
+        df["sample_idx"] = "0"
+        tmp = OUT_CSV.with_suffix(".tmp.csv")
+        df[OUT_COLUMNS].to_csv(tmp, index=False)
+        tmp.replace(OUT_CSV)
+        print(f"Migrated {OUT_CSV} to columns {OUT_COLUMNS} ({len(df)} rows)")
+    return BatchWriter(OUT_CSV, repair=False)
+
+
+def append_row(writer: BatchWriter, run_id, model, source_type, instruction, response, chunk, sample_idx=0):
+    writer.put([run_id, model, source_type, instruction, response, chunk, sha1_short(chunk), sample_idx])
+
+
+def load_completed() -> set:
+    """
+    (model, source_type, text_hash, sample_idx) keys already in OUT_CSV.
+    Only the four short key columns are materialized (pyarrow's multithreaded
+    reader when available), so this stays cheap for multi-million-row files.
+    """
+    if not OUT_CSV.exists():
+        return set()
+    import pandas as pd
+    cols = ["model", "source_type", "text_hash", "sample_idx"]
+    try:
+        df = pd.read_csv(OUT_CSV, usecols=cols, dtype=str, engine="pyarrow")
+    except ImportError:
+        df = pd.read_csv(OUT_CSV, usecols=cols, dtype=str)
+    return set(zip(df["model"], df["source_type"], df["text_hash"], df["sample_idx"].astype(int)))
 
 
 # ----------------------- Structured Output Schemas -----------------------
@@ -144,54 +206,116 @@ ANTHROPIC_TOOL = {
 }
 
 
-# ----------------------- Provider Calls (return dict) -----------------------
-def call_openai(client: OpenAI, model: str, prompt: str) -> Optional[Dict[str, str]]:
+# Cache-key schema/temperature per provider (llm_cache.py)
+CACHE_SCHEMA = {
+    "openai": INSTRUCTION_PAIR_SCHEMA_DICT,
+    "anthropic": ANTHROPIC_TOOL,
+    "google": INSTRUCTION_PAIR_SCHEMA_DICT["schema"],
+}
+CACHE_TEMPERATURE = {"openai": 1, "anthropic": 1, "google": None}
+
+
+# Multi-sample (--samples k): k candidate pairs from one request, via OpenAI
+# n, Gemini candidate_count, and for Anthropic (no n parameter) a tool whose
+# input is an array of k pairs. Candidate j is written with sample_idx j.
+ANTHROPIC_MULTI_TOOL = {
+    "name": "record_instruction_pairs",
+    "description": "Return several distinct instruction / Irish response pairs as JSON.",
+    "input_schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {"pairs": {"type": "array", "items": ANTHROPIC_TOOL["input_schema"]}},
+        "required": ["pairs"]
+    }
+}
+ANTHROPIC_MULTI_SUFFIX = (
+    "\nReturn {k} distinct instruction–response pairs (different facts or question types) "
+    "as the \"pairs\" array of the tool call.\n"
+)
+
+
+def valid_pair(data) -> bool:
+    return isinstance(data, dict) and bool(data.get("instruction") and data.get("response"))
+
+
+def cache_key(cache: ResponseCache, provider: str, model: str, prompt: str, k: int) -> str:
+    # k == 1 keeps the original key (and a single-dict value) so earlier entries still hit
+    extra = {"n": k} if k > 1 else {}
+    return cache.key(provider, model, prompt, CACHE_SCHEMA[provider], CACHE_TEMPERATURE[provider],
+                     sample_idx=0, **extra)
+
+
+# ----------------------- Provider Calls (return list of dicts) -----------------------
+async def call_openai(client: AsyncOpenAI, model: str, prompt: str, k: int = 1) -> List[Dict[str, str]]:
     for attempt in range(1 + MAX_RETRIES):
         try:
-            r = client.chat.completions.create(
+            est = await acquire_async("openai", model, prompt, DEFAULT_MAX_OUTPUT * k)
+            hedging.mark_started()
+            t0 = time.perf_counter()
+            r = await client.chat.completions.create(
                 model=model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=1,
                 response_format={"type": "json_schema", "json_schema": INSTRUCTION_PAIR_SCHEMA_DICT},
+                **({"n": k} if k > 1 else {}),
             )
-            msg = r.choices[0].message
-            data = getattr(msg, "parsed", None)
-            if data is None:
-                data = json.loads(msg.content)
-            if isinstance(data, dict) and data.get("instruction") and data.get("response"):
-                return data
-            return None
-        except Exception:
+            usage = record_usage("openai", model, est, r)
+            out = []
+            for choice in r.choices:
+                data = getattr(choice.message, "parsed", None)
+                if data is None:
+                    data = json.loads(choice.message.content)
+                if valid_pair(data):
+                    out.append(data)
+            llm_ledger.record("generate", "openai", model, usage, time.perf_counter() - t0, attempt, bool(out),
+                              accepted=len(out))
+            return out
+        except Exception as e:
+            llm_ledger.record("generate", "openai", model, attempt=attempt, ok=False)
             if attempt >= MAX_RETRIES:
                 raise
-            time.sleep(RETRY_SLEEP_SEC)
+            await asyncio.sleep(on_error("openai", model, e, RETRY_SLEEP_SEC))
 
 
-def call_anthropic(anthro_client: anthropic.Anthropic, model: str, prompt: str) -> Optional[Dict[str, str]]:
+async def call_anthropic(anthro_client: anthropic.AsyncAnthropic, model: str, prompt: str,
+                         k: int = 1) -> List[Dict[str, str]]:
+    tool = ANTHROPIC_TOOL if k == 1 else ANTHROPIC_MULTI_TOOL
+    if k > 1:
+        prompt = prompt + ANTHROPIC_MULTI_SUFFIX.format(k=k)
     for attempt in range(1 + MAX_RETRIES):
         try:
-            r = anthro_client.messages.create(
+            est = await acquire_async("anthropic", model, prompt, DEFAULT_MAX_OUTPUT * k)
+            hedging.mark_started()
+            t0 = time.perf_counter()
+            r = await anthro_client.messages.create(
                 model=model,
                 temperature=1,
-                tools=[ANTHROPIC_TOOL],
-                tool_choice={"type": "tool", "name": "record_instruction_pair"},
+                tools=[tool],
+                tool_choice={"type": "tool", "name": tool["name"]},
                 messages=[{"role": "user", "content": prompt}],
-                max_tokens=800,
+                max_tokens=800 * k,
             )
-            # Find the tool_use block and return its input as dict
+            usage = record_usage("anthropic", model, est, r)
+            dt = time.perf_counter() - t0
+            # Find the tool_use block and return its input as dict(s)
+            out = []
             for block in r.content:
-                if getattr(block, "type", "") == "tool_use" and getattr(block, "name", "") == "record_instruction_pair":
+                if getattr(block, "type", "") == "tool_use" and getattr(block, "name", "") == tool["name"]:
                     data = getattr(block, "input", {}) or {}
-                    if isinstance(data, dict) and data.get("instruction") and data.get("response"):
-                        return data
-            return None
-        except Exception:
+                    items = [data] if k == 1 else (data.get("pairs") or [] if isinstance(data, dict) else [])
+                    out = [d for d in items if valid_pair(d)][:k]
+                    break
+            llm_ledger.record("generate", "anthropic", model, usage, dt, attempt, bool(out),
+                              accepted=len(out))
+            return out
+        except Exception as e:
+            llm_ledger.record("generate", "anthropic", model, attempt=attempt, ok=False)
             if attempt >= MAX_RETRIES:
                 raise
-            time.sleep(RETRY_SLEEP_SEC)
+            await asyncio.sleep(on_error("anthropic", model, e, RETRY_SLEEP_SEC))
 
 
-def call_google(client: genai.Client, model: str, prompt: str):
+async def call_google(client: genai.Client, model: str, prompt: str, k: int = 1) -> List[Dict[str, str]]:
     obj_schema = types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -202,34 +326,215 @@ def call_google(client: genai.Client, model: str, prompt: str):
     cfg = types.GenerateContentConfig(
         response_mime_type="application/json",
         response_schema=obj_schema,
+        **({"candidate_count": k} if k > 1 else {}),
     )
 
     for attempt in range(1 + MAX_RETRIES):
         try:
-            r = client.models.generate_content(model=model, contents=prompt, config=cfg)
-            data = json.loads(r.text) if getattr(r, "text", None) else {}
-            if isinstance(data, dict) and data.get("instruction") and data.get("response"):
-                return data
-            return None
-        except Exception:
+            est = await acquire_async("google", model, prompt, DEFAULT_MAX_OUTPUT * k)
+            hedging.mark_started()
+            t0 = time.perf_counter()
+            r = await client.aio.models.generate_content(model=model, contents=prompt, config=cfg)
+            usage = record_usage("google", model, est, r)
+            if k == 1:
+                texts = [r.text] if getattr(r, "text", None) else []
+            else:
+                texts = ["".join(p.text or "" for p in (c.content.parts or []))
+                         for c in (r.candidates or []) if c.content]
+            out = [d for d in (json.loads(t) for t in texts if t) if valid_pair(d)]
+            llm_ledger.record("generate", "google", model, usage, time.perf_counter() - t0, attempt, bool(out),
+                              accepted=len(out))
+            return out
+        except Exception as e:
+            llm_ledger.record("generate", "google", model, attempt=attempt, ok=False)
             if attempt >= MAX_RETRIES: raise
-            time.sleep(RETRY_SLEEP_SEC)
+            await asyncio.sleep(on_error("google", model, e, RETRY_SLEEP_SEC))
+
+
+# ----------------------- Concurrent engine ----------------------
+def build_jobs(selected: Dict[str, list], completed: set = frozenset(), k: int = 1) -> list:
+    """
+    One job per (provider, model, source_type, chunk index, chunk), skipping
+    chunks whose k samples are all in the completed-work index.
+    """
+    jobs = []
+    for provider, models in (("google", GOOGLE_MODELS), ("openai", OPENAI_MODELS), ("anthropic", ANTHROPIC_MODELS)):
+        for model in models:
+            for source_type, chunk_list in selected.items():
+                for i, chunk in enumerate(chunk_list, 1):
+                    h = sha1_short(chunk)
+                    if all((model, source_type, h, j) in completed for j in range(k)):
+                        continue
+                    jobs.append((provider, model, source_type, i, chunk))
+    return jobs
+
+
+def write_samples(writer: BatchWriter, job: tuple, samples: List[Dict[str, str]], completed: set) -> int:
+    """Append candidates not already in the index as rows with sample_idx; returns rows written."""
+    provider, model, source_type, i, chunk = job
+    h = sha1_short(chunk)
+    n = 0
+    for j, data in enumerate(samples):
+        key = (model, source_type, h, j)
+        if key in completed:
+            continue
+        rid = f"{uuid.uuid4().hex[:8]}-{model}-{source_type}-{i}" + (f"-s{j}" if j else "")
+        append_row(writer, rid, model, source_type, data["instruction"], data["response"], chunk, j)
+        completed.add(key)
+        n += 1
+    return n
+
+
+async def run_jobs(jobs: list, clients: Dict[str, object], cache: ResponseCache,
+                   writer: BatchWriter, completed: set, k: int = 1) -> Dict[str, int]:
+    calls = {"openai": call_openai, "anthropic": call_anthropic, "google": call_google}
+    provider_sems = {p: asyncio.Semaphore(n) for p, n in PROVIDER_CONCURRENCY.items()}
+    model_sems: Dict[str, asyncio.Semaphore] = {}
+    for _, model, *_ in jobs:
+        if model not in model_sems:
+            model_sems[model] = asyncio.Semaphore(MODEL_CONCURRENCY_OVERRIDES.get(model, MODEL_CONCURRENCY))
+
+    async def one(job):
+        provider, model, source_type, i, chunk = job
+        prompt = build_prompt(chunk)
+        key = cache_key(cache, provider, model, prompt, k)
+        data = cache.get(key)  # raises CacheMiss in replay mode
+        if isinstance(data, dict):
+            return job, [data]
+        if data is not None and (len(data) >= k or cache.replay):
+            # a short list (cached before complete lists only were kept) is refetched
+            return job, data
+        call = calls[provider]
+        attempts = 0
+
+        async def attempt():
+            nonlocal attempts
+            attempts += 1
+            # a hedge duplicate takes its own slot, so the caps hold with hedging on
+            async with model_sems[model], provider_sems[provider]:
+                return await call(clients[provider], model, prompt, k)
+
+        # past the model's p95 latency a duplicate races the straggler
+        data = await hedging.hedged_async((provider, model), attempt)
+        if not data and attempts == 1:
+            # empty / invalid structured reply and no hedge ran: one more try
+            data = await attempt()
+        if data and len(data) >= k:
+            # partial lists are not cached, so a rerun can fill the missing sample_idx
+            cache.put(key, data[0] if k == 1 else data, provider, model)
+        return job, data
+
+    stats = {"written": 0, "empty": 0, "failed": 0, "cache_miss": 0}
+    t0 = time.perf_counter()
+    finished = 0
+    for fut in asyncio.as_completed([one(job) for job in jobs]):
+        finished += 1
+        try:
+            job, samples = await fut
+        except CacheMiss:
+            stats["cache_miss"] += 1
+            continue
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"[WARN] job failed: {e}")
+            continue
+        if samples:
+            stats["written"] += write_samples(writer, job, samples, completed)
+        else:
+            stats["empty"] += 1
+        if finished % 20 == 0 or finished == len(jobs):
+            print(f"[{finished}/{len(jobs)}] {time.perf_counter() - t0:.0f}s elapsed")
+    return stats
+
+
+# ----------------------- Batch mode ----------------------
+def batch_request(provider: str, model: str, prompt: str) -> dict:
+    """Batch-API request body equivalent to the live call_* request."""
+    if provider == "openai":
+        return provider_batch.openai_body(
+            model, prompt, temperature=1,
+            response_format={"type": "json_schema", "json_schema": INSTRUCTION_PAIR_SCHEMA_DICT})
+    if provider == "anthropic":
+        return provider_batch.anthropic_params(
+            model, prompt, temperature=1, max_tokens=800, tools=[ANTHROPIC_TOOL],
+            tool_choice={"type": "tool", "name": "record_instruction_pair"})
+    return provider_batch.google_request(prompt, {
+        "responseMimeType": "application/json",
+        "responseSchema": {"type": "OBJECT", "properties": {
+            "instruction": {"type": "STRING"}, "response": {"type": "STRING"}}},
+    })
+
+
+def run_batch(jobs: list, clients: Dict[str, object], cache: ResponseCache, writer: BatchWriter,
+              completed: set, poll_sec: float) -> Dict[str, int]:
+    groups: Dict[tuple, list] = {}
+    lookup = {}
+    for job in jobs:
+        provider, model, source_type, i, chunk = job
+        cid = f"{source_type.lower()}-{sha1_short(chunk)}-0"
+        groups.setdefault((provider, model), []).append((cid, batch_request(provider, model, build_prompt(chunk))))
+        lookup[(model, cid)] = job
+
+    stats = {"written": 0, "empty": 0, "failed": 0, "cache_miss": 0}
+
+    def on_result(provider, model, cid, data, error):
+        job = lookup.get((model, cid))
+        if job is None:
+            return  # from a batch submitted for chunks no longer selected
+        _, _, source_type, i, chunk = job
+        key = (model, source_type, sha1_short(chunk), 0)
+        if key in completed:
+            return  # already ingested before an interrupted run
+        if error is not None:
+            stats["failed"] += 1
+            print(f"[WARN] {provider}/{model} {cid}: {error}")
+            return
+        if not valid_pair(data):
+            stats["empty"] += 1
+            return
+        cache.put(cache_key(cache, provider, model, build_prompt(chunk), 1), data, provider, model)
+        stats["written"] += write_samples(writer, job, [data], completed)
+        return True
+
+    bstats = provider_batch.run_batches(groups, clients, BATCH_CHECKPOINT, on_result, poll_sec, kind="generate",
+                                        sync=writer.sync)
+    print(f"Batches: {bstats['submitted']} submitted, {bstats['resumed']} resumed, "
+          f"{bstats['failed_batches']} failed")
+    return stats
 
 
 # ----------------------- MAIN LOGIC ----------------------
-def main():
-    # Load keys
-    secrets = load_secrets()
-    open_ai_key = secrets.get("open_ai")
-    anthropic_key = secrets.get("anthropic")
-    google_key = secrets.get("google")
-
-    # Init clients
-    openai_client = OpenAI(api_key=open_ai_key)
-    anthro_client = anthropic.Anthropic(api_key=anthropic_key)
-    google_client = genai.Client(api_key=google_key)
-
-    ensure_outfile()
+async def amain(args):
+    cache = ResponseCache(args.cache_path, args.cache)
+    if cache.replay:
+        if args.batch:
+            raise SystemExit("--batch submits to the providers; it cannot be combined with --cache replay")
+        clients = {}  # replay never reaches the providers
+    elif args.batch:
+        secrets = load_secrets()
+        clients = {
+            "openai": provider_batch.make_client("openai", secrets.get("open_ai")),
+            "anthropic": provider_batch.make_client("anthropic", secrets.get("anthropic")),
+            "google": provider_batch.make_client("google", secrets.get("google")),
+        }
+    else:
+        # Load keys
+        secrets = load_secrets()
+        open_ai_key = secrets.get("open_ai")
+        anthropic_key = secrets.get("anthropic")
+        google_key = secrets.get("google")
+
+        # Shared clients (async), connection pools sized to the provider caps
+        clients = {
+            "openai": llm_clients.openai_client(
+                open_ai_key, asynchronous=True, max_connections=PROVIDER_CONCURRENCY["openai"]),
+            "anthropic": llm_clients.anthropic_client(
+                anthropic_key, asynchronous=True, max_connections=PROVIDER_CONCURRENCY["anthropic"]),
+            # async calls via client.aio
+            "google": llm_clients.genai_client(google_key, max_connections=PROVIDER_CONCURRENCY["google"]),
+        }
+
+    writer = ensure_outfile()
     buckets = read_seed_files()
 
     # Pick the first N chunks per source
@@ -238,38 +543,47 @@ def main():
         "Oireachtas": buckets["Oireachtas"][:N_PER_MODEL_PER_SOURCE],
     }
 
-    # ---------- Google ----------
-    for model in GOOGLE_MODELS:
-        for source_type, chunk_list in selected.items():
-            for i, chunk in enumerate(chunk_list, 1):
-                prompt = build_prompt(chunk)
-                data = call_google(google_client, model, prompt) or call_google(google_client, model, prompt)
-                if data:
-                    rid = f"{uuid.uuid4().hex[:8]}-{model}-{source_type}-{i}"
-                    append_row(rid, model, source_type, data["instruction"], data["response"], chunk)
-
-    # ---------- OpenAI ----------
-    for model in OPENAI_MODELS:
-        for source_type, chunk_list in selected.items():
-            for i, chunk in enumerate(chunk_list, 1):
-                prompt = build_prompt(chunk)
-                data = call_openai(openai_client, model, prompt) or call_openai(openai_client, model, prompt)
-                if data:
-                    rid = f"{uuid.uuid4().hex[:8]}-{model}-{source_type}-{i}"
-                    append_row(rid, model, source_type, data["instruction"], data["response"], chunk)
-
-    # ---------- Anthropic ----------
-    for model in ANTHROPIC_MODELS:
-        for source_type, chunk_list in selected.items():
-            for i, chunk in enumerate(chunk_list, 1):
-                prompt = build_prompt(chunk)
-                data = call_anthropic(anthro_client, model, prompt) or call_anthropic(anthro_client, model, prompt)
-                if data:
-                    rid = f"{uuid.uuid4().hex[:8]}-{model}-{source_type}-{i}"
-                    append_row(rid, model, source_type, data["instruction"], data["response"], chunk)
-
+    k = args.samples
+    if args.batch and k > 1:
+        raise SystemExit("--samples > 1 is only supported for live calls, not --batch")
+    completed = load_completed()
+    jobs = build_jobs(selected, completed, k)
+    total = sum(len(c) for c in selected.values()) * len(GOOGLE_MODELS + OPENAI_MODELS + ANTHROPIC_MODELS)
+    print(f"Completed-work index: {len(completed)} keys; {total - len(jobs)} of {total} jobs already done")
+    try:
+        if args.batch:
+            print(f"Running {len(jobs)} jobs through provider batch APIs")
+            stats = run_batch(jobs, clients, cache, writer, completed, args.batch_poll)
+        else:
+            print(f"Running {len(jobs)} jobs concurrently, {k} sample(s) each (provider caps "
+                  f"{PROVIDER_CONCURRENCY}, per-model {MODEL_CONCURRENCY})")
+            stats = await run_jobs(jobs, clients, cache, writer, completed, k)
+    finally:
+        writer.close()
+    print(f"Rows written: {stats['written']}, empty: {stats['empty']}, failed: {stats['failed']} "
+          f"({writer.stats['batches']} batched writes)")
+    print(cache.summary() + (f", {stats['cache_miss']} jobs skipped (not cached)" if cache.replay else ""))
+    for key, st in limiter_stats().items():
+        print(f"  {key}: {st['requests']} requests, waited {st['waited_s']:.1f}s, "
+              f"{st['retry_after']} rate-limit pauses, est/actual tokens {st['est_tokens']}/{st['actual_tokens']}")
+    llm_clients.print_pool_stats()
+    hedging.print_hedge_stats()
+    print(f"Token/cost ledger: {llm_ledger.LEDGER_PATH} (python llm_ledger.py for a summary)")
     print(f"Done. Wrote to {OUT_CSV.resolve()}")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Generate instruction-response pairs across models.")
+    parser.add_argument("--samples", type=int, default=SAMPLES_PER_REQUEST,
+                        help="Candidate pairs per (model, chunk) from one request (OpenAI n, Gemini "
+                             "candidate_count, Anthropic array tool); written with sample_idx 0..k-1")
+    add_cache_args(parser)
+    provider_batch.add_batch_args(parser)
+    hedging.add_hedge_args(parser)
+    args = parser.parse_args()
+    hedging.configure(args.hedge_fraction, args.hedge_percentile)
+    asyncio.run(amain(args))
+
+
 if __name__ == "__main__":
     main()
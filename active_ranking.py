@@ -0,0 +1,144 @@
+# Adaptive comparison scheduling for the model ranking.
+# Keeps a running Bradley–Terry posterior over the models' log-strengths
+# (MAP fit with a weak Gaussian prior, Laplace approximation for the
+# covariance) and picks the model pair whose next vote is expected to shrink
+# the uncertainty of the still-unresolved adjacent-rank gaps the most:
+#   a vote on (i, j) adds Fisher information p(1-p) along x = e_i - e_j, so
+#   Var(u.theta) drops by f (u'Cx)^2 / (1 + f x'Cx) for each adjacent gap u.
+# Stops once every adjacent pair in the ranking is separated, i.e. its
+# Z_SCORE interval on theta_i - theta_j excludes 0.
+#
+#   r = ActiveRanker(models)
+#   r.add_choice(model_A, model_B, "A")
+#   pair = r.next_pair(candidate_pairs)   # None once r.settled()
+#   print(r.summary())
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+PRIOR_VAR = 4.0   # prior variance of a log-strength; weak, keeps the fit finite
+Z_SCORE = 1.96    # 95% intervals
+NEWTON_ITERS = 50
+
+Pair = Tuple[str, str]
+
+
+class ActiveRanker:
+    def __init__(self, models: Iterable[str], prior_var: float = PRIOR_VAR, z: float = Z_SCORE):
+        self.models = sorted(set(models))
+        self.idx = {m: i for i, m in enumerate(self.models)}
+        n = len(self.models)
+        self.wins = np.zeros((n, n))  # wins[i, j]: times i beat j
+        self.prior_var = prior_var
+        self.z = z
+        self.theta = np.zeros(n)
+        self.cov = np.eye(n) * prior_var
+        self._stale = False
+
+    @property
+    def votes(self) -> int:
+        return int(self.wins.sum())
+
+    def add(self, winner: str, loser: str, n: int = 1):
+        self.wins[self.idx[winner], self.idx[loser]] += n
+        self._stale = True
+
+    def add_choice(self, model_A: str, model_B: str, choice: str):
+        if choice == "A":
+            self.add(model_A, model_B)
+        elif choice == "B":
+            self.add(model_B, model_A)
+
+    def fit(self):
+        """Newton steps on the log posterior; covariance = inverse negative Hessian."""
+        if not self._stale:
+            return
+        n = len(self.models)
+        games = self.wins + self.wins.T
+        theta = self.theta
+        for _ in range(NEWTON_ITERS):
+            p = 1.0 / (1.0 + np.exp(-(theta[:, None] - theta[None, :])))  # P(i beats j)
+            grad = (self.wins - games * p).sum(axis=1) - theta / self.prior_var
+            w = games * p * (1 - p)
+            hess = np.diag(w.sum(axis=1)) - w + np.eye(n) / self.prior_var  # negative Hessian
+            step = np.linalg.solve(hess, grad)
+            theta = theta + step
+            if np.abs(step).max() < 1e-8:
+                break
+        p = 1.0 / (1.0 + np.exp(-(theta[:, None] - theta[None, :])))
+        w = games * p * (1 - p)
+        hess = np.diag(w.sum(axis=1)) - w + np.eye(n) / self.prior_var
+        self.theta, self.cov = theta, np.linalg.inv(hess)
+        self._stale = False
+
+    def ranking(self) -> List[str]:
+        self.fit()
+        return [self.models[i] for i in np.argsort(-self.theta, kind="stable")]
+
+    def _gap(self, a: str, b: str) -> Tuple[float, float]:
+        i, j = self.idx[a], self.idx[b]
+        var = self.cov[i, i] + self.cov[j, j] - 2 * self.cov[i, j]
+        return float(self.theta[i] - self.theta[j]), float(np.sqrt(max(var, 0.0)))
+
+    def interval(self, a: str, b: str) -> Tuple[float, float]:
+        """Z_SCORE interval on theta_a - theta_b."""
+        self.fit()
+        d, sd = self._gap(a, b)
+        return d - self.z * sd, d + self.z * sd
+
+    def unresolved(self) -> List[Pair]:
+        """Adjacent pairs of the current ranking whose interval still contains 0."""
+        order = self.ranking()
+        return [(a, b) for a, b in zip(order, order[1:]) if self.interval(a, b)[0] <= 0]
+
+    def settled(self) -> bool:
+        return len(self.models) < 2 or not self.unresolved()
+
+    def score(self, pair: Pair, gaps: Optional[List[Pair]] = None) -> float:
+        """Expected shrinkage of the unresolved gaps' variances (relative) from one vote on pair."""
+        self.fit()
+        gaps = self.unresolved() if gaps is None else gaps
+        i, j = self.idx[pair[0]], self.idx[pair[1]]
+        x = np.zeros(len(self.models))
+        x[i], x[j] = 1.0, -1.0
+        p = 1.0 / (1.0 + np.exp(-(self.theta[i] - self.theta[j])))
+        f = p * (1 - p)
+        cx = self.cov @ x
+        denom = 1.0 + f * float(x @ cx)
+        total = 0.0
+        for a, b in gaps:
+            u = np.zeros(len(self.models))
+            u[self.idx[a]], u[self.idx[b]] = 1.0, -1.0
+            var_u = float(u @ self.cov @ u)
+            total += f * float(u @ cx) ** 2 / denom / var_u
+        return total
+
+    def next_pair(self, candidates: Iterable[Pair], in_flight: Optional[Dict[Pair, int]] = None
+                  ) -> Tuple[Optional[Pair], float]:
+        """
+        Most informative candidate and its score, or (None, 0.0) once settled.
+        in_flight counts votes already requested but not yet seen per pair;
+        each one discounts that pair so a batch spreads over several pairs.
+        """
+        if self.settled():
+            return None, 0.0
+        gaps = self.unresolved()
+        in_flight = in_flight or {}
+        best, best_score = None, 0.0
+        for pair in candidates:
+            s = self.score(pair, gaps) / (1 + in_flight.get(pair, 0))
+            if s > best_score:
+                best, best_score = pair, s
+        return best, best_score
+
+    def summary(self) -> str:
+        order = self.ranking()
+        lines = [f"{self.votes} votes, {'settled' if self.settled() else 'not settled'}"]
+        for k, m in enumerate(order):
+            line = f"  {k + 1}. {m:<32} theta={self.theta[self.idx[m]]:+.2f}"
+            if k + 1 < len(order):
+                lo, hi = self.interval(m, order[k + 1])
+                line += f"  gap to next [{lo:+.2f}, {hi:+.2f}]"
+            lines.append(line)
+        return "\n".join(lines)
@@ -0,0 +1,176 @@
+# Buffered, crash-safe CSV appender.
+# Producers put rows on a queue; one writer thread owns the open file, writes
+# rows in batches and flush + fsyncs when MAX_ROWS rows are pending or
+# MAX_SECONDS have passed since the last sync. Each batch is a single write().
+#
+# Crash consistency:
+#   - On clean close a manifest (<file>.manifest.json) records the final size.
+#   - On open the manifest is removed, so a missing/mismatched manifest means
+#     the last run did not close cleanly; the file is then scanned and any torn
+#     final record (a partial row from a crash mid-write) is truncated.
+#
+#   w = BatchWriter("outputs/pairs.csv")
+#   w.put([...row...])
+#   w.sync()     # block until every row put so far is on disk
+#   w.close()
+
+import csv
+import io
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+MAX_ROWS = 50
+MAX_SECONDS = 2.0
+SCAN_CHUNK = 8 * 1024 * 1024
+
+_STOP = object()
+
+
+def manifest_path(path: Union[str, Path]) -> Path:
+    return Path(str(path) + ".manifest.json")
+
+
+def last_record_end(path: Union[str, Path]) -> int:
+    """
+    Byte offset just past the last complete CSV record: the last newline with
+    an even number of quote characters before it (a newline inside a quoted
+    field has odd parity). '"' never occurs inside a UTF-8 multibyte sequence.
+    """
+    end, offset, quotes = 0, 0, 0
+    tail = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(SCAN_CHUNK)
+            if not chunk:
+                break
+            data = tail + chunk
+            base = offset - len(tail)
+            segs = data.split(b"\n")
+            pos = base
+            for seg in segs[:-1]:
+                quotes += seg.count(b'"')
+                pos += len(seg) + 1
+                if quotes % 2 == 0:
+                    end = pos
+            tail = segs[-1]
+            offset += len(chunk)
+    return end
+
+
+def repair_tail(path: Union[str, Path]) -> int:
+    """Truncate a torn final record left by an unclean exit; returns bytes removed."""
+    path = Path(path)
+    if not path.exists():
+        return 0
+    size = path.stat().st_size
+    mpath = manifest_path(path)
+    if mpath.exists():
+        try:
+            with open(mpath, "r", encoding="utf-8") as f:
+                if json.load(f).get("bytes") == size:
+                    return 0  # closed cleanly, nothing appended since
+        except (OSError, ValueError):
+            pass
+    end = last_record_end(path)
+    if end < size:
+        with open(path, "r+b") as f:
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"[WARN] {path}: truncated {size - end} bytes of torn final record")
+    return size - end
+
+
+class BatchWriter:
+    def __init__(self, path: Union[str, Path], max_rows: int = MAX_ROWS,
+                 max_seconds: float = MAX_SECONDS, repair: bool = True):
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        if repair:
+            repair_tail(self.path)
+        # invalidate the old manifest: it is rewritten only on clean close
+        manifest_path(self.path).unlink(missing_ok=True)
+        self.f = open(self.path, "ab")
+        self.q: "queue.Queue" = queue.Queue()
+        self.stats = {"rows": 0, "batches": 0, "fsyncs": 0}
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._run, name=f"writer:{self.path.name}", daemon=True)
+        self.thread.start()
+
+    def put(self, row: list):
+        if self.error is not None:
+            raise RuntimeError(f"writer for {self.path} failed") from self.error
+        self.q.put(row)
+
+    def sync(self):
+        """Block until every row put so far is written and fsynced."""
+        done = threading.Event()
+        self.put(done)
+        while not done.wait(timeout=1.0):
+            if self.error is not None or not self.thread.is_alive():
+                raise RuntimeError(f"writer for {self.path} failed") from self.error
+
+    def _write(self, rows: list):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        self.f.write(buf.getvalue().encode("utf-8"))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.stats["rows"] += len(rows)
+        self.stats["batches"] += 1
+        self.stats["fsyncs"] += 1
+
+    def _run(self):
+        pending, last_sync = [], time.monotonic()
+        try:
+            while True:
+                timeout = max(0.0, self.max_seconds - (time.monotonic() - last_sync))
+                try:
+                    item = self.q.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                stop = item is _STOP
+                barrier = isinstance(item, threading.Event)
+                if item is not None and not stop and not barrier:
+                    pending.append(item)
+                if pending and (stop or barrier or len(pending) >= self.max_rows
+                                or time.monotonic() - last_sync >= self.max_seconds):
+                    self._write(pending)
+                    pending = []
+                if barrier:
+                    item.set()
+                if not pending:
+                    last_sync = time.monotonic()
+                if stop:
+                    return
+        except BaseException as e:
+            self.error = e
+            print(f"[WARN] writer for {self.path} failed: {e}")
+
+    def close(self):
+        """Drain the queue, sync, and write the manifest."""
+        self.q.put(_STOP)
+        self.thread.join()
+        self.f.close()
+        if self.error is not None:
+            raise RuntimeError(f"writer for {self.path} failed") from self.error
+        tmp = manifest_path(self.path).with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"file": self.path.name, "bytes": self.path.stat().st_size,
+                       "rows_this_run": self.stats["rows"], "batches": self.stats["batches"],
+                       "closed_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, manifest_path(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -8,11 +8,12 @@ Schema per row:
 
 Key: (source_type, text_hash, model_A, model_B, annotator_type)
 
-Aggregate_LLM only when all 3 individual LLM votes exist.
-Prompt body unchanged.
+Aggregate_LLM only when all 3 individual LLM votes exist; with --sequential, as
+soon as two agree (the third judge is called only to break a tie).
+Prompt wording unchanged; static instructions + reference text come first so
+the 15 comparisons of a text share a cacheable prefix.
 """
 from __future__ import annotations
-import vertexai
 from vertexai.preview.generative_models import GenerativeModel
 import argparse, json, os, sys, time, hashlib
 from datetime import datetime
@@ -22,23 +23,23 @@ import random
 import pandas as pd
 from tqdm import tqdm
 
-from huggingface_hub import HfApi, hf_hub_download, create_repo
-try:
-    from huggingface_hub.utils import HfHubHTTPError
-except ImportError:
-    class HfHubHTTPError(Exception): pass
-
 from openai import OpenAI
 import anthropic
 
-from concurrent.futures import ThreadPoolExecutor, as_completed, Future
+from llm_cache import CacheMiss, ResponseCache, add_cache_args
+import hedging
+from active_ranking import ActiveRanker
+import hf_sync
+import llm_clients
+import llm_ledger
+from rate_limiter import acquire, limiter_stats, on_error, record_usage
+
+import queue
 import threading
-from collections import defaultdict
+from collections import defaultdict, deque
 
-# Add lock for thread-safe operations
-lock = threading.Lock()
+# progress bars are updated from the provider worker threads
 progress_lock = threading.Lock()
-push_lock = threading.Lock()
 
 # ---------------- CONFIG ----------------
 PAIRS_CSV = Path("outputs/pairs.csv")
@@ -52,13 +53,22 @@ ANTHROPIC_VOTE_MODEL = "claude-sonnet-4-20250514"
 
 LLM_ANNOTATORS = ["GPT_5", "Gemini_2_5_Pro", "Claude_Sonnet_4"]
 AGG_ANNOTATOR = "Aggregate_LLM"
+KEY_COLS = hf_sync.ANNOTATION_KEY_COLS
+
+# Sequential voting (--sequential): the two cheapest judges vote first and
+# the third only breaks ties; AUDIT_FRACTION of comparisons (chosen by hash,
+# stable across runs) still get all three votes for agreement statistics
+AUDIT_FRACTION = 0.1
+# Active selection (--active): comparisons in flight at once; fewer means each
+# pick sees more of the latest votes, more keeps the provider pools busy
+ACTIVE_IN_FLIGHT = 12
 
 RETRY_MAX = 2
 RETRY_SLEEP = 2.0
 
-# Number of worker threads per LLM provider
-WORKERS_PER_LLM = 3
-MAX_TOTAL_WORKERS = 12
+# Worker threads per LLM provider; each provider has its own queue and pool,
+# so it runs at its own limit (Anthropic's quota is the tightest)
+WORKERS_PER_LLM = {"GPT_5": 6, "Gemini_2_5_Pro": 6, "Claude_Sonnet_4": 3}
 
 # ------------- Utils -------------
 def sha1_short(t: str, length: int = 16) -> str:
@@ -75,26 +85,22 @@ def load_secrets(path="secrets.json") -> Dict[str, str]:
         data = data[0] if data else {}
     return data
 
-def download_existing() -> pd.DataFrame:
-    api = HfApi()
+def download_existing(hub) -> pd.DataFrame:
+    """
+    Main annotations file plus the shards not yet compacted into it (hf_sync.py),
+    including local shards a failed upload left behind, so their votes are not
+    requested again.
+    """
     try:
-        p = hf_hub_download(repo_id=HF_REPO, filename=HF_FILENAME, repo_type="dataset")
-        df = pd.read_csv(p)
-        print(f"Loaded existing annotations from HF: {HF_REPO}/{HF_FILENAME} (rows={len(df)})")
-        return df
-    except HfHubHTTPError as e:
-        st = getattr(getattr(e, "response", None), "status_code", None)
-        if st == 404 or "404" in str(e):
-            print("No existing HF annotations file (starting new).")
-            return pd.DataFrame()
-        print(f"[WARN] HF download error: {e}")
-        return pd.DataFrame()
+        df = hf_sync.load_all(hub, HF_FILENAME, KEY_COLS, local_dir=hf_sync.SHARD_DIR)
     except Exception as e:
-        if "404" in str(e):
-            print("No existing HF annotations file (starting new).")
-            return pd.DataFrame()
-        print(f"[WARN] Unexpected HF download error: {e}")
+        print(f"[WARN] HF download error: {e}")
         return pd.DataFrame()
+    if df.empty:
+        print("No existing HF annotations file (starting new).")
+    else:
+        print(f"Loaded existing annotations from HF: {HF_REPO}/{HF_FILENAME} + shards (rows={len(df)})")
+    return df
 
 def load_pairs() -> pd.DataFrame:
     if not PAIRS_CSV.exists():
@@ -106,6 +112,9 @@ def load_pairs() -> pd.DataFrame:
     if miss:
         print(f"pairs.csv missing columns: {miss}")
         sys.exit(1)
+    if "sample_idx" in df.columns:
+        # multi-sample runs: compare models on their first candidate only
+        df = df[df["sample_idx"].fillna(0).astype(int) == 0]
     return df
 
 def build_comparisons(pairs_df: pd.DataFrame) -> pd.DataFrame:
@@ -141,15 +150,38 @@ def comp_key(base: Dict[str, str]) -> str:
 def vote_key(base: Dict[str, str], annotator_type: str) -> str:
     return f"{comp_key(base)}||{annotator_type}"
 
-# exponential retry and jitter to reduce pressure on API
-def call_with_retry(label: str, fn):
+def comp_key_series(df: pd.DataFrame) -> pd.Series:
+    """comp_key for every row of an annotations frame, vectorized."""
+    return (df["source_type"].astype(str) + "||" + df["text_hash"].astype(str) + "||"
+            + df["model_A"].astype(str) + "||" + df["model_B"].astype(str))
+
+def index_existing(df: pd.DataFrame) -> Tuple[set, Dict[str, str]]:
+    """
+    One pass over the existing annotations: the set of vote_keys present, and
+    vote_key -> choice for valid (A/B) choices, first row winning.
+    """
+    long = df[df["annotator_type"].ne("")]
+    if long.empty:
+        return set(), {}
+    keys = (comp_key_series(long) + "||" + long["annotator_type"].astype(str)).to_numpy()
+    valid = long["choice"].isin(["A", "B"]).to_numpy()
+    # reversed so that the first row for a key is the one kept
+    choices = dict(zip(keys[valid][::-1].tolist(), long["choice"].to_numpy()[valid][::-1].tolist()))
+    return set(keys.tolist()), choices
+
+# exponential retry and jitter to reduce pressure on API; with provider/model
+# a 429's Retry-After pauses every thread calling that model (rate_limiter.py)
+def call_with_retry(label: str, fn, provider: Optional[str] = None, model: Optional[str] = None):
     last_exception = None
     base_delay = RETRY_SLEEP # e.g., 2.0 seconds
     for attempt in range(RETRY_MAX):
+        token = llm_ledger.ATTEMPT.set(attempt)  # ledger records carry the attempt number
         try:
             return fn()
         except Exception as e:
             last_exception = e
+            if provider:
+                llm_ledger.record("vote", provider, model, ok=False)
             # Only print the warning for retriable errors, or be more specific later
             print(f"[WARN] {label} attempt {attempt + 1} failed: {e}")
 
@@ -159,22 +191,39 @@ def call_with_retry(label: str, fn):
 
             # Exponential backoff with jitter
             delay = (base_delay * (2 ** attempt)) + random.uniform(0, 1)
+            if provider:
+                delay = max(delay, on_error(provider, model, e, 0.0))
             print(f"[INFO] Retrying in {delay:.2f} seconds...")
             time.sleep(delay)
+        finally:
+            llm_ledger.ATTEMPT.reset(token)
 
     print(f"[ERROR] {label} failed after {RETRY_MAX} attempts. Last error: {last_exception}")
     return None
 
 
-# ---------- Prompt (UNCHANGED) ----------
-def build_vote_prompt(source_text: str,
+# ---------- Prompt (wording unchanged, prefix-first order) ----------
+# Everything that is identical across a text's comparisons (instructions, then
+# the reference text) forms the prefix, so provider prompt caches can reuse it:
+# Anthropic via cache_control on the prefix block, OpenAI via automatic prefix
+# caching routed with prompt_cache_key, Gemini 2.5 via implicit caching.
+# Providers only cache prefixes above a minimum size (~1024 tokens), so short
+# reference texts will show few hits; the hit rate is reported per run.
+def vote_prompt_parts(source_text: str,
                       model_A: str, instr_A: str, resp_A: str,
-                      model_B: str, instr_B: str, resp_B: str) -> str:
-    return f"""You are evaluating Irish QA pairs.
+                      model_B: str, instr_B: str, resp_B: str) -> Tuple[str, str]:
+    prefix = f"""You are evaluating Irish QA pairs.
+
+Question: Which Question–Answer pair exhibits a stronger command of Irish grammar and semantic coherence? 
+Take into account use of the reference text. If unsure, pick the one with stronger Irish grammar.
+
+Output MUST be exactly a single character: 'A' OR 'B'
+No punctuation, no explanation, no extra whitespace.
 
 Reference Text:
 {source_text}
-
+"""
+    suffix = f"""
 Instruction A:
 {instr_A}
 Response A:
@@ -185,25 +234,33 @@ Instruction B:
 Response B:
 {resp_B}
 
-Question: Which Question–Answer pair exhibits a stronger command of Irish grammar and semantic coherence? 
-Take into account use of the reference text. If unsure, pick the one with stronger Irish grammar.
-
-Output MUST be exactly a single character: 'A' OR 'B'
-No punctuation, no explanation, no extra whitespace.
 Answer:
 """
+    return prefix, suffix
+
+def build_vote_prompt(source_text: str,
+                      model_A: str, instr_A: str, resp_A: str,
+                      model_B: str, instr_B: str, resp_B: str) -> str:
+    return "".join(vote_prompt_parts(source_text, model_A, instr_A, resp_A, model_B, instr_B, resp_B))
 
 # ---------- Structured vote (no heuristic fallback) ----------
 
-def openai_vote(client: OpenAI, model: str, prompt: str) -> Optional[str]:
+def openai_vote(client: OpenAI, model: str, prompt: str, cache_key: Optional[str] = None) -> Optional[str]:
+    est = acquire("openai", model, prompt)
+    hedging.mark_started()
+    t0 = time.perf_counter()
     resp = client.responses.create(
         model=model,
         reasoning={"effort": "low"},
         instructions="Only output the character A or B as response.",
         input=prompt,
+        # same key for a text's comparisons -> routed to the same prefix cache
+        **({"prompt_cache_key": cache_key} if cache_key else {}),
     )
+    usage = record_usage("openai", model, est, resp)
     print(f"OpenAI response: {resp.output_text}")
     v = resp.output_text.strip().upper()
+    llm_ledger.record("vote", "openai", model, usage, time.perf_counter() - t0, ok=v in ("A", "B"))
     return v if v in ("A", "B") else None
 
 # Anthropic tool schema
@@ -218,73 +275,94 @@ ANTHROPIC_TOOL = {
     }
 }
 
-def anthropic_vote(client: anthropic.Anthropic, model: str, prompt: str) -> Optional[str]:
+def anthropic_vote(client: anthropic.Anthropic, model: str, prompt: str, prefix_len: int = 0) -> Optional[str]:
+    est = acquire("anthropic", model, prompt, max_output=64)
+    if prefix_len:
+        # cache breakpoint after the shared prefix (tools + instructions + reference text)
+        content = [
+            {"type": "text", "text": prompt[:prefix_len], "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt[prefix_len:]},
+        ]
+    else:
+        content = prompt
+    hedging.mark_started()
+    t0 = time.perf_counter()
     r = client.messages.create(
         model=model,
         max_tokens=64,
         temperature=0.0,
         tools=[ANTHROPIC_TOOL],
         tool_choice={"type": "tool", "name": "record_vote"},
-        messages=[{"role": "user", "content": prompt}]
+        messages=[{"role": "user", "content": content}]
     )
+    usage = record_usage("anthropic", model, est, r)
+    dt = time.perf_counter() - t0
     for block in r.content:
         if getattr(block, "type", None) == "tool_use" and getattr(block, "name", "") == "record_vote":
             vote = (getattr(block, "input", {}) or {}).get("vote")
+            llm_ledger.record("vote", "anthropic", model, usage, dt, ok=vote in ("A", "B"))
             return vote if vote in ("A", "B") else None
+    llm_ledger.record("vote", "anthropic", model, usage, dt, ok=False)
     print("[WARN] Anthropic structured vote missing")
     return None
 
 def gemini_vote(model_obj: GenerativeModel, prompt: str) -> Optional[str]:
     """
     Calls Gemini for standard text generation using a GenerativeModel object.
-    This now exactly matches the pattern from the successful test script.
+    model_obj comes from llm_clients.vertex_model (vertexai.init ran once).
     """
+    response = None
     try:
-        gemini_project_id = "gen-lang-client-0817118952" 
-        gcloud_location = "us-central1"
-
-        vertexai.init(project=gemini_project_id, location=gcloud_location)
-
-        model = GenerativeModel('gemini-2.5-pro')
-        response = model.generate_content(prompt)
-
-        return response.text or None
+        est = acquire("google", GEMINI_VOTE_MODEL, prompt)
+        hedging.mark_started()
+        t0 = time.perf_counter()
+        response = model_obj.generate_content(prompt)
+        usage = record_usage("google", GEMINI_VOTE_MODEL, est, response)
+        text = response.text or None
+        llm_ledger.record("vote", "google", GEMINI_VOTE_MODEL, usage, time.perf_counter() - t0,
+                          ok=(text or "").strip().upper() in ("A", "B"))
+        return text
 
-    except:
+    except Exception as e:
+        llm_ledger.record("vote", "google", GEMINI_VOTE_MODEL, ok=False)
+        # errors are swallowed here, so register any Retry-After directly
+        on_error("google", GEMINI_VOTE_MODEL, e, 0.0)
         print(f"[WARN] Gemini vote parse failed. Raw output: {response!r}")
         return None
 
 
+def valid_vote(v) -> bool:
+    return v in ("A", "B")
+
 def majority_three(votes: List[str]) -> Optional[str]:
     if len(votes) != 3 or any(v not in ("A","B") for v in votes): return None
     return "A" if votes.count("A") > votes.count("B") else "B"
 
-def push_to_hf(df: pd.DataFrame, hf_token: str, message: str = "Incremental update") -> bool:
-    """
-    Push the current dataframe to Hugging Face.
-    Returns True if successful, False otherwise.
-    """
-    try:
-        # Save locally first
-        tmp = ANNOT_CSV_LOCAL.with_suffix(".tmp.csv")
-        df.to_csv(tmp, index=False)
-        tmp.replace(ANNOT_CSV_LOCAL)
-        
-        # Push to HF
-        api = HfApi()
-        create_repo(HF_REPO, repo_type="dataset", exist_ok=True, token=hf_token)
-        api.upload_file(
-            path_or_fileobj=str(ANNOT_CSV_LOCAL),
-            path_in_repo=HF_FILENAME,
-            repo_id=HF_REPO,
-            repo_type="dataset",
-            token=hf_token,
-            commit_message=message
-        )
-        return True
-    except Exception as e:
-        print(f"[WARN] Push to HF failed: {e}")
-        return False
+def majority_of(votes: Dict[str, str]) -> Optional[str]:
+    """Choice backed by two votes: the three-judge majority whatever the third says."""
+    for c in ("A", "B"):
+        if sum(v == c for v in votes.values()) >= 2:
+            return c
+    return None
+
+def judge_order() -> List[str]:
+    """LLM_ANNOTATORS cheapest first, by the ledger's per-token prices."""
+    prices = llm_ledger.load_prices()
+    def price(annot: str) -> float:
+        provider, model = VOTE_CACHE_SPEC[annot][:2]
+        p = prices.get(f"{provider}/{model}")
+        return p["input"] + p["output"] if p else float("inf")
+    return sorted(LLM_ANNOTATORS, key=price)
+
+def is_audit(base: Dict[str, str], fraction: float) -> bool:
+    return int(sha1_short(comp_key(base), 8), 16) < fraction * 16 ** 8
+
+# Cache-key fields per annotator (llm_cache.py): provider, model, schema, temperature
+VOTE_CACHE_SPEC = {
+    "GPT_5": ("openai", OPENAI_VOTE_MODEL, "Only output the character A or B as response.", None),
+    "Gemini_2_5_Pro": ("google", GEMINI_VOTE_MODEL, None, None),
+    "Claude_Sonnet_4": ("anthropic", ANTHROPIC_VOTE_MODEL, ANTHROPIC_TOOL, 0.0),
+}
 
 def process_single_llm_vote(
     annotator: str,
@@ -294,7 +372,9 @@ def process_single_llm_vote(
     openai_client: Optional[OpenAI],
     anthro_client: Optional[anthropic.Anthropic],
     gemini_model: Optional[GenerativeModel],
-    pbar: tqdm
+    pbar: tqdm,
+    cache: Optional[ResponseCache] = None,
+    prefix_len: int = 0
 ) -> Optional[Tuple[str, dict]]:
     """
     Process a single LLM vote and update progress bar.
@@ -309,21 +389,38 @@ def process_single_llm_vote(
         return None
     
     vote = None
+    cache_key = None
+    from_cache = False
+    if cache is not None and cache.enabled:
+        provider, model, schema, temperature = VOTE_CACHE_SPEC[annotator]
+        cache_key = cache.key(provider, model, prompt, schema, temperature)
+        try:
+            vote = cache.get(cache_key)
+            from_cache = vote in ("A", "B")
+        except CacheMiss:
+            with progress_lock:
+                pbar.update(1)
+            return None
     try:
-        if annotator == "GPT_5":
+        if from_cache:
+            pass
+        elif annotator == "GPT_5":
             vote = call_with_retry(
                 "GPT_5", 
-                lambda: openai_vote(openai_client, OPENAI_VOTE_MODEL, prompt)
+                lambda: hedging.hedged_call(("openai", OPENAI_VOTE_MODEL), lambda: openai_vote(openai_client, OPENAI_VOTE_MODEL, prompt, f"vote-{base['text_hash']}"), valid_vote),
+                "openai", OPENAI_VOTE_MODEL
             )
         elif annotator == "Gemini_2_5_Pro":
             vote = call_with_retry(
                 "Gemini_2_5_Pro",
-                lambda: gemini_vote(gemini_model, prompt)
+                lambda: hedging.hedged_call(("google", GEMINI_VOTE_MODEL), lambda: gemini_vote(gemini_model, prompt), valid_vote),
+                "google", GEMINI_VOTE_MODEL
             )
         elif annotator == "Claude_Sonnet_4":
             vote = call_with_retry(
                 "Claude_Sonnet_4",
-                lambda: anthropic_vote(anthro_client, ANTHROPIC_VOTE_MODEL, prompt)
+                lambda: hedging.hedged_call(("anthropic", ANTHROPIC_VOTE_MODEL), lambda: anthropic_vote(anthro_client, ANTHROPIC_VOTE_MODEL, prompt, prefix_len), valid_vote),
+                "anthropic", ANTHROPIC_VOTE_MODEL
             )
     finally:
         # Always update progress bar
@@ -331,6 +428,8 @@ def process_single_llm_vote(
             pbar.update(1)
     
     if vote in ("A", "B"):
+        if cache_key is not None and not from_cache:
+            cache.put(cache_key, vote, *VOTE_CACHE_SPEC[annotator][:2])
         return (annotator, {
             "annotator_type": annotator,
             **base,
@@ -344,11 +443,24 @@ def process_single_llm_vote(
 def main():
     parser = argparse.ArgumentParser(description="Structured LLM voting (Gemini logic mirrored).")
     parser.add_argument("--limit", type=int, default=None, help="Limit pending comparisons")
-    parser.add_argument("--dry-run", action="store_true", help="Plan only (no API / write / push)")
+    parser.add_argument("--dry-run", action="store_true", help="Plan only (no API / write / upload)")
     parser.add_argument("--overwrite-llm", action="store_true", help="Re-annotate existing LLM votes")
-    parser.add_argument("--push-interval", type=int, default=50, 
-                       help="Push to HF every N annotations (default: 50, 0 = only push at end)")
+    parser.add_argument("--push-interval", type=int, default=hf_sync.SHARD_ROWS,
+                       help="Seal a shard every N annotations, uploaded in the background "
+                            f"(default: {hf_sync.SHARD_ROWS}, 0 = one shard at end)")
+    add_cache_args(parser)
+    hedging.add_hedge_args(parser)
+    parser.add_argument("--sequential", action="store_true",
+                        help="Early-stopping majority: two cheapest judges first, third only on disagreement")
+    parser.add_argument("--audit-fraction", type=float, default=AUDIT_FRACTION,
+                        help="With --sequential, share of comparisons still given all three votes")
+    parser.add_argument("--active", action="store_true",
+                        help="Pick comparisons adaptively from a Bradley-Terry posterior and stop once "
+                             "each source's ranking is settled (--limit caps comparisons started)")
+    hf_sync.add_sync_args(parser)
     args = parser.parse_args()
+    hedging.configure(args.hedge_fraction, args.hedge_percentile)
+    cache = ResponseCache(args.cache_path, args.cache)
 
     secrets = load_secrets()
     open_ai_key = secrets.get("open_ai")
@@ -356,17 +468,23 @@ def main():
     google_key = secrets.get("google")
     hf_token = secrets.get("hf") or os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACE_TOKEN")
 
-    if not (open_ai_key and anthropic_key and google_key and hf_token):
+    if not ((cache.replay or (open_ai_key and anthropic_key and google_key)) and (hf_token or args.hub_dir)):
         print("Missing required keys/token.")
         sys.exit(1)
 
-    openai_client = OpenAI(api_key=open_ai_key)
-    anthro_client = anthropic.Anthropic(api_key=anthropic_key)
-    
-    gemini_model_obj = GenerativeModel('gemini-2.5-pro')
+    if cache.replay:
+        # replay never reaches the providers
+        openai_client = anthro_client = gemini_model_obj = None
+    else:
+        # one shared client per provider, pool sized to its workers (+ hedges)
+        openai_client = llm_clients.openai_client(open_ai_key, max_connections=2 * WORKERS_PER_LLM["GPT_5"])
+        anthro_client = llm_clients.anthropic_client(anthropic_key,
+                                                     max_connections=2 * WORKERS_PER_LLM["Claude_Sonnet_4"])
+        gemini_model_obj = llm_clients.vertex_model(GEMINI_VOTE_MODEL)
 
 
-    existing_df = download_existing()
+    hub = hf_sync.LocalHub(args.hub_dir) if args.hub_dir else hf_sync.HfHub(HF_REPO, hf_token)
+    existing_df = download_existing(hub)
     required_cols = [
         "annotator_type","source_type","text_hash","text",
         "model_A","model_B","choice",
@@ -381,11 +499,8 @@ def main():
         mask = existing_df["text_hash"].eq("") & existing_df["text"].ne("")
         existing_df.loc[mask,"text_hash"] = existing_df.loc[mask,"text"].astype(str).apply(sha1_short)
 
-    existing_long = existing_df[existing_df["annotator_type"].ne("")]
-    existing_keys = set(
-        f"{r.source_type}||{r.text_hash}||{r.model_A}||{r.model_B}||{r.annotator_type}"
-        for r in existing_long.itertuples()
-    )
+    # vote_key index built once; planning never scans existing_df per comparison
+    existing_keys, existing_choices = index_existing(existing_df)
     existing_keys_copy = existing_keys.copy()  # Thread-safe copy
 
     pairs_df = load_pairs()
@@ -393,6 +508,8 @@ def main():
 
     pending: List[Dict[str,str]] = []
     overwrite = args.overwrite_llm
+    sequential = args.sequential
+    judges = judge_order()
     for row in comp_df.itertuples():
         base = {
             "source_type": row.source_type,
@@ -408,23 +525,42 @@ def main():
         if overwrite:
             pending.append(base)
             continue
+        # votes stored but no aggregate (e.g. a crash in between): queued too,
+        # finish_comparison then emits the aggregate without calling a judge
+        no_agg = vote_key(base, AGG_ANNOTATOR) not in existing_keys
+        if sequential:
+            known = {a: existing_choices[vote_key(base, a)] for a in LLM_ANNOTATORS
+                     if vote_key(base, a) in existing_choices}
+            if no_agg or (len(known) < 3 and (majority_of(known) is None or is_audit(base, args.audit_fraction))):
+                pending.append(base)
+            continue
         have_all = True
         for annot in LLM_ANNOTATORS:
             if vote_key(base, annot) not in existing_keys:
                 have_all = False
                 break
-        if not have_all:
+        if not have_all or no_agg:
             pending.append(base)
 
     total_pending = len(pending)
-    if args.limit is not None:
+    if args.active and not overwrite:
+        # already aggregated comparisons add nothing to the ranking
+        pending = [b for b in pending if vote_key(b, AGG_ANNOTATOR) not in existing_keys]
+    if args.limit is not None and not args.active:
         pending = pending[:args.limit]
+    # a text's comparisons back-to-back, so each provider sees its shared
+    # prompt prefix on consecutive requests while it is still cached
+    pending.sort(key=lambda b: (b["source_type"], b["text_hash"]))
 
     print(f"Total comparisons: {len(comp_df)}")
     print(f"Pending needing LLM votes: {total_pending}")
-    print(f"Selected this run: {len(pending)} (limit={'none' if args.limit is None else args.limit})")
+    if args.active:
+        print(f"Active selection from a pool of {len(pending)} "
+              f"(max {'none' if args.limit is None else args.limit} comparisons)")
+    else:
+        print(f"Selected this run: {len(pending)} (limit={'none' if args.limit is None else args.limit})")
     if args.push_interval > 0:
-        print(f"Will push to HF every {args.push_interval} annotations")
+        print(f"Will upload a shard to HF every {args.push_interval} annotations")
 
     if args.dry_run:
         print("DRY RUN sample (≤5):")
@@ -432,17 +568,22 @@ def main():
             print(f"{b['source_type']}|{b['text_hash']}|{b['model_A']}|{b['model_B']}")
         return
 
+    tombstones: List[Dict[str, str]] = []
     if overwrite and pending:
         comp_keys = {comp_key(b) for b in pending}
         mask_remove = existing_df["annotator_type"].isin(LLM_ANNOTATORS + [AGG_ANNOTATOR]) & \
-            existing_df.apply(lambda r: f"{r['source_type']}||{r['text_hash']}||{r['model_A']}||{r['model_B']}" in comp_keys, axis=1)
+            comp_key_series(existing_df).isin(comp_keys)
         removed = int(mask_remove.sum())
         if removed:
+            # the Hub is append-only: tombstones for the old rows go out before
+            # any re-vote, so keys with no replacement (failed judge, skipped
+            # tie-breaker) are gone too, not left with a stale vote/aggregate
+            tombstones = existing_df.loc[mask_remove, KEY_COLS].astype(str).drop_duplicates().to_dict("records")
             existing_df = existing_df[~mask_remove]
-            existing_keys = {
-                k for k in existing_keys
-                if not any(k.startswith(f"{ck}||") for ck in comp_keys)
-            }
+            # vote_key = comp_key||annotator_type
+            existing_keys = {k for k in existing_keys if k.rsplit("||", 1)[0] not in comp_keys}
+            existing_choices = {k: v for k, v in existing_choices.items()
+                                if k.rsplit("||", 1)[0] not in comp_keys}
             existing_keys_copy = existing_keys.copy()
         print(f"Overwrite removed {removed} existing LLM/aggregate rows.")
 
@@ -452,146 +593,226 @@ def main():
     aggregates_added = 0
     aggregates_skipped = 0
     new_rows: List[Dict[str,str]] = []
-    
-    # Tracking for incremental pushes
-    annotations_since_push = 0
-    total_pushes = 0
 
-    # Calculate total tasks for each LLM
-    tasks_per_llm = defaultdict(int)
-    for base in pending:
-        for annot in LLM_ANNOTATORS:
-            k = vote_key(base, annot)
-            if k not in existing_keys_copy:
-                tasks_per_llm[annot] += 1
-
-    # Create progress bars for each LLM
-    pbar_gpt = tqdm(total=tasks_per_llm["GPT_5"], desc="GPT-5", unit="votes", position=0)
-    pbar_gemini = tqdm(total=tasks_per_llm["Gemini_2_5_Pro"], desc="Gemini 2.5 Pro", unit="votes", position=1)
-    pbar_claude = tqdm(total=tasks_per_llm["Claude_Sonnet_4"], desc="Claude Sonnet 4", unit="votes", position=2)
-    
-    pbar_map = {
-        "GPT_5": pbar_gpt,
-        "Gemini_2_5_Pro": pbar_gemini,
-        "Claude_Sonnet_4": pbar_claude
+    # New rows go out as append-only shards; the upload runs in the background
+    sync = hf_sync.ShardSync(hub, HF_FILENAME, shard_rows=args.push_interval)
+    for key in tombstones:
+        sync.delete(key)
+
+    def emit(row: Dict[str, str]):
+        new_rows.append(row)
+        sync.add(row)
+
+    # Pipelined engine: one work queue and worker pool per provider, so no
+    # provider waits on another's slowest call. Votes come back on a single
+    # results queue into a pending-aggregate table keyed by comparison, and
+    # Aggregate_LLM is emitted as soon as a comparison is decided. With
+    # --sequential a comparison whose first two votes disagree goes back out
+    # to the tie-breaker instead. Only the main thread touches the table and
+    # new_rows.
+    work_queues = {a: queue.Queue() for a in LLM_ANNOTATORS}
+    results: "queue.Queue" = queue.Queue()
+    vote_clients = {
+        "GPT_5": (openai_client, None, None),
+        "Gemini_2_5_Pro": (None, None, gemini_model_obj),
+        "Claude_Sonnet_4": (None, anthro_client, None),
     }
+    tasks_per_llm = defaultdict(int)
+    pbar_map: Dict[str, tqdm] = {}
+    # comp_key -> {"base", "prompt", "prefix_len", "votes", "tried", "outstanding", "audit"}
+    pending_aggregates: Dict[str, dict] = {}
+    outstanding = 0
+    seq_stats = {"two_vote": 0, "tie_break": 0, "audited": 0}
+    audit_votes: List[Dict[str, str]] = []
+
+    def queue_votes(entry: dict, annots: List[str]):
+        nonlocal outstanding
+        for annot in annots:
+            work_queues[annot].put((entry["base"], entry["prompt"], entry["prefix_len"]))
+            tasks_per_llm[annot] += 1
+            if annot in pbar_map:
+                pbar_map[annot].total += 1
+                pbar_map[annot].refresh()
+        entry["tried"].update(annots)
+        entry["outstanding"] += len(annots)
+        pending_aggregates[comp_key(entry["base"])] = entry
+        outstanding += len(annots)
+
+    def vote_worker(annot: str):
+        q = work_queues[annot]
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            base, prompt, prefix_len = item
+            try:
+                result = process_single_llm_vote(
+                    annot, base, prompt, existing_keys_copy, *vote_clients[annot],
+                    pbar_map[annot], cache, prefix_len
+                )
+            except Exception as e:
+                print(f"[WARN] {annot} vote failed: {e}")
+                result = None
+            results.put((annot, comp_key(base), result))
+
+    def finish_comparison(entry: dict):
+        nonlocal aggregates_added, aggregates_skipped
+        votes, base = entry["votes"], entry["base"]
+        if sequential:
+            agg = majority_of(votes)
+            rest = [a for a in judges if a not in entry["tried"]]
+            if agg is None and rest:
+                seq_stats["tie_break"] += 1
+                queue_votes(entry, rest)
+                return
+            if entry["audit"]:
+                seq_stats["audited"] += 1
+                if len(votes) == 3:
+                    audit_votes.append(dict(votes))
+            elif agg is not None and len(votes) == 2:
+                seq_stats["two_vote"] += 1
+        elif all(a in votes for a in LLM_ANNOTATORS):
+            agg = majority_three([votes[a] for a in LLM_ANNOTATORS])
+        else:
+            agg = None
+        if args.active:
+            in_flight[base["source_type"]][(base["model_A"], base["model_B"])] -= 1
+        if agg is None:
+            aggregates_skipped += 1
+            return
+        k_agg = vote_key(base, AGG_ANNOTATOR)
+        if k_agg not in existing_keys:
+            emit({
+                "annotator_type": AGG_ANNOTATOR,
+                **base,
+                "choice": agg,
+                "timestamp": utc_timestamp()
+            })
+            existing_keys.add(k_agg)
+            existing_keys_copy.add(k_agg)
+            aggregates_added += 1
+            if args.active:
+                rankers[base["source_type"]].add_choice(base["model_A"], base["model_B"], agg)
+
+    def start_comparison(base: Dict[str, str]):
+        prefix, suffix = vote_prompt_parts(
+            source_text=base["text"],
+            model_A=base["model_A"],
+            instr_A=base["instruction_A"],
+            resp_A=base["response_A"],
+            model_B=base["model_B"],
+            instr_B=base["instruction_B"],
+            resp_B=base["response_B"]
+        )
 
-    # Process all comparisons with parallel LLM calls
-    with ThreadPoolExecutor(max_workers=MAX_TOTAL_WORKERS) as executor:
-        for base in pending:
-            prompt = build_vote_prompt(
-                source_text=base["text"],
-                model_A=base["model_A"],
-                instr_A=base["instruction_A"],
-                resp_A=base["response_A"],
-                model_B=base["model_B"],
-                instr_B=base["instruction_B"],
-                resp_B=base["response_B"]
-            )
-
-            # Check for existing votes (if not overwriting)
-            votes = {}
-            if not overwrite:
-                for annot in LLM_ANNOTATORS:
-                    k = vote_key(base, annot)
-                    if k in existing_keys:
-                        row_match = existing_df[
-                            (existing_df["annotator_type"] == annot) &
-                            (existing_df["source_type"] == base["source_type"]) &
-                            (existing_df["text_hash"] == base["text_hash"]) &
-                            (existing_df["model_A"] == base["model_A"]) &
-                            (existing_df["model_B"] == base["model_B"])
-                        ]
-                        if not row_match.empty:
-                            cv = row_match.iloc[0]["choice"]
-                            if cv in ("A","B"):
-                                votes[annot] = cv
-
-            # Submit all LLM tasks in parallel
-            futures = []
+        # Check for existing votes (if not overwriting)
+        votes = {}
+        if not overwrite:
             for annot in LLM_ANNOTATORS:
-                if annot not in votes:
-                    future = executor.submit(
-                        process_single_llm_vote,
-                        annot,
-                        base,
-                        prompt,
-                        existing_keys_copy,
-                        openai_client if annot == "GPT_5" else None,
-                        anthro_client if annot == "Claude_Sonnet_4" else None,
-                        gemini_model_obj if annot == "Gemini_2_5_Pro" else None,
-                        pbar_map[annot]
-                    )
-                    futures.append(future)
-
-            # Collect results
-            for future in as_completed(futures):
-                result = future.result()
-                if result:
-                    annot_type, row_data = result
-                    votes[annot_type] = row_data["choice"]
-                    per_llm_stats[annot_type][row_data["choice"]] += 1
-                    structured_success[annot_type] += 1
-                    
-                    with lock:
-                        new_rows.append(row_data)
-                        existing_keys.add(vote_key(base, annot_type))
-                        existing_keys_copy.add(vote_key(base, annot_type))
-                        annotations_since_push += 1
-                else:
-                    # Track failures
-                    for annot in LLM_ANNOTATORS:
-                        if annot not in votes:
-                            structured_fail[annot] += 1
-
-            # Check for aggregate
-            if all(a in votes for a in LLM_ANNOTATORS):
-                agg = majority_three([votes[a] for a in LLM_ANNOTATORS])
-                if agg:
-                    k_agg = vote_key(base, AGG_ANNOTATOR)
-                    if k_agg not in existing_keys:
-                        with lock:
-                            new_rows.append({
-                                "annotator_type": AGG_ANNOTATOR,
-                                **base,
-                                "choice": agg,
-                                "timestamp": utc_timestamp()
-                            })
-                            existing_keys.add(k_agg)
-                            existing_keys_copy.add(k_agg)
-                            annotations_since_push += 1
-                        aggregates_added += 1
-            else:
-                aggregates_skipped += 1
-
-            # Check if we should push to HF
-            if args.push_interval > 0 and annotations_since_push >= args.push_interval:
-                with push_lock:
-                    if annotations_since_push >= args.push_interval:  # Double-check after lock
-                        # Update dataframe with new rows
-                        current_df = pd.concat([existing_df, pd.DataFrame(new_rows)], ignore_index=True)
-                        
-                        # Reorder columns
-                        front = required_cols
-                        trailing = [c for c in current_df.columns if c not in front]
-                        current_df = current_df[front + trailing]
-                        
-                        # Push to HF
-                        if push_to_hf(current_df, hf_token, 
-                                    f"Incremental update: {len(new_rows)} annotations added"):
-                            total_pushes += 1
-                            print(f"\n[PUSH {total_pushes}] Pushed {len(new_rows)} annotations to HF "
-                                  f"(total: {len(current_df)} rows)")
-                            # Update existing_df to include new rows
-                            existing_df = current_df
-                            annotations_since_push = 0
+                cv = existing_choices.get(vote_key(base, annot))
+                if cv is not None:
+                    votes[annot] = cv
+
+        audit = sequential and is_audit(base, args.audit_fraction)
+        first = judges[:2] if sequential and not audit else LLM_ANNOTATORS
+        entry = {"base": base, "prompt": prefix + suffix, "prefix_len": len(prefix), "votes": votes,
+                 "tried": set(votes), "outstanding": 0, "audit": audit}
+        if sequential and not audit and majority_of(votes) is not None:
+            first = []  # already decided by two stored votes
+        missing = [a for a in first if a not in votes]
+        if missing:
+            queue_votes(entry, missing)
+        else:
+            finish_comparison(entry)
+
+    # Active selection: per source, a Bradley-Terry posterior over the
+    # aggregates picks the most informative model pair; one of its pending
+    # comparisons is started whenever a slot frees up, until the ranking is
+    # settled, the pool is empty or --limit comparisons have been started.
+    rankers: Dict[str, ActiveRanker] = {}
+    pool: Dict[str, Dict[tuple, deque]] = defaultdict(lambda: defaultdict(deque))
+    in_flight: Dict[str, Dict[tuple, int]] = defaultdict(lambda: defaultdict(int))
+    started = 0
+
+    def feed():
+        nonlocal started
+        while (args.limit is None or started < args.limit) and \
+                sum(n for d in in_flight.values() for n in d.values()) < ACTIVE_IN_FLIGHT:
+            best, best_score = None, 0.0
+            for src, ranker in rankers.items():
+                pair, score = ranker.next_pair([p for p, q in pool[src].items() if q], in_flight[src])
+                if pair is not None and score > best_score:
+                    best, best_score = (src, pair), score
+            if best is None:
+                return
+            src, pair = best
+            in_flight[src][pair] += 1
+            started += 1
+            start_comparison(pool[src][pair].popleft())
+
+    if args.active:
+        for src, g in comp_df.groupby("source_type"):
+            rankers[src] = ActiveRanker(pd.concat([g["model_A"], g["model_B"]]).unique())
+        agg_rows = existing_df[existing_df["annotator_type"].eq(AGG_ANNOTATOR)]
+        for r in agg_rows.itertuples():
+            if r.source_type in rankers and {r.model_A, r.model_B} <= set(rankers[r.source_type].idx):
+                rankers[r.source_type].add_choice(r.model_A, r.model_B, r.choice)
+        for base in pending:
+            pool[base["source_type"]][(base["model_A"], base["model_B"])].append(base)
+        feed()
+    else:
+        for base in pending:
+            start_comparison(base)
+
+    # Create progress bars for each LLM (tie-breaks raise the totals as they are queued)
+    pbar_map.update({
+        "GPT_5": tqdm(total=tasks_per_llm["GPT_5"], desc="GPT-5", unit="votes", position=0),
+        "Gemini_2_5_Pro": tqdm(total=tasks_per_llm["Gemini_2_5_Pro"], desc="Gemini 2.5 Pro", unit="votes", position=1),
+        "Claude_Sonnet_4": tqdm(total=tasks_per_llm["Claude_Sonnet_4"], desc="Claude Sonnet 4", unit="votes", position=2),
+    })
+
+    workers = []
+    for annot in LLM_ANNOTATORS:
+        for i in range(WORKERS_PER_LLM[annot]):
+            t = threading.Thread(target=vote_worker, args=(annot,), name=f"vote:{annot}:{i}", daemon=True)
+            t.start()
+            workers.append(t)
+
+    while outstanding:
+        annot, ck, result = results.get()
+        outstanding -= 1
+        entry = pending_aggregates[ck]
+        if result:
+            _, row_data = result
+            entry["votes"][annot] = row_data["choice"]
+            per_llm_stats[annot][row_data["choice"]] += 1
+            structured_success[annot] += 1
+            emit(row_data)
+            existing_keys.add(vote_key(entry["base"], annot))
+            existing_keys_copy.add(vote_key(entry["base"], annot))
+        else:
+            structured_fail[annot] += 1
+        entry["outstanding"] -= 1
+        if entry["outstanding"] == 0:
+            finish_comparison(pending_aggregates.pop(ck))
+            if args.active:
+                feed()
+
+    # stop markers only now: tie-breaks can be queued until the last vote is in
+    for annot in LLM_ANNOTATORS:
+        for _ in range(WORKERS_PER_LLM[annot]):
+            work_queues[annot].put(None)
+    for t in workers:
+        t.join()
 
     # Close progress bars
-    pbar_gpt.close()
-    pbar_gemini.close()
-    pbar_claude.close()
+    for pbar in pbar_map.values():
+        pbar.close()
+
+    # Seal the last shard and wait for the uploader to drain
+    uploaded = sync.close()
 
-    # Final update and push
+    # Local snapshot of the full table
     if new_rows:
         existing_df = pd.concat([existing_df, pd.DataFrame(new_rows)], ignore_index=True)
 
@@ -604,26 +825,54 @@ def main():
     tmp.replace(ANNOT_CSV_LOCAL)
     print(f"\nSaved updated annotations to {ANNOT_CSV_LOCAL}")
 
-    # Final push if there are remaining annotations or if no incremental pushes were done
-    if annotations_since_push > 0 or (args.push_interval == 0 and new_rows):
-        if push_to_hf(existing_df, hf_token, 
-                     f"Final update: {len(new_rows)} total annotations added"):
-            total_pushes += 1
-            print(f"Final push: {HF_FILENAME} to HF repo {HF_REPO}")
-        else:
-            print(f"[WARN] Final push failed")
+    # Periodic compaction: fold the shards into HF_FILENAME once enough pile up
+    if uploaded and args.compact_after > 0:
+        try:
+            n_shards = len(hf_sync.list_shards(hub.list_files(), HF_FILENAME))
+            if n_shards >= args.compact_after:
+                hf_sync.compact(hub, HF_FILENAME, KEY_COLS, required_cols)
+        except Exception as e:
+            print(f"[WARN] Compaction failed (shards stay until the next run): {e}")
 
     print("\n=== Run Summary ===")
     for annot, d in per_llm_stats.items():
         print(f"{annot}: A={d['A']} B={d['B']}")
     print(f"Aggregate rows added: {aggregates_added}")
     print(f"Comparisons lacking 3 votes (no aggregate): {aggregates_skipped}")
+    if sequential:
+        print(f"Sequential voting (first {judges[0]}, {judges[1]}; tie-breaker {judges[2]}): "
+              f"{seq_stats['two_vote']} decided by two votes, {seq_stats['tie_break']} tie-breaks, "
+              f"{seq_stats['audited']} audited with all three")
+        if audit_votes:
+            print(f"Audit agreement over {len(audit_votes)} three-way votes:")
+            for i in range(3):
+                for j in range(i + 1, 3):
+                    a, b = judges[i], judges[j]
+                    agree = sum(v[a] == v[b] for v in audit_votes) / len(audit_votes)
+                    print(f"  {a} vs {b}: {agree:.0%}")
+    if args.active:
+        print(f"Active selection: {started} of {len(pending)} pooled comparisons started")
+        for src, ranker in sorted(rankers.items()):
+            print(f"Ranking [{src}]: {ranker.summary()}")
     print("Structured success/fail:")
     for a in LLM_ANNOTATORS:
         print(f"  {a}: success={structured_success[a]} fail={structured_fail[a]}")
     print(f"New rows added (incl aggregate): {len(new_rows)}")
-    if args.push_interval > 0:
-        print(f"Total incremental pushes to HF: {total_pushes}")
+    print(cache.summary())
+    print("Rate limiter:")
+    for key, st in limiter_stats().items():
+        print(f"  {key}: requests={st['requests']} waited={st['waited_s']:.1f}s "
+              f"rate_limit_pauses={st['retry_after']}")
+    llm_clients.print_pool_stats()
+    hedging.print_hedge_stats()
+    print("Prompt cache (share of input tokens served from provider prefix caches):")
+    for (provider, model), t in llm_ledger.session_totals().items():
+        if t["in"]:
+            print(f"  {provider}/{model}: {t['cached'] / t['in']:.0%} of {t['in']} input tokens")
+    print(f"Token/cost ledger: {llm_ledger.LEDGER_PATH} (python llm_ledger.py for a summary)")
+    st = sync.stats
+    print(f"HF sync: {st['rows']} rows in {st['shards']} shards, {st['commits']} commits "
+          f"({st['failed_commits']} failed)")
     print("Done.")
 
 if __name__ == "__main__":
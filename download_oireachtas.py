@@ -1,52 +1,134 @@
 # URL: https://huggingface.co/datasets/jmcinern/Oireachtas_XML/tree/main
 # File:  debates_all_with_lang.csv
 # download this file and store in the same directory as this script
+#
+# Fallback path (when hf_hub_download fails) is a resumable, parallel
+# HTTP Range downloader:
+#   - file is split into SEGMENT_SIZE byte ranges, fetched on N_CONNECTIONS
+#   - ranges are written in place into a preallocated "<file>.part"
+#   - finished segments are recorded in a sidecar "<file>.part.json" manifest,
+#     so an interrupted run only fetches the missing segments
+#   - sha256 is verified at the end (against HF's X-Linked-Etag for LFS files)
 
+import hashlib
+import json
 import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 REPO_ID = "jmcinern/Oireachtas_XML"
 FNAME = "debates_all_with_lang.csv"
 OUT_DIR = Path(__file__).resolve().parent
 OUT_PATH = OUT_DIR / FNAME
 
-if OUT_PATH.exists():
-    print(f"{OUT_PATH.name} already exists at {OUT_PATH}")
-    raise SystemExit(0)
-
-# Try huggingface_hub first (will use HF token if available in env)
-try:
-    from huggingface_hub import hf_hub_download
-    print("Attempting download via huggingface_hub...")
-    local = hf_hub_download(repo_id=REPO_ID, filename=FNAME, repo_type="dataset")
-    # hf_hub_download returns a path in HF cache — copy to script dir
-    shutil.copy(local, OUT_PATH)
-    print(f"Downloaded {FNAME} to {OUT_PATH}")
-    raise SystemExit(0)
-except Exception as e:
-    print(f"hf_hub_download failed: {e} — falling back to direct HTTP download")
-
-# Fallback: raw file URL on huggingface (resolve main)
-try:
-    import requests
+SEGMENT_SIZE = 64 * 1_048_576  # 64MB per Range request
+N_CONNECTIONS = 8
+CHUNK_SIZE = 1_048_576  # 1MB read size within a segment
+SEGMENT_RETRIES = 3
+TIMEOUT = 60
+
+
+def manifest_path(part_path: Path) -> Path:
+    return part_path.with_name(part_path.name + ".json")
+
+
+def load_manifest(path: Path) -> Dict:
+    if not path.exists():
+        return {}
     try:
-        from tqdm import tqdm
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
     except Exception:
-        tqdm = None
+        return {}
+
+
+def save_manifest(path: Path, manifest: Dict):
+    # atomic replace so a crash never leaves a half-written manifest
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+
+
+def probe(session, url: str) -> Tuple[str, int, bool, Optional[str], Optional[str]]:
+    """
+    Returns (final_url, size, accepts_ranges, etag, expected_sha256).
+    HF resolve URLs redirect to a CDN; the sha256 of LFS files is exposed on the
+    first hop as X-Linked-Etag, so read it before following redirects.
+    """
+    r = session.head(url, allow_redirects=False, timeout=TIMEOUT)
+    expected_sha = (r.headers.get("x-linked-etag") or "").strip('"') or None
+    r = session.head(url, allow_redirects=True, timeout=TIMEOUT)
+    r.raise_for_status()
+    size = int(r.headers.get("content-length", 0))
+    accepts_ranges = r.headers.get("accept-ranges", "").lower() == "bytes"
+    etag = r.headers.get("etag")
+    if expected_sha is None and etag:
+        cand = etag.strip('"').removeprefix("W/").strip('"')
+        if len(cand) == 64 and all(c in "0123456789abcdef" for c in cand.lower()):
+            expected_sha = cand
+    return r.url, size, accepts_ranges, etag, expected_sha
 
-    url = f"https://huggingface.co/datasets/{REPO_ID}/resolve/main/{FNAME}"
-    print(f"Downloading from {url} ...")
-    with requests.get(url, stream=True, timeout=60) as r:
+
+def plan_segments(size: int, segment_size: int) -> List[Tuple[int, int]]:
+    # inclusive byte ranges, as used by the Range header
+    return [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+
+
+def fetch_segment(url: str, part_path: Path, start: int, end: int, local: threading.local, pbar=None):
+    import requests
+    if not hasattr(local, "session"):
+        local.session = requests.Session()
+    expected = end - start + 1
+    last_err = None
+    for _ in range(SEGMENT_RETRIES):
+        written = 0
+        try:
+            headers = {"Range": f"bytes={start}-{end}"}
+            with local.session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+                if r.status_code != 206:
+                    raise RuntimeError(f"expected 206 for range {start}-{end}, got {r.status_code}")
+                with open(part_path, "r+b") as f:
+                    f.seek(start)
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        written += len(chunk)
+                        if pbar:
+                            pbar.update(len(chunk))
+            if written != expected:
+                raise RuntimeError(f"short read for range {start}-{end}: {written}/{expected} bytes")
+            return
+        except Exception as e:
+            last_err = e
+            if pbar and written:
+                pbar.update(-written)
+    raise RuntimeError(f"segment {start}-{end} failed: {last_err}")
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE * 8), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def download_stream(session, url: str, out_path: Path, tqdm=None):
+    # single connection, used when the server does not support Range requests
+    part_path = out_path.with_name(out_path.name + ".part")
+    with session.get(url, stream=True, timeout=TIMEOUT) as r:
         r.raise_for_status()
         total = int(r.headers.get("content-length", 0))
-        chunk_size = 1_048_576  # 1MB
-        if tqdm and total:
-            pbar = tqdm(total=total, unit="B", unit_scale=True)
-        else:
-            pbar = None
-        with open(OUT_PATH, "wb") as f:
-            for chunk in r.iter_content(chunk_size=chunk_size):
+        pbar = tqdm(total=total, unit="B", unit_scale=True) if tqdm and total else None
+        with open(part_path, "wb") as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
                 if not chunk:
                     continue
                 f.write(chunk)
@@ -54,64 +136,118 @@ try:
                     pbar.update(len(chunk))
         if pbar:
             pbar.close()
-    print(f"Downloaded {FNAME} to {OUT_PATH}")
-except Exception as e:
-    print("Download failed:", e)
-    raise SystemExit(1)
-# filepath: c:\Users\josep\VS-code-projects\Instruction_DPO_Ga\download_oireachtas.py
-import os
-import shutil
-from pathlib import Path
+    part_path.replace(out_path)
 
-REPO_ID = "jmcinern/Oireachtas_XML"
-FNAME = "debates_all_with_lang.csv"
-OUT_DIR = Path(__file__).resolve().parent
-OUT_PATH = OUT_DIR / FNAME
 
-if OUT_PATH.exists():
-    print(f"{OUT_PATH.name} already exists at {OUT_PATH}")
-    raise SystemExit(0)
-
-# Try huggingface_hub first (will use HF token if available in env)
-try:
-    from huggingface_hub import hf_hub_download
-    print("Attempting download via huggingface_hub...")
-    local = hf_hub_download(repo_id=REPO_ID, filename=FNAME, repo_type="dataset")
-    # hf_hub_download returns a path in HF cache — copy to script dir
-    shutil.copy(local, OUT_PATH)
-    print(f"Downloaded {FNAME} to {OUT_PATH}")
-    raise SystemExit(0)
-except Exception as e:
-    print(f"hf_hub_download failed: {e} — falling back to direct HTTP download")
-
-# Fallback: raw file URL on huggingface (resolve main)
-try:
+def download_ranged(url: str, out_path: Path, n_connections: int = N_CONNECTIONS,
+                    segment_size: int = SEGMENT_SIZE, expected_sha256: Optional[str] = None) -> Path:
+    """
+    Parallel, resumable Range download of url into out_path.
+    Re-running after an interruption resumes from the sidecar manifest.
+    """
     import requests
     try:
         from tqdm import tqdm
     except Exception:
         tqdm = None
 
-    url = f"https://huggingface.co/datasets/{REPO_ID}/resolve/main/{FNAME}"
-    print(f"Downloading from {url} ...")
-    with requests.get(url, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        total = int(r.headers.get("content-length", 0))
-        chunk_size = 1_048_576  # 1MB
-        if tqdm and total:
-            pbar = tqdm(total=total, unit="B", unit_scale=True)
-        else:
-            pbar = None
-        with open(OUT_PATH, "wb") as f:
-            for chunk in r.iter_content(chunk_size=chunk_size):
-                if not chunk:
+    session = requests.Session()
+    final_url, size, accepts_ranges, etag, probed_sha = probe(session, url)
+    expected_sha256 = expected_sha256 or probed_sha
+    if not accepts_ranges or size <= 0:
+        print("Server does not support Range requests — streaming over one connection")
+        download_stream(session, final_url, out_path, tqdm)
+    else:
+        part_path = out_path.with_name(out_path.name + ".part")
+        man_path = manifest_path(part_path)
+        segments = plan_segments(size, segment_size)
+
+        manifest = load_manifest(man_path)
+        same_file = (
+            part_path.exists()
+            and manifest.get("size") == size
+            and manifest.get("etag") == etag
+            and manifest.get("segment_size") == segment_size
+        )
+        if not same_file:
+            manifest = {"url": url, "size": size, "etag": etag, "segment_size": segment_size, "done": []}
+            # preallocate so every segment can be written in place
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+            save_manifest(man_path, manifest)
+        done = set(manifest["done"])
+        todo = [i for i in range(len(segments)) if i not in done]
+        print(f"{len(segments)} segments of {segment_size} bytes; {len(done)} already done, {len(todo)} to fetch")
+
+        pbar = tqdm(total=size, unit="B", unit_scale=True) if tqdm else None
+        if pbar:
+            pbar.update(sum(segments[i][1] - segments[i][0] + 1 for i in done))
+        local = threading.local()
+        man_lock = threading.Lock()
+        failed = []
+        with ThreadPoolExecutor(max_workers=n_connections) as ex:
+            futures = {
+                ex.submit(fetch_segment, final_url, part_path, *segments[i], local, pbar): i
+                for i in todo
+            }
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"[WARN] {e}")
+                    failed.append(i)
                     continue
-                f.write(chunk)
-                if pbar:
-                    pbar.update(len(chunk))
+                with man_lock:
+                    done.add(i)
+                    manifest["done"] = sorted(done)
+                    save_manifest(man_path, manifest)
         if pbar:
             pbar.close()
-    print(f"Downloaded {FNAME} to {OUT_PATH}")
-except Exception as e:
-    print("Download failed:", e)
-    raise SystemExit(1)
\ No newline at end of file
+        if failed:
+            raise RuntimeError(f"{len(failed)} segments failed; re-run to resume")
+        part_path.replace(out_path)
+        man_path.unlink(missing_ok=True)
+
+    if expected_sha256:
+        actual = sha256_file(out_path)
+        if actual != expected_sha256.lower():
+            bad = out_path.with_name(out_path.name + ".corrupt")
+            out_path.replace(bad)
+            raise RuntimeError(f"sha256 mismatch: expected {expected_sha256}, got {actual} (moved to {bad.name})")
+        print(f"sha256 verified: {actual}")
+    else:
+        print("No expected sha256 available — skipping checksum verification")
+    return out_path
+
+
+def main():
+    if OUT_PATH.exists():
+        print(f"{OUT_PATH.name} already exists at {OUT_PATH}")
+        raise SystemExit(0)
+
+    # Try huggingface_hub first (will use HF token if available in env)
+    try:
+        from huggingface_hub import hf_hub_download
+        print("Attempting download via huggingface_hub...")
+        local = hf_hub_download(repo_id=REPO_ID, filename=FNAME, repo_type="dataset")
+        # hf_hub_download returns a path in HF cache — copy to script dir
+        shutil.copy(local, OUT_PATH)
+        print(f"Downloaded {FNAME} to {OUT_PATH}")
+        raise SystemExit(0)
+    except Exception as e:
+        print(f"hf_hub_download failed: {e} — falling back to ranged HTTP download")
+
+    # Fallback: raw file URL on huggingface (resolve main)
+    try:
+        url = f"https://huggingface.co/datasets/{REPO_ID}/resolve/main/{FNAME}"
+        print(f"Downloading from {url} ...")
+        download_ranged(url, OUT_PATH)
+        print(f"Downloaded {FNAME} to {OUT_PATH}")
+    except Exception as e:
+        print("Download failed:", e)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
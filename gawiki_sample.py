@@ -1,47 +1,166 @@
+import argparse
+import hashlib
+import heapq
 import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from datasets import load_dataset, DatasetDict, concatenate_datasets, load_from_disk
 
 
 OUTPUT_TXT = "gawiki_samples.txt"
 CACHE_DIR = os.path.join("cache", "gawiki")
+# Sidecar (row id, text length) index over CACHE_DIR; resampling with a new
+# seed / length window only touches this, not the dataset
+INDEX_PATH = os.path.join("cache", "gawiki_len_index.npz")
+NUM_PROC = os.cpu_count()
+DATASET = "ReliableAI/Irish-Text-Collection"
+SEED = 42
+SAMPLE_SIZE = 160
+MIN_CHARS = 200  # exclusive
+MAX_CHARS = 1000  # exclusive
+# --streaming: stop after this many gawiki candidates passing the length filter
+MAX_CANDIDATES = 20_000
 
 def is_gawiki(example):
     _id = example.get("id")
     return isinstance(_id, str) and _id.split(":", 1)[0] == "gawiki"
 
-# Load from cache if available
-if os.path.isdir(CACHE_DIR):
-    ds_gawiki = load_from_disk(CACHE_DIR)
-    print(f"Loaded cached dataset from {CACHE_DIR}")
-else:
+def is_gawiki_batch(table: pa.Table) -> pa.Array:
+    # Arrow-kernel version of is_gawiki for batched filter
+    ids = table.column("id")
+    mask = pc.or_(pc.equal(ids, "gawiki"), pc.starts_with(ids, "gawiki:"))
+    return pc.fill_null(mask, False)
+
+def text_lengths(table: pa.Table) -> pa.Table:
+    # code-point length like len(str); null text -> -1 so it never passes a window
+    lens = pc.fill_null(pc.utf8_length(table.column("text")), -1)
+    return pa.table({"text_len": pc.cast(lens, pa.int32())})
+
+def is_short(example, min_chars: int = MIN_CHARS, max_chars: int = MAX_CHARS):
+    t = example.get("text", None)
+    return isinstance(t, str) and len(t) > min_chars and len(t) < max_chars
+
+def load_gawiki(dataset: str = DATASET):
+    # Load from cache if available
+    if os.path.isdir(CACHE_DIR):
+        ds_gawiki = load_from_disk(CACHE_DIR)
+        print(f"Loaded cached dataset from {CACHE_DIR}")
+        return ds_gawiki
+
     # 1) import dataset
-    ds = load_dataset("ReliableAI/Irish-Text-Collection")
+    ds = load_dataset(dataset)
 
     # 2) combine available splits into one dataset
     ds_all = concatenate_datasets([ds[s] for s in ds.keys()]) if isinstance(ds, DatasetDict) else ds
 
-    # 3) filter where id prefix == "gawiki"
-    ds_gawiki = ds_all.filter(is_gawiki, num_proc=os.cpu_count())
+    # 3) filter where id prefix == "gawiki" (batched, Arrow compute)
+    ds_gawiki = ds_all.with_format("arrow").filter(is_gawiki_batch, batched=True, num_proc=NUM_PROC)
+    ds_gawiki = ds_gawiki.with_format(None)
 
     # Save to cache for future runs
     os.makedirs(os.path.dirname(CACHE_DIR), exist_ok=True)
     ds_gawiki.save_to_disk(CACHE_DIR)
     print(f"Saved subset to cache: {CACHE_DIR}")
+    # reload so the fingerprint (and length index) match later cached runs
+    return load_from_disk(CACHE_DIR)
+
+def load_length_index(ds_gawiki) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (row_id, text_len) for every row of the cached subset. Built once with a
+    batched Arrow map across NUM_PROC and persisted to INDEX_PATH; rebuilt if
+    the cached dataset changes.
+    """
+    fingerprint = ds_gawiki._fingerprint
+    if os.path.isfile(INDEX_PATH):
+        idx = np.load(INDEX_PATH)
+        if str(idx["fingerprint"]) == fingerprint and len(idx["row_id"]) == len(ds_gawiki):
+            return idx["row_id"], idx["text_len"]
+    lens_ds = ds_gawiki.with_format("arrow").map(
+        text_lengths, batched=True, num_proc=NUM_PROC, remove_columns=ds_gawiki.column_names
+    )
+    text_len = lens_ds.with_format("arrow")[:]["text_len"].to_numpy().astype(np.int32)
+    row_id = np.arange(len(text_len), dtype=np.int64)
+    os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+    np.savez(INDEX_PATH, row_id=row_id, text_len=text_len, fingerprint=np.array(fingerprint))
+    print(f"Saved length index ({len(row_id)} rows) to {INDEX_PATH}")
+    return row_id, text_len
+
+def sample_cached(dataset: str = DATASET, seed: int = SEED, n: int = SAMPLE_SIZE,
+                  min_chars: int = MIN_CHARS, max_chars: int = MAX_CHARS) -> list[str]:
+    ds_gawiki = load_gawiki(dataset)
+    # 4) pick n random rows with min_chars < len < max_chars from the length
+    # index (numpy only), then fetch just those rows' text
+    row_id, text_len = load_length_index(ds_gawiki)
+    candidates = row_id[(text_len > min_chars) & (text_len < max_chars)]
+    rng = np.random.default_rng(seed)
+    pick = rng.choice(candidates, size=min(n, len(candidates)), replace=False)
+    return ds_gawiki.select(pick)[:]["text"]
+
+def stream_key(seed: int, text: str) -> int:
+    # Per-record reservoir key: a seeded hash, so the sample does not depend on
+    # split iteration order
+    return int.from_bytes(hashlib.sha1(f"{seed}\x1e{text}".encode("utf-8")).digest()[:8], "big")
+
+def sample_streaming(dataset: str = DATASET, seed: int = SEED, n: int = SAMPLE_SIZE,
+                     max_candidates: int = MAX_CANDIDATES, min_chars: int = MIN_CHARS,
+                     max_chars: int = MAX_CHARS) -> tuple[list[str], int]:
+    """
+    Iterate the collection lazily (no full download), keep gawiki texts passing
+    the length filter in a seeded top-n reservoir, and stop once
+    max_candidates have been seen (0 = read to the end). With early stop the
+    sample is uniform over the first max_candidates matches, not the corpus.
+    """
+    ds = load_dataset(dataset, streaming=True)
+    splits = [ds[s] for s in ds.keys()] if isinstance(ds, dict) else [ds]
+    heap: list[tuple[int, str]] = []  # min-heap of (key, text)
+    seen = 0
+    for split in splits:
+        for ex in split:
+            if not (is_gawiki(ex) and is_short(ex, min_chars, max_chars)):
+                continue
+            seen += 1
+            item = (stream_key(seed, ex["text"]), ex["text"])
+            if len(heap) < n:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+            if max_candidates and seen >= max_candidates:
+                break
+        if max_candidates and seen >= max_candidates:
+            break
+    return [t for _, t in sorted(heap, reverse=True)], seen
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample short GaWiki texts into seed_data.")
+    parser.add_argument("--dataset", default=DATASET, help="Hub id or local dataset path")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Iterate the collection lazily and stop early instead of caching it")
+    parser.add_argument("--max-candidates", type=int, default=MAX_CANDIDATES,
+                        help="--streaming: stop after this many matching texts (0 = no limit)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--min-chars", type=int, default=MIN_CHARS)
+    parser.add_argument("--max-chars", type=int, default=MAX_CHARS)
+    args = parser.parse_args()
+
+    if args.streaming:
+        texts, seen = sample_streaming(args.dataset, args.seed, SAMPLE_SIZE, args.max_candidates,
+                                       args.min_chars, args.max_chars)
+        print(f"Streamed {seen} matching gawiki texts, sampled {len(texts)}")
+    else:
+        texts = sample_cached(args.dataset, args.seed, SAMPLE_SIZE, args.min_chars, args.max_chars)
 
-# 4) get "text" column as list and randomly take 10 samples under 1000 chars
-ds_short = ds_gawiki.filter(lambda ex: isinstance(ex.get("text", None), str) and len(ex["text"]) > 200 and len(ex["text"]) < 1000)
-ds_short = ds_short.shuffle(seed=42)
-n = min(160, len(ds_short))
-texts = ds_short.select(range(n))["text"]
+    # save two samples of 120 texts for test1 and  40 test fortest2
+    wiki_1 = texts[:120]
+    wiki_2 = texts[120:160]
 
-# save two samples of 120 texts for test1 and  40 test fortest2
-wiki_1 = texts[:120]
-wiki_2 = texts[120:160]
+    # save to folder seed_data, wiki_test1.txt and wiki_test2.txt
+    os.makedirs("seed_data", exist_ok=True)
+    with open("seed_data/wiki_test1.txt", "w", encoding="utf-8") as f:
+        f.write("\n\n\n".join(wiki_1))
 
-# save to folder seed_data, wiki_test1.txt and wiki_test2.txt
-os.makedirs("seed_data", exist_ok=True)
-with open("seed_data/wiki_test1.txt", "w", encoding="utf-8") as f:
-    f.write("\n\n\n".join(wiki_1)) 
+    with open("seed_data/wiki_test2.txt", "w", encoding="utf-8") as f:
+        f.write("\n\n\n".join(wiki_2))
 
-with open("seed_data/wiki_test2.txt", "w", encoding="utf-8") as f:
-    f.write("\n\n\n".join(wiki_2))
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,6 @@ Overview: create first of its kind instruction-tuning dataset for Irish using Ge
 '''
 # Use LIMA for seeding the Oireachtas and Wiki Questions ./LIMA.jsonl
 import json
-import vertexai
 from vertexai.preview.generative_models import GenerativeModel, GenerationConfig
 import time
 from typing import Dict, List, Optional, Tuple
@@ -15,22 +14,41 @@ from tqdm import tqdm
 import argparse
 import asyncio
 
+from rate_limiter import acquire_async, on_error, record_usage
+import hedging
+import llm_clients
+import llm_ledger
+import provider_batch
+
 
 # limit for parsing for testing, then DPO subset, before full trans.
 p = argparse.ArgumentParser()
 p.add_argument("-n","--num", type=int, help="Max pairs to translate")
+provider_batch.add_batch_args(p)
+hedging.add_hedge_args(p)
+# --batch: Vertex batch prediction staged through this bucket prefix; without it
+# the Gemini API batch endpoint is used (key from GOOGLE_API_KEY)
+p.add_argument("--batch-gcs-uri", default=os.getenv("BATCH_GCS_URI"), help="gs://bucket/prefix for Vertex batch")
 args = p.parse_args()
+hedging.configure(args.hedge_fraction, args.hedge_percentile)
 
 
 MAX_RETRIES = 2
 RETRY_SLEEP_SEC = 2.0
 RANDOM_SEED = 42
+MODEL_NAME = 'gemini-2.5-pro'
+MAX_OUTPUT_TOKENS = 4096  # for the TPM estimate; 3 texts per response
 
  # adjust to avoid 429s
 CONCURRENCY = 100
 async def _one(IRT, sem):
-    async with sem:
-        return IRT, await gemini_trans(model, IRT, translation_prompt)
+    async def attempt():
+        # a hedge duplicate takes its own slot, so CONCURRENCY holds with hedging on
+        async with sem:
+            return await gemini_trans(model, IRT, translation_prompt)
+
+    # past the p95 translation latency a duplicate races the straggler
+    return IRT, await hedging.hedged_async(("google", MODEL_NAME), attempt)
 
 
 random.seed(RANDOM_SEED)
@@ -70,17 +88,18 @@ The following is the English prompt-response pair:
 '''
 
 # force JSON response from gemini
+IRT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "instruction": {"type": "STRING"},
+        "response1":    {"type": "STRING"},
+        "response2":    {"type": "STRING"},
+    },
+    "required": ["instruction", "response1", "response2"],
+}
 gen_cfg = GenerationConfig(
     response_mime_type="application/json",
-    response_schema={
-        "type": "OBJECT",
-        "properties": {
-            "instruction": {"type": "STRING"},
-            "response1":    {"type": "STRING"},
-            "response2":    {"type": "STRING"},
-        },
-        "required": ["instruction", "response1", "response2"],
-        }
+    response_schema=IRT_SCHEMA,
 )
 
 # Use LIMA for seeding the Oireachtas and Wiki Questions ./LIMA.jsonl
@@ -108,17 +127,28 @@ async def gemini_trans(model: GenerativeModel, pair_en: dict, prompt: str) -> Op
           instruction_en = pair_en.get("instruction", "")
           response_en = pair_en.get("response", "")
           prompt = prompt + "\n\n" + "\n instruction_en: \n" + instruction_en + "\n response_en: \n" + response_en
-          try:
-              response = await model.generate_content_async(contents=prompt, generation_config=gen_cfg)
-              print(f"Gemini translation response: {response}")
-              return response.text or None
-
-          except:
-              print(f"Gemini translation failed")
-              return None
+          for attempt in range(1 + MAX_RETRIES):
+              try:
+                  est = await acquire_async("google", MODEL_NAME, prompt, MAX_OUTPUT_TOKENS)
+                  hedging.mark_started()
+                  t0 = time.perf_counter()
+                  response = await model.generate_content_async(contents=prompt, generation_config=gen_cfg)
+                  usage = record_usage("google", MODEL_NAME, est, response)
+                  llm_ledger.record("translate", "google", MODEL_NAME, usage, time.perf_counter() - t0,
+                                    attempt, bool(response.text))
+                  print(f"Gemini translation response: {response}")
+                  return response.text or None
+
+              except Exception as e:
+                  llm_ledger.record("translate", "google", MODEL_NAME, attempt=attempt, ok=False)
+                  # a 429 Retry-After pauses the other concurrent translations too
+                  wait = on_error("google", MODEL_NAME, e, RETRY_SLEEP_SEC)
+                  if attempt >= MAX_RETRIES:
+                      print("Gemini translation failed")
+                      return None
+                  await asyncio.sleep(wait)
     
 
-model = GenerativeModel('gemini-2.5-pro')
 file_name = "translated_IRT_ga.jsonl"
 
 # allow rerunning of pipeline buy hasing, read with append mode 
@@ -134,7 +164,8 @@ IRT_ga = [irt for irt in IRT_ga if irt.get("hash") not in already_translated_has
 
 gemini_project_id = "gen-lang-client-0817118952" 
 gcloud_location = "us-central1"
-vertexai.init(project=gemini_project_id, location=gcloud_location)
+# vertexai.init + GenerativeModel once per process (llm_clients)
+model = llm_clients.vertex_model(MODEL_NAME, gemini_project_id, gcloud_location)
 
 
 to_process = IRT_ga[:args.num] if args.num else IRT_ga
@@ -157,9 +188,57 @@ async def main():
             except Exception as e:
                 print("JSON parse error:", e)
                 print("Original response:", translated)
+    hedging.print_hedge_stats()
+
+# --batch: same prompts through the batch API; job ids checkpointed next to the output
+BATCH_CHECKPOINT = file_name + ".batch_jobs.json"
+BATCH_GEN_CFG = {"responseMimeType": "application/json", "responseSchema": IRT_SCHEMA}
+
+
+def batch_main():
+    if args.batch_gcs_uri:
+        client = provider_batch.make_client("google", project=gemini_project_id, location=gcloud_location)
+    else:
+        client = provider_batch.make_client("google")
+    requests, lookup = [], {}
+    for IRT in to_process:
+        cid = IRT["hash"][:40]
+        prompt = (translation_prompt + "\n\n" + "\n instruction_en: \n" + IRT["instruction"]
+                  + "\n response_en: \n" + IRT["response"])
+        requests.append((cid, provider_batch.google_request(prompt, BATCH_GEN_CFG)))
+        lookup[cid] = IRT
+
+    with open(file_name, "a", encoding="utf-8") as f:
+        def on_result(provider, model, cid, obj, error):
+            IRT = lookup.get(cid)
+            if IRT is None or IRT["hash"] in already_translated_hashes:
+                return
+            if not (isinstance(obj, dict) and all(obj.get(k) for k in ("instruction", "response1", "response2"))):
+                print(f"empty/invalid response for {cid}: {error}")
+                return
+            obj["instruction_en"] = IRT["instruction"]
+            obj["response_en"] = IRT["response"]
+            obj["hash"] = IRT["hash"]
+            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            f.flush()
+            already_translated_hashes.add(IRT["hash"])
+            return True
+
+        def sync():
+            f.flush()
+            os.fsync(f.fileno())
+
+        stats = provider_batch.run_batches({("google", MODEL_NAME): requests}, {"google": client},
+                                           BATCH_CHECKPOINT, on_result, args.batch_poll, args.batch_gcs_uri,
+                                           kind="translate", sync=sync)
+    print(stats)
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if args.batch:
+        batch_main()
+    else:
+        asyncio.run(main())
 
 
 
@@ -0,0 +1,237 @@
+# Hedged requests against tail latency.
+# Per (provider, model) the recent call latencies are kept in a rolling window;
+# once a call has run longer than the window's HEDGE_PERCENTILE, an identical
+# duplicate is fired and the first valid answer wins. The loser is cancelled
+# (asyncio) or its result discarded (threads: a running HTTP call cannot be
+# interrupted). Duplicates are capped at MAX_HEDGE_FRACTION of primary calls,
+# so extra spend is bounded.
+# Latency is timed from mark_started(), which the wrapped call runs once the
+# rate limiter admits it, so limiter and semaphore waits neither feed the
+# percentile nor count towards the hedge threshold. A duplicate is an
+# ordinary call: it takes its own concurrency slot. In the thread variant the
+# primary never takes a HEDGE_THREADS pool slot (the caller's thread runs it
+# when hedging is not armed, its own thread otherwise), so provider worker
+# pools do not compete for the shared pool; only duplicates use it.
+#
+#   data = await hedged_async(("google", model), lambda: call_google(client, model, prompt))
+#   vote = hedged_call(("openai", model), lambda: openai_vote(client, model, prompt))
+#   # inside call_google / openai_vote: acquire(...); mark_started(); <request>
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+HEDGE_PERCENTILE = 95.0
+HEDGE_WINDOW = 200        # latencies kept per (provider, model)
+HEDGE_MIN_SAMPLES = 20    # no hedging until the percentile means something
+HEDGE_MIN_DELAY = 1.0     # seconds; never hedge faster than this
+MAX_HEDGE_FRACTION = 0.1  # duplicates per primary call, 0 disables hedging
+HEDGE_THREADS = 32        # pool for the thread variant's duplicates
+
+Key = Tuple[str, str]
+
+_lock = threading.Lock()
+_latencies: Dict[Key, deque] = defaultdict(lambda: deque(maxlen=HEDGE_WINDOW))
+_stats: Dict[Key, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+_pool: Optional[ThreadPoolExecutor] = None
+# per-attempt [start time] set by mark_started(); None until the call is admitted
+_started: contextvars.ContextVar = contextvars.ContextVar("hedge_started", default=None)
+
+
+def _valid(result) -> bool:
+    return bool(result)
+
+
+def record_latency(key: Key, seconds: float):
+    with _lock:
+        _latencies[key].append(seconds)
+
+
+def threshold(key: Key) -> Optional[float]:
+    """Seconds after which a call to key is hedged, or None (not enough data / disabled)."""
+    if MAX_HEDGE_FRACTION <= 0:
+        return None
+    with _lock:
+        lat = sorted(_latencies[key])
+    if len(lat) < HEDGE_MIN_SAMPLES:
+        return None
+    idx = min(len(lat) - 1, int(len(lat) * HEDGE_PERCENTILE / 100.0))
+    return max(HEDGE_MIN_DELAY, lat[idx])
+
+
+def mark_started():
+    """Start the latency clock of the current hedged attempt (no-op outside one)."""
+    holder = _started.get()
+    if holder is not None:
+        holder[0] = time.perf_counter()
+
+
+def _remaining(holder: list, limit: float) -> float:
+    """Seconds until an attempt started at holder[0] passes limit (limit if not started)."""
+    return limit if holder[0] is None else limit - (time.perf_counter() - holder[0])
+
+
+def _record(key: Key, holder: list):
+    if holder[0] is not None:
+        record_latency(key, time.perf_counter() - holder[0])
+
+
+def _take_budget(key: Key) -> bool:
+    with _lock:
+        s = _stats[key]
+        if s["hedged"] + 1 > MAX_HEDGE_FRACTION * s["calls"]:
+            s["budget_denied"] += 1
+            return False
+        s["hedged"] += 1
+        return True
+
+
+def _count(key: Key, field: str, n: float = 1):
+    with _lock:
+        _stats[key][field] += n
+
+
+async def _attempt(make_call: Callable[[], Awaitable[Any]], holder: list) -> Any:
+    _started.set(holder)  # the task runs in its own context copy
+    return await make_call()
+
+
+async def hedged_async(key: Key, make_call: Callable[[], Awaitable[Any]],
+                       valid: Callable[[Any], bool] = _valid) -> Any:
+    """Await make_call(); past the latency threshold, race it against a duplicate."""
+    _count(key, "calls")
+    first = [None]
+    primary = asyncio.ensure_future(_attempt(make_call, first))
+    limit = threshold(key)
+    if limit is not None:
+        done = False
+        while not done and _remaining(first, limit) > 0:
+            done = bool((await asyncio.wait({primary}, timeout=_remaining(first, limit)))[0])
+        if not done and _take_budget(key):
+            second = [None]
+            hedge = asyncio.ensure_future(_attempt(make_call, second))
+            holders = {primary: first, hedge: second}
+            pending, fallback = {primary, hedge}, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled() or task.exception() is not None:
+                        fallback = fallback or task
+                        continue
+                    result = task.result()
+                    if valid(result):
+                        for other in pending:
+                            other.cancel()
+                            _count(key, "cancelled")
+                        _count(key, "hedge_won" if task is hedge else "primary_won")
+                        _record(key, holders[task])
+                        return result
+                    fallback = task
+            # neither produced a valid answer: behave like the primary alone
+            return (primary if not primary.cancelled() else fallback).result()
+    result = await primary
+    _record(key, first)
+    return result
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="hedge")
+        return _pool
+
+
+def _run_attempt(fn: Callable[[], Any], holder: list) -> Any:
+    token = _started.set(holder)
+    try:
+        return fn()
+    finally:
+        _started.reset(token)
+
+
+def _start_primary(fn: Callable[[], Any], holder: list) -> Future:
+    """Run fn on a thread of its own (not the shared pool), in a copy of the caller's context."""
+    fut: Future = Future()
+    ctx = contextvars.copy_context()  # llm_ledger.ATTEMPT etc.
+
+    def run():
+        fut.set_running_or_notify_cancel()
+        try:
+            fut.set_result(ctx.run(_run_attempt, fn, holder))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=run, name="hedge-primary", daemon=True).start()
+    return fut
+
+
+def hedged_call(key: Key, fn: Callable[[], Any], valid: Callable[[Any], bool] = _valid) -> Any:
+    """Thread variant of hedged_async for the sync SDK clients."""
+    limit = threshold(key)
+    _count(key, "calls")
+    first = [None]
+    if limit is None:
+        result = _run_attempt(fn, first)
+        _record(key, first)
+        return result
+    # the caller's thread stays free to return a winning duplicate's answer
+    primary = _start_primary(fn, first)
+    done = False
+    while not done and _remaining(first, limit) > 0:
+        done = bool(wait({primary}, timeout=_remaining(first, limit))[0])
+    if done or not _take_budget(key):
+        result = primary.result()
+        _record(key, first)
+        return result
+    second = [None]
+    hedge = _get_pool().submit(contextvars.copy_context().run, _run_attempt, fn, second)
+    holders = {primary: first, hedge: second}
+    pending, fallback = {primary, hedge}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is not None:
+                fallback = fallback or fut
+                continue
+            if valid(fut.result()):
+                for other in pending:
+                    other.cancel()  # only stops it if not yet started; otherwise discarded
+                    _count(key, "cancelled")
+                _count(key, "hedge_won" if fut is hedge else "primary_won")
+                _record(key, holders[fut])
+                return fut.result()
+            fallback = fut
+    return (primary if primary.exception() is None else fallback).result()
+
+
+def hedge_stats() -> Dict[str, Dict[str, float]]:
+    with _lock:
+        return {f"{p}/{m}": dict(s) for (p, m), s in _stats.items()}
+
+
+def print_hedge_stats():
+    for key, s in hedge_stats().items():
+        if s.get("hedged"):
+            print(f"  hedge {key}: {int(s['hedged'])} duplicates for {int(s['calls'])} calls "
+                  f"({s['hedged'] / s['calls']:.1%}), hedge won {int(s.get('hedge_won', 0))}, "
+                  f"primary won {int(s.get('primary_won', 0))}, budget denied {int(s.get('budget_denied', 0))}")
+
+
+def configure(fraction: Optional[float] = None, percentile: Optional[float] = None):
+    global MAX_HEDGE_FRACTION, HEDGE_PERCENTILE
+    if fraction is not None:
+        MAX_HEDGE_FRACTION = fraction
+    if percentile is not None:
+        HEDGE_PERCENTILE = percentile
+
+
+def add_hedge_args(parser):
+    parser.add_argument("--hedge-fraction", type=float, default=MAX_HEDGE_FRACTION,
+                        help="Max duplicate (hedged) requests per primary call; 0 disables hedging")
+    parser.add_argument("--hedge-percentile", type=float, default=HEDGE_PERCENTILE,
+                        help="Hedge a call once it runs past this per-model latency percentile")
@@ -0,0 +1,306 @@
+# Append-only sync of annotation rows to a Hugging Face dataset repo.
+# New rows are written locally as small immutable shards
+# (shards/<stem>-<run>-<seq>.parquet, JSONL if pyarrow is missing) and a
+# background thread uploads every pending shard in one Hub commit at most
+# every COMMIT_SECONDS. Nothing already on the Hub is rewritten per push.
+#
+# compact() folds the shards into the main file and deletes them in a single
+# commit, so readers of the main CSV catch up and the shard count stays small.
+# Readers that want the live state use load_all (main file + shards, plus
+# local shards a failed upload left in SHARD_DIR when local_dir is given).
+# Rows are replaced by appending (last row per key wins) and deleted by
+# appending a tombstone row for the key (ShardSync.delete); compaction drops
+# both the tombstones and the rows they cover.
+#
+#   hub = HfHub(repo_id, token)          # or LocalHub("hub_dir") as a stand-in
+#   sync = ShardSync(hub, "annotations.csv")
+#   sync.add(row); ...; sync.close()
+#   df = load_all(hub, "annotations.csv", key_cols, local_dir=SHARD_DIR)
+#   compact(hub, "annotations.csv", key_cols)
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+SHARD_DIR = Path("outputs/annotation_shards")  # local copies, kept until uploaded
+SHARD_PREFIX = "shards"                         # folder in the repo
+SHARD_ROWS = 50
+COMMIT_SECONDS = 60.0  # Hub commits are rate limited; batch shards per commit
+COMPACT_AFTER = 20     # shards on the Hub before a run compacts them
+TOMBSTONE_COL = "tombstone"
+# one annotation row per key (combined_LLM_annotation.py); compaction default
+ANNOTATION_KEY_COLS = ["source_type", "text_hash", "model_A", "model_B", "annotator_type"]
+
+
+class LocalHub:
+    """Directory with the same interface as HfHub, for dry runs and tests."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def list_files(self) -> List[str]:
+        return sorted(p.relative_to(self.root).as_posix() for p in self.root.rglob("*") if p.is_file())
+
+    def download(self, path_in_repo: str) -> str:
+        return str(self.root / path_in_repo)
+
+    def commit(self, adds: Dict[str, str], deletes: List[str], message: str):
+        for path_in_repo, local in adds.items():
+            dst = self.root / path_in_repo
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            tmp = dst.with_name(dst.name + ".tmp")
+            shutil.copyfile(local, tmp)
+            os.replace(tmp, dst)
+        for path_in_repo in deletes:
+            (self.root / path_in_repo).unlink(missing_ok=True)
+
+
+class HfHub:
+    def __init__(self, repo_id: str, token: Optional[str] = None, repo_type: str = "dataset"):
+        from huggingface_hub import HfApi
+        self.repo_id, self.token, self.repo_type = repo_id, token, repo_type
+        self.api = HfApi(token=token)
+        self._created = False
+
+    def list_files(self) -> List[str]:
+        try:
+            return self.api.list_repo_files(self.repo_id, repo_type=self.repo_type)
+        except Exception as e:
+            if "404" in str(e) or type(e).__name__ == "RepositoryNotFoundError":
+                return []
+            raise
+
+    def download(self, path_in_repo: str) -> str:
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(repo_id=self.repo_id, filename=path_in_repo,
+                               repo_type=self.repo_type, token=self.token)
+
+    def commit(self, adds: Dict[str, str], deletes: List[str], message: str):
+        from huggingface_hub import CommitOperationAdd, CommitOperationDelete, create_repo
+        if not self._created:
+            create_repo(self.repo_id, repo_type=self.repo_type, exist_ok=True, token=self.token)
+            self._created = True
+        ops = [CommitOperationAdd(path_in_repo=p, path_or_fileobj=local) for p, local in adds.items()]
+        ops += [CommitOperationDelete(path_in_repo=p) for p in deletes]
+        self.api.create_commit(repo_id=self.repo_id, repo_type=self.repo_type, operations=ops,
+                               commit_message=message)
+
+
+def _stem(main_file: str) -> str:
+    return Path(main_file).stem
+
+
+def list_shards(files: List[str], main_file: str) -> List[str]:
+    """Shard paths for main_file, oldest first (names sort by run then sequence)."""
+    head = f"{SHARD_PREFIX}/{_stem(main_file)}-"
+    return sorted(f for f in files if f.startswith(head) and f.endswith((".parquet", ".jsonl")))
+
+
+def write_shard(rows: List[dict], path: Path) -> Path:
+    """Write rows as Parquet (or JSONL without pyarrow); returns the final path."""
+    df = pd.DataFrame(rows)
+    try:
+        import pyarrow  # noqa: F401
+        path = path.with_suffix(".parquet")
+        tmp = path.with_name(path.name + ".tmp")
+        df.to_parquet(tmp, index=False)
+    except ImportError:
+        path = path.with_suffix(".jsonl")
+        tmp = path.with_name(path.name + ".tmp")
+        df.to_json(tmp, orient="records", lines=True, force_ascii=False)
+    os.replace(tmp, path)
+    return path
+
+
+def read_shard(path: str) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_json(path, orient="records", lines=True, dtype=False)
+
+
+def load_all(hub, main_file: str, key_cols: Optional[List[str]] = None,
+             local_dir=None) -> pd.DataFrame:
+    """
+    Main file plus every shard, in commit order. With key_cols, later rows win
+    (an --overwrite-llm run appends replacements rather than editing old rows)
+    and a key whose last row is a tombstone is dropped. With local_dir, shards
+    still waiting there for upload are read too, in name order with the rest.
+    """
+    files = hub.list_files()
+    parts = []
+    if main_file in files:
+        parts.append(pd.read_csv(hub.download(main_file)))
+    shards = {p: hub.download(p) for p in list_shards(files, main_file)}
+    if local_dir is not None and Path(local_dir).is_dir():
+        local = list_shards([f"{SHARD_PREFIX}/{p.name}" for p in Path(local_dir).iterdir()], main_file)
+        for p in local:
+            shards.setdefault(p, str(Path(local_dir) / Path(p).name))
+    parts += [read_shard(shards[p]) for p in sorted(shards)]
+    if not parts:
+        return pd.DataFrame()
+    df = pd.concat(parts, ignore_index=True)
+    if key_cols and all(c in df.columns for c in key_cols):
+        for c in key_cols:
+            df[c] = df[c].astype(str)
+        df = df.drop_duplicates(subset=key_cols, keep="last").reset_index(drop=True)
+    if TOMBSTONE_COL in df.columns:
+        dead = df[TOMBSTONE_COL].fillna(False).astype(bool)
+        df = df[~dead].drop(columns=TOMBSTONE_COL).reset_index(drop=True)
+    return df
+
+
+def compact(hub, main_file: str, key_cols: List[str] = ANNOTATION_KEY_COLS,
+            columns: Optional[List[str]] = None) -> int:
+    """Fold all shards into main_file in one commit; returns shards merged."""
+    shards = list_shards(hub.list_files(), main_file)
+    if not shards:
+        return 0
+    df = load_all(hub, main_file, key_cols)
+    missing = [c for c in key_cols if c not in df.columns]
+    if missing:
+        # without the keys, superseded and tombstoned rows would be written back
+        raise ValueError(f"{main_file} has no key columns {missing}; pass the file's key columns")
+    if columns:
+        df = df[[c for c in columns if c in df.columns] + [c for c in df.columns if c not in columns]]
+    with tempfile.TemporaryDirectory() as d:
+        tmp = os.path.join(d, Path(main_file).name)
+        df.to_csv(tmp, index=False)
+        # shards uploaded after the listing are not deleted, so nothing is lost
+        hub.commit({main_file: tmp}, shards, f"Compact {len(shards)} shards into {main_file} ({len(df)} rows)")
+    print(f"[INFO] Compacted {len(shards)} shards into {main_file} ({len(df)} rows)")
+    return len(shards)
+
+
+class ShardSync:
+    """Buffers rows into shards and uploads them from a background thread."""
+
+    def __init__(self, hub, main_file: str, local_dir=SHARD_DIR, shard_rows: Optional[int] = SHARD_ROWS,
+                 commit_seconds: float = COMMIT_SECONDS):
+        self.hub, self.main_file = hub, main_file
+        self.local_dir = Path(local_dir)
+        self.local_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_rows = shard_rows  # None/0: one shard at close
+        self.commit_seconds = commit_seconds
+        self.run_id = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + f"-{os.getpid()}"
+        self.buffer: List[dict] = []
+        self.seq = 0
+        self.pending: Dict[str, str] = {}  # path_in_repo -> local shard
+        self.stats = {"rows": 0, "shards": 0, "commits": 0, "failed_commits": 0}
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self._resume()
+        self.thread = threading.Thread(target=self._run, name="hf-sync", daemon=True)
+        self.thread.start()
+
+    def _resume(self):
+        """Queue local shards from an earlier run that never reached the Hub."""
+        local = {f"{SHARD_PREFIX}/{p.name}": str(p) for p in self.local_dir.iterdir()
+                 if p.suffix in (".parquet", ".jsonl") and p.name.startswith(_stem(self.main_file) + "-")}
+        if not local:
+            return
+        uploaded = set(self.hub.list_files())
+        for path_in_repo, path in local.items():
+            if path_in_repo in uploaded:
+                os.unlink(path)
+            else:
+                self.pending[path_in_repo] = path
+        if self.pending:
+            print(f"[INFO] Re-queued {len(self.pending)} shards not uploaded by an earlier run")
+
+    def add(self, row: dict):
+        with self.lock:
+            self.buffer.append(row)
+            full = bool(self.shard_rows) and len(self.buffer) >= self.shard_rows
+        if full:
+            self.flush()
+
+    def delete(self, key: dict):
+        """Append a tombstone: rows with these key values, up to here, are gone."""
+        self.add({**key, TOMBSTONE_COL: True})
+
+    def flush(self):
+        """Seal buffered rows into an immutable shard and queue it for upload."""
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+            if not rows:
+                return
+            self.seq += 1
+            name = f"{_stem(self.main_file)}-{self.run_id}-{self.seq:05d}"
+        path = write_shard(rows, self.local_dir / name)
+        with self.lock:
+            self.pending[f"{SHARD_PREFIX}/{path.name}"] = str(path)
+            self.stats["rows"] += len(rows)
+            self.stats["shards"] += 1
+
+    def _upload(self) -> bool:
+        with self.lock:
+            batch = dict(self.pending)
+        if not batch:
+            return True
+        try:
+            rows = self.stats["rows"]
+            self.hub.commit(batch, [], f"Append {len(batch)} annotation shards ({rows} rows this run)")
+        except Exception as e:
+            self.stats["failed_commits"] += 1
+            print(f"[WARN] Shard upload failed ({len(batch)} shards kept for retry): {e}")
+            return False
+        with self.lock:
+            for path_in_repo, local in batch.items():
+                self.pending.pop(path_in_repo, None)
+                os.unlink(local)
+            self.stats["commits"] += 1
+        return True
+
+    def _run(self):
+        # one commit per interval carrying every shard sealed since the last
+        while not self.stop.wait(self.commit_seconds):
+            self._upload()
+
+    def close(self) -> bool:
+        """Seal the last shard and upload everything pending; False if some shards remain local."""
+        self.flush()
+        self.stop.set()
+        self.thread.join()
+        ok = self._upload()
+        if not ok:
+            print(f"[WARN] {len(self.pending)} shards left in {self.local_dir}; the next run uploads them")
+        return ok
+
+
+def add_sync_args(parser):
+    parser.add_argument("--hub-dir", default=None,
+                        help="Use this local directory instead of the Hugging Face repo (dry runs, tests)")
+    parser.add_argument("--compact-after", type=int, default=COMPACT_AFTER,
+                        help="Compact shards into the main file at the end of a run once this many exist "
+                             "(0 = never)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact annotation shards into the main file.")
+    parser.add_argument("--repo", default=None, help="Dataset repo id (or use --hub-dir)")
+    parser.add_argument("--file", required=True, help="Main file in the repo, e.g. annotations_Wiki_Native.csv")
+    parser.add_argument("--key-cols", default=",".join(ANNOTATION_KEY_COLS),
+                        help="Comma-separated columns; later rows win per key (default: annotation keys)")
+    parser.add_argument("--hub-dir", default=None)
+    parser.add_argument("--token", default=os.getenv("HF_TOKEN"))
+    args = parser.parse_args()
+    if not (args.repo or args.hub_dir):
+        parser.error("--repo or --hub-dir is required")
+    hub = LocalHub(args.hub_dir) if args.hub_dir else HfHub(args.repo, args.token)
+    key_cols = [c for c in args.key_cols.split(",") if c]
+    if not key_cols:
+        parser.error("--key-cols must name at least one column")
+    print(json.dumps({"merged_shards": compact(hub, args.file, key_cols)}))
+
+
+if __name__ == "__main__":
+    main()
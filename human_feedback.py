@@ -2,8 +2,10 @@
 # Gradio A/B annotation app
 # - Single combined criterion (grammar + semantics)
 # - Two sources (Wikipedia, Oireachtas) only
-# - Deterministic sampling: EXACTLY K=4 comparisons per model pair per source
-# - Deterministic A/B assignment with 2/2 split per pair
+# - Adaptive sampling (active_ranking.py): each next item is the most informative
+#   model pair under a Bradley–Terry fit of all annotations so far for the source;
+#   the session ends once the ranking is settled (ACTIVE = False: K=4 per pair)
+# - Deterministic A/B assignment alternating per pair
 # - Single output file: annotations.csv
 # - No wrap-around after last item: annotators see "Done" and stop
 
@@ -15,7 +17,9 @@ from pathlib import Path
 import json
 import hashlib
 
-PAIRS_CSV = "./outputs/pairs.csv"  # columns: run_id, model, source_type, instruction, response, text
+from active_ranking import ActiveRanker
+
+PAIRS_CSV = "./outputs/pairs.csv"  # columns: run_id, model, source_type, instruction, response, text, text_hash, sample_idx
 
 
 def load_secrets(path="./secrets.json"):
@@ -27,7 +31,10 @@ def load_secrets(path="./secrets.json"):
 secrets = load_secrets()
 open_ai_key = secrets.get("open_ai")
 
-# Exactly 4 comparisons per model pair per source
+# Adaptive selection; at most MAX_PER_SESSION items per annotator session
+ACTIVE = True
+MAX_PER_SESSION = 60
+# Exhaustive mode (ACTIVE = False): exactly 4 comparisons per model pair per source
 K = 4
 OUT_FILE = "./annotations.csv"
 SCHEMA = [
@@ -47,6 +54,9 @@ if not Path(OUT_FILE).exists():
     pd.DataFrame(columns=SCHEMA).to_csv(OUT_FILE, index=False)
 
 pairs_all = pd.read_csv(PAIRS_CSV)
+if "sample_idx" in pairs_all.columns:
+    # multi-sample runs (Create_Model_Comparison.py --samples): first candidate only
+    pairs_all = pairs_all[pairs_all["sample_idx"].fillna(0).astype(int) == 0]
 
 
 def _shared_texts(df, m1, m2):
@@ -59,6 +69,32 @@ def _stable_hash(s: str) -> int:
     return int(hashlib.sha256(s.encode("utf-8")).hexdigest(), 16)
 
 
+def _ordered_texts(df, source_type, m1, m2):
+    """Shared texts of a model pair, sorted by stable hash of (source|m1|m2|text)."""
+    shared = _shared_texts(df, m1, m2)
+    return sorted(shared, key=lambda t: _stable_hash(f"{source_type}|{m1}|{m2}|{t}"))
+
+
+def _comparison(df, source_type, m1, m2, t, j):
+    """Comparison item for text t; even j -> A=m1, odd j -> A=m2."""
+    r1 = df[(df["model"] == m1) & (df["text"] == t)].iloc[0]
+    r2 = df[(df["model"] == m2) & (df["text"] == t)].iloc[0]
+    if j % 2 == 0:
+        A, B = (m1, r1), (m2, r2)
+    else:
+        A, B = (m2, r2), (m1, r1)
+    return {
+        "source_type": source_type,
+        "text": t,
+        "model_A": A[0],
+        "instruction_A": A[1]["instruction"],
+        "response_A": A[1]["response"],
+        "model_B": B[0],
+        "instruction_B": B[1]["instruction"],
+        "response_B": B[1]["response"],
+    }
+
+
 def build_comparisons_k(source_type: str, k: int):
     df = pairs_all[pairs_all["source_type"] == source_type].copy()
     if df.empty:
@@ -69,16 +105,9 @@ def build_comparisons_k(source_type: str, k: int):
 
     # For each unordered pair, deterministically pick k texts and fix A/B sides
     for m1, m2 in combinations(models, 2):
-        shared = _shared_texts(df, m1, m2)
-        if not shared:
+        ordered_texts = _ordered_texts(df, source_type, m1, m2)
+        if not ordered_texts:
             continue
-        # Sort shared texts by stable hash of (source|m1|m2|text)
-        keyed = []
-        for t in shared:
-            h = _stable_hash(f"{source_type}|{m1}|{m2}|{t}")
-            keyed.append((h, t))
-        keyed.sort(key=lambda x: x[0])
-        ordered_texts = [t for _, t in keyed]
 
         # Take first k (cycle deterministically if fewer than k)
         chosen = []
@@ -89,30 +118,46 @@ def build_comparisons_k(source_type: str, k: int):
 
         # Build comparisons with deterministic A/B: even index -> A=m1, odd index -> A=m2
         for j, t in enumerate(chosen):
-            r1 = df[(df["model"] == m1) & (df["text"] == t)].iloc[0]
-            r2 = df[(df["model"] == m2) & (df["text"] == t)].iloc[0]
-            if j % 2 == 0:
-                A, B = (m1, r1), (m2, r2)
-            else:
-                A, B = (m2, r2), (m1, r1)
-            comps.append(
-                {
-                    "source_type": source_type,
-                    "text": t,
-                    "model_A": A[0],
-                    "instruction_A": A[1]["instruction"],
-                    "response_A": A[1]["response"],
-                    "model_B": B[0],
-                    "instruction_B": B[1]["instruction"],
-                    "response_B": B[1]["response"],
-                }
-            )
+            comps.append(_comparison(df, source_type, m1, m2, t, j))
 
     # Deterministic overall ordering: by (source_type, model_A, model_B, text)
     comps.sort(key=lambda d: (d["source_type"], d["model_A"], d["model_B"], d["text"]))
     return comps
 
 
+def next_active_item(source_type: str, annotator_id: str, served: list):
+    """
+    Most informative next comparison for this annotator, or None once the
+    ranking for source_type is settled (or nothing unseen is left).
+    """
+    df = pairs_all[pairs_all["source_type"] == source_type]
+    models = sorted(df["model"].unique().tolist())
+    if len(models) < 2:
+        return None
+    ranker = ActiveRanker(models)
+    ann = pd.read_csv(OUT_FILE)
+    ann = ann[ann["source_type"] == source_type]
+    for r in ann.itertuples():
+        if r.model_A in ranker.idx and r.model_B in ranker.idx:
+            ranker.add_choice(r.model_A, r.model_B, r.choice)
+    mine = ann[ann["annotator_id"] == annotator_id]
+    seen = {(t, frozenset((a, b))) for t, a, b in zip(mine["text"], mine["model_A"], mine["model_B"])}
+    seen |= {(d["text"], frozenset((d["model_A"], d["model_B"]))) for d in served}
+
+    # first unseen text per pair, in stable-hash order
+    unseen = {}
+    for m1, m2 in combinations(models, 2):
+        for j, t in enumerate(_ordered_texts(df, source_type, m1, m2)):
+            if (t, frozenset((m1, m2))) not in seen:
+                unseen[(m1, m2)] = (t, j)
+                break
+    pair, _ = ranker.next_pair(list(unseen))
+    if pair is None:
+        return None
+    t, j = unseen[pair]
+    return _comparison(df, source_type, pair[0], pair[1], t, j)
+
+
 def save_row(annotator_id, item, choice):
     row = {
         "annotator_id": annotator_id,
@@ -190,8 +235,15 @@ with gr.Blocks() as demo:
     def _require_name(name):
         return "" if (name or "").strip() else "**Enter your name first.**"
 
-    def start(source):
-        comp_list = build_comparisons_k(source, K)
+    def _total(comp_list):
+        return f"≤{MAX_PER_SESSION}" if ACTIVE else str(len(comp_list))
+
+    def start(source, name):
+        if ACTIVE:
+            first = next_active_item(source, (name or "").strip(), [])
+            comp_list = [first] if first else []
+        else:
+            comp_list = build_comparisons_k(source, K)
         if not comp_list:
             return (
                 "**No items found for selection.**",
@@ -214,7 +266,7 @@ with gr.Blocks() as demo:
             item["response_A"],
             item["instruction_B"],
             item["response_B"],
-            f"{i+1} / {len(comp_list)}",
+            f"{i+1} / {_total(comp_list)}",
             source,
             comp_list,
             i,
@@ -222,7 +274,8 @@ with gr.Blocks() as demo:
 
     # Wire start (name gate → start)
     wiki_btn.click(lambda n: _require_name(n), inputs=[annotator], outputs=[status]).then(
-        lambda: start("Wiki"),
+        lambda n: start("Wiki", n),
+        inputs=[annotator],
         outputs=[
             crit,
             ref_text,
@@ -238,7 +291,8 @@ with gr.Blocks() as demo:
         queue=False,
     )
     oir_btn.click(lambda n: _require_name(n), inputs=[annotator], outputs=[status]).then(
-        lambda: start("Oireachtas"),
+        lambda n: start("Oireachtas", n),
+        inputs=[annotator],
         outputs=[
             crit,
             ref_text,
@@ -257,14 +311,19 @@ with gr.Blocks() as demo:
     def choose(choice, name, source, comp_list, i):
         name = (name or "").strip()
         if not name:
-            return "**Enter your name first.**", gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip(), i
-        if not comp_list:
-            return "**No comparisons loaded.**", gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip(), i
+            return "**Enter your name first.**", gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip(), comp_list, i
+        if not comp_list or i >= len(comp_list):
+            return "**No comparisons loaded.**", gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip(), gr.skip(), comp_list, i
 
         item = comp_list[i]
         save_row(name, item, choice)
 
         i += 1
+        if ACTIVE and i == len(comp_list) and i < MAX_PER_SESSION:
+            # pick the next item with this answer already counted
+            nxt = next_active_item(source, name, comp_list)
+            if nxt:
+                comp_list = comp_list + [nxt]
         if i >= len(comp_list):  # no wrap-around, stop here
             return (
                 "**Done — thank you!**",
@@ -274,6 +333,7 @@ with gr.Blocks() as demo:
                 "",
                 "",
                 f"{len(comp_list)} / {len(comp_list)}",
+                comp_list,
                 i,
             )
 
@@ -285,19 +345,20 @@ with gr.Blocks() as demo:
             nxt["response_A"],
             nxt["instruction_B"],
             nxt["response_B"],
-            f"{i+1} / {len(comp_list)}",
+            f"{i+1} / {_total(comp_list)}",
+            comp_list,
             i,
         )
 
     btnA.click(
         lambda name, s, cs, i: choose("A", name, s, cs, i),
         inputs=[annotator, source_state, comps_state, idx_state],
-        outputs=[status, ref_text, instA, respA, instB, respB, counter, idx_state],
+        outputs=[status, ref_text, instA, respA, instB, respB, counter, comps_state, idx_state],
     )
     btnB.click(
         lambda name, s, cs, i: choose("B", name, s, cs, i),
         inputs=[annotator, source_state, comps_state, idx_state],
-        outputs=[status, ref_text, instA, respA, instB, respB, counter, idx_state],
+        outputs=[status, ref_text, instA, respA, instB, respB, counter, comps_state, idx_state],
     )
 
 
@@ -0,0 +1,153 @@
+# Persistent, content-addressed cache of LLM responses (SQLite).
+# Key = sha256 over (provider, model, prompt, schema, temperature, sample index),
+# so reruns after a crash / CSV mix-up, or --overwrite-llm re-annotation, replay
+# earlier answers instead of paying for them again.
+#
+# Modes:
+#   rw      read through, write on miss (default)
+#   replay  read-only; a miss raises CacheMiss instead of calling the API,
+#           for offline reruns of downstream code with zero API calls
+#   off     bypass entirely
+#
+# Eviction: entries older than max_age_days, then least-recently-used entries
+# until the stored values fit in max_bytes. Runs on open and every EVICT_EVERY puts.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+CACHE_PATH = os.path.join("cache", "llm_responses.sqlite")
+CACHE_MODES = ("rw", "replay", "off")
+MAX_BYTES = 2 * 1024 ** 3
+MAX_AGE_DAYS = 90
+EVICT_EVERY = 1_000
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class ResponseCache:
+    def __init__(self, path: str = CACHE_PATH, mode: str = "rw",
+                 max_bytes: int = MAX_BYTES, max_age_days: float = MAX_AGE_DAYS):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"cache mode must be one of {CACHE_MODES}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.local = threading.local()  # one sqlite connection per thread
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "puts": 0, "evicted": 0}
+        if mode != "off":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            db = self._db()
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, provider TEXT, model TEXT,"
+                " created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            db.commit()
+            if mode == "rw":
+                self.evict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == "replay"
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    @staticmethod
+    def key(provider: str, model: str, prompt: str, schema: Any = None,
+            temperature: Optional[float] = None, sample_idx: int = 0, **extra) -> str:
+        payload = json.dumps(
+            {"provider": provider, "model": model, "prompt": prompt, "schema": schema,
+             "temperature": temperature, "sample_idx": sample_idx, **extra},
+            sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value or None. In replay mode a miss raises CacheMiss."""
+        if not self.enabled:
+            return None
+        db = self._db()
+        row = db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        with self.lock:
+            self.stats["hits" if row else "misses"] += 1
+        if row is None:
+            if self.replay:
+                raise CacheMiss(key)
+            return None
+        if not self.replay:
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any, provider: str = "", model: str = ""):
+        if self.mode != "rw" or value is None:
+            return
+        blob = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO responses (key, value, provider, model, created, accessed, size)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, blob, provider, model, now, now, len(blob.encode("utf-8"))),
+        )
+        db.commit()
+        with self.lock:
+            self.stats["puts"] += 1
+            due = self.stats["puts"] % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        db = self._db()
+        cutoff = time.time() - self.max_age_days * 86400
+        n = db.execute("DELETE FROM responses WHERE created < ?", (cutoff,)).rowcount
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            # walk LRU order and drop until under budget
+            excess = total - self.max_bytes
+            doomed, freed = [], 0
+            for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+                if freed >= excess:
+                    break
+                doomed.append((key,))
+                freed += size
+            db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            n += len(doomed)
+        db.commit()
+        with self.lock:
+            self.stats["evicted"] += n
+        return n
+
+    def summary(self) -> str:
+        s = self.stats
+        lookups = s["hits"] + s["misses"]
+        rate = s["hits"] / lookups if lookups else 0.0
+        return (f"cache[{self.mode}] hits={s['hits']} misses={s['misses']} "
+                f"({rate:.0%} hit rate) puts={s['puts']} evicted={s['evicted']}")
+
+
+def add_cache_args(parser):
+    parser.add_argument("--cache", choices=CACHE_MODES, default=os.getenv("LLM_CACHE_MODE", "rw"),
+                        help="LLM response cache: rw (default), replay (read-only, no API calls), off")
+    parser.add_argument("--cache-path", default=CACHE_PATH)
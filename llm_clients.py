@@ -0,0 +1,160 @@
+# Shared provider clients: each is created once per process and reused, with
+# its HTTP connection pool sized to the caller's concurrency so keep-alive
+# connections are reused instead of paying a TLS handshake per call.
+#
+#   client = openai_client(key, asynchronous=True, max_connections=16)
+#   model = vertex_model("gemini-2.5-pro")     # vertexai.init runs once
+#   print_pool_stats()
+#
+# Pool statistics come from httpx event hooks plus the httpcore trace
+# extension: requests sent, error responses, and new TCP connections opened
+# (reuse = 1 - connections / requests). The Vertex SDK talks gRPC over its own
+# channel, so vertex_model only caches; it is not pool-sized or counted.
+
+import os
+import threading
+from typing import Dict, Optional
+
+import httpx
+
+DEFAULT_MAX_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 60.0  # seconds an idle connection stays in the pool
+GEMINI_PROJECT_ID = "gen-lang-client-0817118952"
+GCLOUD_LOCATION = "us-central1"
+
+_clients: Dict[tuple, object] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+_lock = threading.Lock()
+_vertex_ready = False
+
+
+def _bump(name: str, field: str):
+    with _lock:
+        _stats[name][field] += 1
+
+
+def _hooks(name: str, asynchronous: bool) -> dict:
+    """Event hooks counting requests/errors and, via trace, new connections."""
+    with _lock:
+        _stats.setdefault(name, {"requests": 0, "errors": 0, "connections": 0})
+
+    if asynchronous:
+        async def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.complete":
+                _bump(name, "connections")
+
+        async def on_request(request):
+            request.extensions["trace"] = trace
+            _bump(name, "requests")
+
+        async def on_response(response):
+            if response.status_code >= 400:
+                _bump(name, "errors")
+    else:
+        def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.complete":
+                _bump(name, "connections")
+
+        def on_request(request):
+            request.extensions["trace"] = trace
+            _bump(name, "requests")
+
+        def on_response(response):
+            if response.status_code >= 400:
+                _bump(name, "errors")
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def _limits(max_connections: int) -> httpx.Limits:
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+def _get_or_create(key: tuple, factory):
+    with _lock:
+        client = _clients.get(key)
+    if client is None:
+        client = factory()
+        with _lock:
+            client = _clients.setdefault(key, client)
+    return client
+
+
+def openai_client(api_key: Optional[str] = None, *, asynchronous: bool = False,
+                  max_connections: int = DEFAULT_MAX_CONNECTIONS):
+    import openai
+
+    def make():
+        name = f"openai{'-async' if asynchronous else ''}"
+        http_cls = openai.DefaultAsyncHttpxClient if asynchronous else openai.DefaultHttpxClient
+        http = http_cls(limits=_limits(max_connections), event_hooks=_hooks(name, asynchronous))
+        cls = openai.AsyncOpenAI if asynchronous else openai.OpenAI
+        return cls(api_key=api_key, http_client=http)
+
+    return _get_or_create(("openai", asynchronous, api_key), make)
+
+
+def anthropic_client(api_key: Optional[str] = None, *, asynchronous: bool = False,
+                     max_connections: int = DEFAULT_MAX_CONNECTIONS):
+    import anthropic
+
+    def make():
+        name = f"anthropic{'-async' if asynchronous else ''}"
+        http_cls = anthropic.DefaultAsyncHttpxClient if asynchronous else anthropic.DefaultHttpxClient
+        http = http_cls(limits=_limits(max_connections), event_hooks=_hooks(name, asynchronous))
+        cls = anthropic.AsyncAnthropic if asynchronous else anthropic.Anthropic
+        return cls(api_key=api_key, http_client=http)
+
+    return _get_or_create(("anthropic", asynchronous, api_key), make)
+
+
+def genai_client(api_key: Optional[str] = None, *, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 project: Optional[str] = None, location: Optional[str] = None):
+    """google-genai client (sync calls and client.aio share it); Vertex AI if project is set."""
+    from google import genai
+    from google.genai import types
+
+    def make():
+        name = "google-vertex" if project else "google"
+        http_options = types.HttpOptions(
+            base_url=os.getenv("GEMINI_BASE_URL") or None,
+            client_args={"limits": _limits(max_connections), "event_hooks": _hooks(name, False)},
+            async_client_args={"limits": _limits(max_connections), "event_hooks": _hooks(name, True)},
+        )
+        if project:
+            return genai.Client(vertexai=True, project=project, location=location, http_options=http_options)
+        return genai.Client(api_key=api_key, http_options=http_options)
+
+    return _get_or_create(("google", project, location, api_key), make)
+
+
+def vertex_model(model_name: str, project: str = GEMINI_PROJECT_ID, location: str = GCLOUD_LOCATION):
+    """Cached vertexai GenerativeModel; vertexai.init runs on first use only."""
+    def make():
+        global _vertex_ready
+        import vertexai
+        from vertexai.preview.generative_models import GenerativeModel
+        with _lock:
+            if not _vertex_ready:
+                vertexai.init(project=project, location=location)
+                _vertex_ready = True
+        return GenerativeModel(model_name)
+
+    return _get_or_create(("vertex", model_name), make)
+
+
+def pool_stats() -> Dict[str, Dict[str, float]]:
+    with _lock:
+        out = {}
+        for name, s in _stats.items():
+            reuse = 1 - s["connections"] / s["requests"] if s["requests"] else 0.0
+            out[name] = {**s, "reuse": reuse}
+        return out
+
+
+def print_pool_stats():
+    for name, s in pool_stats().items():
+        if s["requests"]:
+            print(f"  pool {name}: {s['requests']} requests over {s['connections']} connections "
+                  f"({s['reuse']:.0%} reused), {s['errors']} error responses")
@@ -0,0 +1,163 @@
+# Token / cost ledger: one compact JSON line per provider request.
+#   {"ts", "script", "kind", "provider", "model", "in", "out", "cached",
+#    "latency_s", "attempt", "ok", "accepted", "batch", "cost"}
+# kind is "generate" (Create_Model_Comparison), "vote" (combined_LLM_annotation)
+# or "translate" (generate_IRT); ok means the call produced an accepted
+# pair / vote / translation and accepted counts them (several pairs per call
+# with --samples > 1). Token counts come from rate_limiter.extract_usage.
+#
+#   python llm_ledger.py                  # per-model summary of the whole ledger
+#   python llm_ledger.py --since 2025-09-01 --script combined_LLM_annotation.py
+
+import argparse
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+LEDGER_PATH = os.path.join("outputs", "llm_ledger.jsonl")
+PRICES_PATH = "prices.json"  # optional overrides, same shape as DEFAULT_PRICES
+# USD per million tokens: input, cached input, output (standard tier, <=200k context)
+DEFAULT_PRICES: Dict[str, Dict[str, float]] = {
+    "openai/gpt-5": {"input": 1.25, "cached": 0.125, "output": 10.0},
+    "openai/gpt-5-mini": {"input": 0.25, "cached": 0.025, "output": 2.0},
+    "anthropic/claude-sonnet-4-20250514": {"input": 3.0, "cached": 0.30, "output": 15.0},
+    "anthropic/claude-3-5-haiku-20241022": {"input": 0.80, "cached": 0.08, "output": 4.0},
+    "google/gemini-2.5-pro": {"input": 1.25, "cached": 0.31, "output": 10.0},
+    "google/gemini-2.5-flash": {"input": 0.30, "cached": 0.075, "output": 2.50},
+}
+BATCH_DISCOUNT = 0.5  # batch APIs bill at half price
+
+# Retry attempt of the current call, for callers whose retry loop lives
+# outside the function that records (combined_LLM_annotation.call_with_retry)
+ATTEMPT: contextvars.ContextVar = contextvars.ContextVar("llm_attempt", default=0)
+
+_lock = threading.Lock()
+_file = None
+_prices: Optional[Dict[str, Dict[str, float]]] = None
+_session: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))  # this process only
+
+
+def load_prices(path: str = PRICES_PATH) -> Dict[str, Dict[str, float]]:
+    prices = dict(DEFAULT_PRICES)
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            prices.update(json.load(f))
+    return prices
+
+
+def cost(provider: str, model: str, usage: Dict[str, int], batch: bool = False) -> float:
+    global _prices
+    if _prices is None:
+        _prices = load_prices()
+    p = _prices.get(f"{provider}/{model}")
+    if p is None:
+        return 0.0
+    fresh = max(0, usage.get("input", 0) - usage.get("cached", 0))
+    usd = (fresh * p["input"] + usage.get("cached", 0) * p["cached"] + usage.get("output", 0) * p["output"]) / 1e6
+    return usd * (BATCH_DISCOUNT if batch else 1.0)
+
+
+def record(kind: str, provider: str, model: str, usage: Optional[Dict[str, int]] = None,
+           latency_s: Optional[float] = None, attempt: Optional[int] = None, ok: bool = True,
+           batch: bool = False, accepted: Optional[int] = None):
+    """Append one request to the ledger (thread-safe, flushed per line); accepted defaults to int(ok)."""
+    global _file
+    usage = usage or {}
+    rec = {
+        "ts": round(time.time(), 3),
+        "script": os.path.basename(sys.argv[0]),
+        "kind": kind,
+        "provider": provider,
+        "model": model,
+        "in": int(usage.get("input", 0)),
+        "out": int(usage.get("output", 0)),
+        "cached": int(usage.get("cached", 0)),
+        "latency_s": None if latency_s is None else round(latency_s, 3),
+        "attempt": ATTEMPT.get() if attempt is None else attempt,
+        "ok": bool(ok),
+        "accepted": int(bool(ok)) if accepted is None else int(accepted),
+        "batch": batch,
+        "cost": round(cost(provider, model, usage, batch), 8),
+    }
+    line = json.dumps(rec, separators=(",", ":")) + "\n"
+    with _lock:
+        t = _session[(provider, model)]
+        for k in ("in", "out", "cached", "cost"):
+            t[k] += rec[k]
+        if _file is None:
+            os.makedirs(os.path.dirname(LEDGER_PATH) or ".", exist_ok=True)
+            _file = open(LEDGER_PATH, "a", encoding="utf-8")
+        _file.write(line)
+        _file.flush()
+
+
+def session_totals() -> Dict[tuple, Dict[str, float]]:
+    """(provider, model) -> in/out/cached tokens and cost recorded by this process."""
+    with _lock:
+        return {k: dict(v) for k, v in _session.items()}
+
+
+def summarize(path: str = LEDGER_PATH, since: Optional[float] = None,
+              script: Optional[str] = None) -> Dict[tuple, Dict[str, float]]:
+    """Per (kind, provider/model) totals."""
+    agg: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            r = json.loads(line)
+            if (since and r["ts"] < since) or (script and r["script"] != script):
+                continue
+            a = agg[(r["kind"], f"{r['provider']}/{r['model']}")]
+            a["requests"] += 1
+            a["accepted"] += r.get("accepted", r["ok"])  # older lines have ok only
+            a["retries"] += r["attempt"] > 0
+            a["in"] += r["in"]
+            a["out"] += r["out"]
+            a["cached"] += r["cached"]
+            a["cost"] += r["cost"]
+            if r["latency_s"] is not None:
+                a["latency_s"] += r["latency_s"]
+                a["out_tokens"] += r["out"]  # output of the timed requests, for out_tok/s
+    return agg
+
+
+def print_summary(agg: Dict[tuple, Dict[str, float]]):
+    unit = {"generate": "$/pair", "vote": "$/vote", "translate": "$/transl"}
+    print(f"{'kind':<10} {'model':<38} {'reqs':>6} {'accept':>6} {'retry':>5} {'in_tok':>10} {'out_tok':>9} "
+          f"{'cached':>6} {'out_tok/s':>9} {'cost $':>9} {'$/accepted':>16}")
+    total = 0.0
+    for (kind, model), a in sorted(agg.items()):
+        tps = a["out_tokens"] / a["latency_s"] if a["latency_s"] else 0.0
+        per = a["cost"] / a["accepted"] if a["accepted"] else 0.0
+        hit = a["cached"] / a["in"] if a["in"] else 0.0
+        total += a["cost"]
+        print(f"{kind:<10} {model:<38} {int(a['requests']):>6} {int(a['accepted']):>6} {int(a['retries']):>5} "
+              f"{int(a['in']):>10} {int(a['out']):>9} {hit:>6.0%} {tps:>9.1f} {a['cost']:>9.4f} "
+              f"{per:>10.5f} {unit.get(kind, '$/ok'):>5}")
+    print(f"Total cost: ${total:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the LLM token/cost ledger.")
+    parser.add_argument("--path", default=LEDGER_PATH)
+    parser.add_argument("--since", default=None, help="ISO date/time, e.g. 2025-09-01 or 2025-09-01T12:00")
+    parser.add_argument("--script", default=None, help="Only records from this script, e.g. generate_IRT.py")
+    args = parser.parse_args()
+    since = None
+    if args.since:
+        from datetime import datetime
+        since = datetime.fromisoformat(args.since).timestamp()
+    if not os.path.isfile(args.path):
+        print(f"No ledger at {args.path}")
+        return
+    print_summary(summarize(args.path, since, args.script))
+
+
+if __name__ == "__main__":
+    main()
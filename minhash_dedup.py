@@ -0,0 +1,222 @@
+# Near-duplicate removal for seed corpora before generation.
+# Oireachtas lines repeat procedural boilerplate and GaWiki stubs are templated;
+# each surviving seed text costs GEN_CALLS_PER_TEXT generations plus
+# C(GEN_CALLS_PER_TEXT, 2) comparisons x JUDGES_PER_COMPARISON judge calls.
+#
+# MinHash over character shingles (numpy, parallel across processes), LSH
+# banding to find candidate pairs, then the estimated Jaccard of each candidate
+# pair is checked against --threshold. In each cluster of near-duplicates the
+# first text (file order) is kept.
+#
+#   python minhash_dedup.py                    # seed_data/*.txt -> seed_data/dedup/*.txt
+#   python minhash_dedup.py --in-place         # rewrite seed_data/*.txt
+#   python minhash_dedup.py --dry-run          # report only
+#   python minhash_dedup.py --parquet          # full ga partition -> ga_dedup.parquet
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import comb
+from pathlib import Path
+
+import numpy as np
+
+SEED_DIR = Path("./seed_data")
+DEDUP_DIR = SEED_DIR / "dedup"  # default output; not picked up by the *.txt readers
+PARQUET_DIR = "./debates_parquet"
+PARQUET_OUT = "./ga_dedup.parquet"
+MIN_CHARS = 200
+MAX_CHARS = 1000
+
+SHINGLE = 5  # character n-gram size
+NUM_PERM = 128
+THRESHOLD = 0.8  # Jaccard
+SEED = 42
+BATCH = 2_000  # docs per worker task
+# each bucket member is checked against the next BUCKET_WINDOW members (index
+# order): all pairs in small buckets, O(n * window) in boilerplate buckets
+BUCKET_WINDOW = 32
+WORKERS = os.cpu_count() or 1
+
+# Cost model for the "API calls saved" report (Create_Model_Comparison.py /
+# combined_LLM_annotation.py): 6 generator models, 3 LLM judges
+GEN_CALLS_PER_TEXT = 6
+JUDGES_PER_COMPARISON = 3
+
+_P = np.uint64(1_000_003)  # rolling-hash base
+
+
+def perm_params(num_perm: int = NUM_PERM, seed: int = SEED) -> tuple[np.ndarray, np.ndarray]:
+    # multiply-shift hash family: h_i(x) = (a_i * x + b_i) >> 32 (mod 2**64), a_i odd
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingle_hashes(text: str, k: int = SHINGLE) -> np.ndarray:
+    """uint64 hashes of all k-char shingles, computed as one vectorized polynomial."""
+    cps = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(cps) < k:
+        cps = np.concatenate([cps, np.zeros(k - len(cps), dtype=np.uint64)])
+    n = len(cps) - k + 1
+    h = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(k):
+            h = h * _P + cps[j:j + n]
+    return np.unique(h)
+
+
+def signatures(texts: list[str], num_perm: int = NUM_PERM, seed: int = SEED) -> np.ndarray:
+    """(len(texts), num_perm) uint32 MinHash signatures."""
+    a, b = perm_params(num_perm, seed)
+    out = np.empty((len(texts), num_perm), dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        for i, t in enumerate(texts):
+            h = shingle_hashes(t)
+            out[i] = ((np.outer(a, h) + b[:, None]) >> np.uint64(32)).min(axis=1)
+    return out
+
+
+def signatures_parallel(texts: list[str], workers: int = WORKERS, num_perm: int = NUM_PERM) -> np.ndarray:
+    if workers <= 1 or len(texts) <= BATCH:
+        return signatures(texts, num_perm)
+    batches = [texts[i:i + BATCH] for i in range(0, len(texts), BATCH)]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        parts = list(ex.map(signatures, batches, [num_perm] * len(batches)))
+    return np.vstack(parts)
+
+
+def lsh_params(threshold: float, num_perm: int = NUM_PERM) -> tuple[int, int]:
+    # (bands, rows) with bands * rows <= num_perm whose S-curve midpoint
+    # (1/b)^(1/r) is closest to the threshold
+    best = None
+    for r in range(1, num_perm + 1):
+        b = num_perm // r
+        if b < 1:
+            break
+        err = abs((1 / b) ** (1 / r) - threshold)
+        if best is None or err < best[0]:
+            best = (err, b, r)
+    return best[1], best[2]
+
+
+def candidate_pairs(sigs: np.ndarray, bands: int, rows: int,
+                    window: int = BUCKET_WINDOW) -> set[tuple[int, int]]:
+    pairs = set()
+    for band in range(bands):
+        chunk = np.ascontiguousarray(sigs[:, band * rows:(band + 1) * rows])
+        keys = chunk.view(np.dtype((np.void, chunk.dtype.itemsize * rows))).ravel()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        # runs of equal band keys are buckets
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for s, e in zip(starts, ends):
+            if e - s > 1:
+                # every pair up to window apart: a false positive in the bucket
+                # cannot hide the true duplicates from each other unless window
+                # of them sit in a row, and boilerplate buckets of thousands
+                # of texts stay linear
+                members = sorted(order[s:e].tolist())
+                for k in range(1, min(window, len(members) - 1) + 1):
+                    pairs.update(zip(members[:-k], members[k:]))
+    return pairs
+
+
+def near_duplicates(texts: list[str], threshold: float = THRESHOLD, workers: int = WORKERS,
+                    num_perm: int = NUM_PERM) -> tuple[list[int], dict[int, int]]:
+    """
+    Returns (keep_indices, dropped -> kept representative). Candidates from LSH
+    are confirmed by signature agreement >= threshold; clusters via union-find,
+    keeping the lowest index.
+    """
+    sigs = signatures_parallel(texts, workers, num_perm)
+    bands, rows = lsh_params(threshold, num_perm)
+    parent = list(range(len(texts)))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in candidate_pairs(sigs, bands, rows):
+        if np.mean(sigs[i] == sigs[j]) >= threshold:
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+    roots = [find(i) for i in range(len(texts))]
+    keep = [i for i, r in enumerate(roots) if r == i]
+    dropped = {i: r for i, r in enumerate(roots) if r != i}
+    return keep, dropped
+
+
+def calls_per_text(n_models: int = GEN_CALLS_PER_TEXT, n_judges: int = JUDGES_PER_COMPARISON) -> int:
+    return n_models + comb(n_models, 2) * n_judges
+
+
+def read_seed_texts(seed_dir: Path = SEED_DIR) -> list[tuple[Path, str]]:
+    # same chunking as Create_Model_Comparison.read_seed_files
+    out = []
+    for p in sorted(seed_dir.glob("*.txt")):
+        text = p.read_text(encoding="utf-8").strip()
+        out.extend((p, c.strip()) for c in text.split("\n\n\n") if c.strip())
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash/LSH near-duplicate removal for seed texts.")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Jaccard threshold")
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--parquet", action="store_true",
+                        help=f"Dedup the full ga partition of {PARQUET_DIR} into {PARQUET_OUT}")
+    parser.add_argument("--dry-run", action="store_true", help="Report only, write nothing")
+    parser.add_argument("--in-place", action="store_true",
+                        help=f"Rewrite the seed files instead of writing copies to {DEDUP_DIR}")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.parquet:
+        from oireachtas_parquet import iter_ga_texts
+        texts = [t for batch in iter_ga_texts(MIN_CHARS, MAX_CHARS, PARQUET_DIR) for t in batch]
+        origin = None
+    else:
+        items = read_seed_texts()
+        texts = [t for _, t in items]
+        origin = [p for p, _ in items]
+
+    keep, dropped = near_duplicates(texts, args.threshold, args.workers, args.num_perm)
+    dt = time.perf_counter() - t0
+    print(f"{len(texts)} texts, {len(dropped)} near-duplicates (Jaccard >= {args.threshold}), "
+          f"{len(keep)} kept in {dt:.1f}s")
+    for i, r in list(dropped.items())[:5]:
+        print(f"  dup {i} ~ {r}: {texts[i][:80]!r}")
+    saved = len(dropped) * calls_per_text()
+    print(f"API calls saved if these had been generated + judged: {saved} "
+          f"({calls_per_text()} per text: {GEN_CALLS_PER_TEXT} generations + "
+          f"{comb(GEN_CALLS_PER_TEXT, 2)} comparisons x {JUDGES_PER_COMPARISON} judges)")
+
+    if args.dry_run or not dropped:
+        return
+    if args.parquet:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table({"text": [texts[i] for i in keep]}), PARQUET_OUT)
+        print(f"Wrote {len(keep)} texts to {PARQUET_OUT}")
+    else:
+        keep_set = set(keep)
+        if not args.in_place:
+            DEDUP_DIR.mkdir(parents=True, exist_ok=True)
+        for p in sorted(set(origin)):
+            kept = [t for i, (o, t) in enumerate(zip(origin, texts)) if o == p and i in keep_set]
+            out = p if args.in_place else DEDUP_DIR / p.name
+            with open(out, "w", encoding="utf-8") as f:
+                f.write("\n\n\n".join(kept))
+            print(f"Wrote {len(kept)} to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# One-time conversion of debates_all_with_lang.csv to a Parquet dataset
+# partitioned by lang (hive layout: debates_parquet/lang=ga/part-0.parquet).
+# Columns kept: text, text_len (len of stripped text).
+# Rows are buffered per (lang, LENGTH_BUCKETS bucket) across CSV chunks and a
+# bucket is written out as one sorted row group once it holds ROW_GROUP_SIZE
+# rows, so every row group covers a single length bucket and its min/max
+# statistics let readers skip groups outside MIN_CHARS/MAX_CHARS. Memory is
+# bounded by langs x buckets x ROW_GROUP_SIZE rows.
+#
+# Samplers then read only the ga partition, only the text column:
+#   for texts in iter_ga_texts(200, 1000): ...
+
+import argparse
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+INPUT_CSV = "./debates_all_with_lang.csv"
+PARQUET_DIR = "./debates_parquet"
+CHUNKSIZE = 100_000
+ROW_GROUP_SIZE = 10_000
+# text_len bucket edges (chars); a row group never spans two buckets
+LENGTH_BUCKETS = [50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10_000]
+
+
+def convert(input_csv: str = INPUT_CSV, out_dir: str = PARQUET_DIR,
+            chunksize: int = CHUNKSIZE, row_group_size: int = ROW_GROUP_SIZE) -> Dict[str, int]:
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([("text", pa.string()), ("text_len", pa.int32())])
+    writers: Dict[str, pq.ParquetWriter] = {}
+    counts: Dict[str, int] = {}
+    buffers: Dict[tuple, List[pd.DataFrame]] = {}  # (lang, bucket) -> pending rows
+    buffered: Dict[tuple, int] = {}
+    tmp_dir = Path(str(out_dir) + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    def write_bucket(lang: str, bucket: int):
+        part = pd.concat(buffers.pop((lang, bucket)), ignore_index=True)
+        buffered.pop((lang, bucket))
+        part = part.sort_values("text_len", kind="stable")
+        table = pa.Table.from_pandas(part[["text", "text_len"]], schema=schema, preserve_index=False)
+        if lang not in writers:
+            d = tmp_dir / f"lang={lang}"
+            d.mkdir(parents=True, exist_ok=True)
+            writers[lang] = pq.ParquetWriter(d / "part-0.parquet", schema, write_statistics=True)
+        writers[lang].write_table(table, row_group_size=row_group_size)
+
+    chunk_iter = pd.read_csv(
+        input_csv,
+        usecols=["lang", "text"],
+        chunksize=chunksize,
+        encoding="utf-8",
+        low_memory=True,
+    )
+    try:
+        for chunk in chunk_iter:
+            chunk["lang"] = chunk["lang"].fillna("unk").astype(str)
+            # object dtype even for a chunk whose texts are all missing (read as float)
+            text = chunk["text"].astype(object).where(chunk["text"].map(lambda t: isinstance(t, str)))
+            chunk["text"] = text
+            chunk["text_len"] = text.str.strip().str.len().fillna(0).astype("int32")
+            chunk["bucket"] = np.searchsorted(LENGTH_BUCKETS, chunk["text_len"].to_numpy(), side="right")
+            for (lang, bucket), part in chunk.groupby(["lang", "bucket"], sort=False):
+                key = (lang, bucket)
+                buffers.setdefault(key, []).append(part[["text", "text_len"]])
+                buffered[key] = buffered.get(key, 0) + len(part)
+                counts[lang] = counts.get(lang, 0) + len(part)
+                if buffered[key] >= row_group_size:
+                    write_bucket(lang, bucket)
+        for lang, bucket in sorted(buffers):
+            write_bucket(lang, bucket)
+    finally:
+        for w in writers.values():
+            w.close()
+
+    # swap in only once the whole CSV has been written
+    out = Path(out_dir)
+    if out.exists():
+        shutil.rmtree(out)
+    tmp_dir.replace(out)
+    return counts
+
+
+def iter_ga_texts(min_chars: int, max_chars: int, parquet_dir: str = PARQUET_DIR,
+                  lang: str = "ga", batch_size: int = 65_536) -> Iterator[List[str]]:
+    """
+    Yields lists of stripped texts from the lang partition with
+    min_chars <= len <= max_chars. Only the text column is read, and row groups
+    whose text_len statistics fall outside the window are skipped.
+    """
+    import pyarrow.dataset as pads
+
+    dataset = pads.dataset(parquet_dir, format="parquet", partitioning="hive")
+    flt = (
+        (pads.field("lang") == lang)
+        & (pads.field("text_len") >= min_chars)
+        & (pads.field("text_len") <= max_chars)
+    )
+    for batch in dataset.to_batches(columns=["text"], filter=flt, batch_size=batch_size):
+        texts = [t.strip() for t in batch.column(0).to_pylist() if t]
+        if texts:
+            yield texts
+
+
+def parquet_available(parquet_dir: Optional[str] = PARQUET_DIR, lang: str = "ga") -> bool:
+    return parquet_dir is not None and os.path.isdir(os.path.join(parquet_dir, f"lang={lang}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the debates CSV to lang-partitioned Parquet.")
+    parser.add_argument("--input", default=INPUT_CSV)
+    parser.add_argument("--out", default=PARQUET_DIR)
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    counts = convert(args.input, args.out, args.chunksize, args.row_group_size)
+    dt = time.perf_counter() - t0
+    print(f"Converted {args.input} -> {args.out} in {dt:.1f}s")
+    for lang, n in sorted(counts.items(), key=lambda kv: -kv[1]):
+        print(f"  lang={lang}: {n} rows")
+
+
+if __name__ == "__main__":
+    main()
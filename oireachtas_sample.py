@@ -6,88 +6,371 @@
 # split into two files, 50 and 20 texts
 # save to seed_data folder
 
+import argparse
+import heapq
+import io
+import json
 import os
-import random
+import sys
+import time
+import numpy as np
 import pandas as pd
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from oireachtas_parquet import iter_ga_texts, parquet_available
 
 # Config
 # Prefer absolute path; fallback to local file if not found
 INPUT_CSV = "./debates_all_with_lang.csv"
+# If oireachtas_parquet.py has been run, read the ga partition from here instead
+INPUT_PARQUET = "./debates_parquet"
 SEED = 42
 CHUNKSIZE = 100_000
-SAMPLE_SIZE = 160
+WORKERS = os.cpu_count() or 1
+# Max chunks submitted but not yet consumed; bounds peak RSS to ~N chunks
+# regardless of input size (0 = submit the whole file up front)
+MAX_IN_FLIGHT = 2 * WORKERS
+# --byte-ranges: size of each file slice parsed by a worker
+RANGE_BYTES = 64 * 1_048_576
 MIN_CHARS = 200  # minimum chars per text
 MAX_CHARS = 1000  # keep texts under 1000 chars (like gawiki_sample.py)
 SEED_DIR = "seed_data"
 OUT1 = os.path.join(SEED_DIR, "oireachtas_test1.txt")  # 120 texts
 OUT2 = os.path.join(SEED_DIR, "oireachtas_test2.txt")  # 40 texts
 
-random.seed(SEED)
+# A sample spec describes one sample to draw; --specs takes a JSON list of
+# these (missing fields fall back to DEFAULT_SPEC) and all of them are filled
+# in a single pass over the input.
+DEFAULT_SPEC = {
+    "name": "default",
+    "seed": SEED,
+    "lang": "ga",
+    "min_chars": MIN_CHARS,
+    "max_chars": MAX_CHARS,
+    "splits": [120, 40],
+    "outputs": [OUT1, OUT2],
+}
+
 os.makedirs(SEED_DIR, exist_ok=True)
 
-def filter_chunk(df: pd.DataFrame) -> list[str]:
+def load_specs(path: str | None) -> list[dict]:
+    if not path:
+        return [dict(DEFAULT_SPEC)]
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    specs = []
+    for i, r in enumerate(raw):
+        spec = {**DEFAULT_SPEC, "name": f"spec{i}", **r}
+        if "outputs" not in r:
+            spec["outputs"] = [
+                os.path.join(SEED_DIR, f"oireachtas_{spec['name']}_test{j}.txt")
+                for j in range(1, len(spec["splits"]) + 1)
+            ]
+        if len(spec["outputs"]) != len(spec["splits"]):
+            raise ValueError(f"spec {spec['name']}: outputs and splits differ in length")
+        specs.append(spec)
+    names = [s["name"] for s in specs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"duplicate spec names: {names}")
+    return specs
+
+def spec_k(spec: dict) -> int:
+    return sum(spec["splits"])
+
+def clean_texts(df: pd.DataFrame, lang: str = "ga") -> pd.Series:
+    # Rows of the given lang with a non-empty string text, stripped (vectorized;
+    # .str methods map non-strings to NaN, so dropna() removes them too)
+    texts = df.loc[df["lang"] == lang, "text"].str.strip().dropna()
+    return texts[texts.str.len() > 0]
+
+def filter_chunk(df: pd.DataFrame, min_chars: int = MIN_CHARS, max_chars: int = MAX_CHARS, lang: str = "ga") -> list[str]:
     # Keep only Irish (ga), non-empty strings, and length constraint
-    df = df[df["lang"] == "ga"]
-    df = df["text"].dropna()
+    texts = clean_texts(df, lang)
+    lens = texts.str.len()
+    return texts[(lens >= min_chars) & (lens <= max_chars)].tolist()
+
+# ---------------- Keyed reservoir (A-Res) ----------------
+# Every distinct text gets a key from a seeded hash of the text, and the sample
+# is the top-k texts by key. Because keys don't depend on stream position,
+# partial reservoirs can be built per worker and merged in any order/grouping:
+# the result is identical for any worker count or completion order.
+# Repeated texts (boilerplate lines) share a key, so they are deduplicated
+# before keying and on merge: the sample is uniform over distinct texts, and
+# a line repeated thousands of times is sampled at most once.
+
+def hash_key(seed: int) -> str:
+    # hash_pandas_object wants a 16-byte key
+    return f"{seed:016d}"[-16:]
+
+def reservoir_keys(texts: pd.Series, seed: int = SEED) -> np.ndarray:
+    """A-Res keys: the seeded uint64 hash of each text."""
+    return pd.util.hash_pandas_object(texts, index=False, hash_key=hash_key(seed)).to_numpy()
+
+def topk(texts: pd.Series, k: int, seed: int = SEED, threshold=None) -> list[tuple]:
+    """
+    Partial reservoir: the k largest (key, text) among texts, sorted descending.
+    Records with key < threshold (the current k-th key of the merged reservoir)
+    can never enter it and are skipped with one vectorized comparison, which
+    plays the role of Algorithm L's skips without drawing per-row randoms.
+    """
+    texts = texts.drop_duplicates()
+    if len(texts) == 0:
+        return []
+    return topk_keyed(reservoir_keys(texts, seed), texts.to_numpy(), k, threshold)
+
+def topk_keyed(keys: np.ndarray, texts: np.ndarray, k: int, threshold=None) -> list[tuple]:
+    if len(keys) == 0:
+        return []
+    if threshold is not None:
+        mask = keys >= threshold
+        keys, texts = keys[mask], texts[mask]
+    if len(keys) > k:
+        kth = np.partition(keys, len(keys) - k)[len(keys) - k]
+        mask = keys >= kth
+        keys, texts = keys[mask], texts[mask]
+    return heapq.nlargest(k, zip(keys.tolist(), texts.tolist()))
+
+def merge_reservoirs(k: int, *parts: list[tuple]) -> list[tuple]:
+    # associative + commutative: merge(merge(a, b), c) == merge(a, merge(b, c));
+    # a text seen by several workers has the same (key, text), kept once
+    return heapq.nlargest(k, {item for part in parts for item in part})
+
+def reservoir_threshold(reservoir: list[tuple], k: int):
+    return reservoir[-1][0] if len(reservoir) >= k else None
+
+def sample_texts(texts: pd.Series, specs: list[dict], thresholds: list) -> list[tuple[int, list[tuple]]]:
+    """
+    Fill every spec's partial reservoir from one batch of stripped texts of a
+    single lang. Lengths are computed once per batch and hash keys once per
+    distinct seed; each spec is then just a boolean mask over them.
+    Returns [(n_candidates, partial_reservoir)] aligned with specs.
+    """
+    texts = texts.drop_duplicates()
+    lens = texts.str.len().to_numpy()
+    values = texts.to_numpy()
+    keys_by_seed = {}
     out = []
-    for t in df:
-        if isinstance(t, str):
-            t = t.strip()
-            if t and len(t) <= MAX_CHARS  and len(t) >= MIN_CHARS:
-                out.append(t)
+    for spec, threshold in zip(specs, thresholds):
+        mask = (lens >= spec["min_chars"]) & (lens <= spec["max_chars"])
+        n = int(mask.sum())
+        if not n:
+            out.append((0, []))
+            continue
+        seed = spec["seed"]
+        if seed not in keys_by_seed:
+            keys_by_seed[seed] = reservoir_keys(texts, seed)
+        out.append((n, topk_keyed(keys_by_seed[seed][mask], values[mask], spec_k(spec), threshold)))
     return out
 
-def reservoir_update(reservoir: list[str], candidates: list[str], k: int, seen: int) -> int:
-    # Standard reservoir sampling across a stream
-    for t in candidates:
-        seen += 1
-        if len(reservoir) < k:
-            reservoir.append(t)
-        else:
-            j = random.randint(1, seen)
-            if j <= k:
-                reservoir[j - 1] = t
-    return seen
+def sample_chunk(df: pd.DataFrame, specs: list[dict], thresholds: list) -> tuple[int, list[tuple[int, list[tuple]]]]:
+    # Worker side: filter per lang once, then keep only this chunk's top-k per spec
+    results: list = [None] * len(specs)
+    for lang in {spec["lang"] for spec in specs}:
+        idx = [i for i, spec in enumerate(specs) if spec["lang"] == lang]
+        texts = clean_texts(df, lang)
+        for i, r in zip(idx, sample_texts(texts, [specs[i] for i in idx], [thresholds[i] for i in idx])):
+            results[i] = r
+    return len(df), results
 
-def main():
-    reservoir: list[str] = []
-    seen = 0
+# ---------------- Byte-range splits (--byte-ranges) ----------------
+# Workers open the CSV themselves and parse only their slice, so parsing runs
+# on every core instead of in the parent. Slices must start at a record
+# boundary: a newline that is not inside a quoted field. In RFC 4180 CSV an
+# escaped quote is written "", so "inside quotes" is exactly "odd number of
+# quote bytes so far" — phase 1 counts quotes per slice in parallel, the
+# parent prefix-sums the parity, then nudges each boundary forward to the
+# next unquoted newline. 0x22 never occurs inside a UTF-8 multibyte sequence.
 
-    # Stream-read in chunks and process in parallel
-    chunk_iter = pd.read_csv(
-        INPUT_CSV,
+READ_BLOCK = 16 * 1_048_576
+
+def count_quotes(path: str, start: int, end: int) -> int:
+    n = 0
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            n += block.count(b'"')
+            remaining -= len(block)
+    return n
+
+def next_record_start(path: str, pos: int, in_quote: bool) -> int:
+    """First offset >= pos that begins a record, given quote state at pos."""
+    with open(path, "rb") as f:
+        f.seek(pos)
+        offset = pos
+        while True:
+            block = f.read(1_048_576)
+            if not block:
+                return offset
+            i = 0
+            while True:
+                nl = block.find(b"\n", i)
+                if nl < 0:
+                    in_quote ^= block.count(b'"', i) % 2 == 1
+                    break
+                in_quote ^= block.count(b'"', i, nl) % 2 == 1
+                if not in_quote:
+                    return offset + nl + 1
+                i = nl + 1
+            offset += len(block)
+
+def plan_byte_ranges(ex: ProcessPoolExecutor, path: str, range_bytes: int = RANGE_BYTES) -> tuple[list[str], list[tuple[int, int]]]:
+    header = list(pd.read_csv(path, nrows=0, encoding="utf-8").columns)
+    size = os.path.getsize(path)
+    body_start = next_record_start(path, 0, False)
+    raw = list(range(body_start, size, range_bytes)) + [size]
+    counts = list(ex.map(count_quotes, [path] * (len(raw) - 1), raw[:-1], raw[1:]))
+    bounds = [body_start]
+    parity = 0
+    for b, c in zip(raw[1:-1], counts):
+        parity ^= c % 2
+        aligned = next_record_start(path, b, parity == 1)
+        if aligned > bounds[-1]:
+            bounds.append(aligned)
+    if size > bounds[-1]:
+        bounds.append(size)
+    return header, list(zip(bounds[:-1], bounds[1:]))
+
+def sample_byte_range(path: str, start: int, end: int, header: list[str],
+                      specs: list[dict], thresholds: list) -> tuple[int, list[tuple[int, list[tuple]]]]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    df = pd.read_csv(
+        io.BytesIO(data),
+        header=None,
+        names=header,
         usecols=["lang", "text"],
-        chunksize=CHUNKSIZE,
         encoding="utf-8",
-        low_memory=True,
     )
+    del data
+    return sample_chunk(df, specs, thresholds)
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is KB on Linux, bytes on macOS; resource is unavailable on Windows
+    try:
+        import resource
+    except ImportError:
+        return {}
+    scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+    return {
+        "parent": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "workers": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+def stream_tasks(ex: ProcessPoolExecutor, fn, items, max_in_flight: int, submit_args=tuple):
+    """
+    Submit fn(*item, *submit_args()) for each item, keeping at most
+    max_in_flight tasks pending; the next item (e.g. the next CSV chunk) is
+    only pulled from the iterator once a slot frees. submit_args() supplies
+    arguments at submit time (e.g. the current reservoir threshold).
+    Yields results as they complete.
+    """
+    pending = set()
+    for item in items:
+        pending.add(ex.submit(fn, *item, *submit_args()))
+        del item
+        if max_in_flight and len(pending) >= max_in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+    for fut in as_completed(pending):
+        yield fut.result()
+
+def write_spec(spec: dict, reservoir: list[tuple]) -> list[int]:
+    # Final sampled texts in key order, cut consecutively into the spec's splits
+    sampled = [t for _, t in reservoir[:spec_k(spec)]]
+    written = []
+    start = 0
+    for size, path in zip(spec["splits"], spec["outputs"]):
+        part = sampled[start:start + size]
+        start += size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n\n\n".join(part))
+        written.append(len(part))
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Reservoir sample Irish debate lines.")
+    parser.add_argument("--specs", default=None,
+                        help="JSON file with a list of sample specs (see DEFAULT_SPEC); all are filled in one pass")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help="Max CSV chunks / byte ranges queued to workers at once (0 = unbounded)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--byte-ranges", action="store_true",
+                        help="Workers parse their own byte range of the CSV instead of the parent")
+    parser.add_argument("--range-bytes", type=int, default=RANGE_BYTES)
+    args = parser.parse_args()
+
+    specs = load_specs(args.specs)
+    reservoirs: list[list[tuple]] = [[] for _ in specs]  # (key, text), key-descending
+    seen = [0] * len(specs)
+    stats = {"rows": 0}
+    t0 = time.perf_counter()
+
+    def thresholds() -> list:
+        return [reservoir_threshold(r, spec_k(spec)) for r, spec in zip(reservoirs, specs)]
+
+    def merge(results: list[tuple[int, list[tuple]]], idx: list[int]):
+        for i, (n_candidates, part) in zip(idx, results):
+            seen[i] += n_candidates
+            reservoirs[i] = merge_reservoirs(spec_k(specs[i]), reservoirs[i], part)
+
+    langs = sorted({spec["lang"] for spec in specs})
+    if all(parquet_available(INPUT_PARQUET, lang) for lang in langs):
+        # lang partition only, text column only, row groups pruned on text_len
+        source = INPUT_PARQUET
+        for lang in langs:
+            idx = [i for i, spec in enumerate(specs) if spec["lang"] == lang]
+            lo = min(specs[i]["min_chars"] for i in idx)
+            hi = max(specs[i]["max_chars"] for i in idx)
+            for texts in iter_ga_texts(lo, hi, INPUT_PARQUET, lang=lang):
+                stats["rows"] += len(texts)  # rows left after partition and row-group pruning
+                th = thresholds()
+                merge(sample_texts(pd.Series(texts, dtype=object), [specs[i] for i in idx], [th[i] for i in idx]), idx)
+    else:
+        source = INPUT_CSV
+        with ProcessPoolExecutor(max_workers=args.workers) as ex:
+            if args.byte_ranges:
+                header, ranges = plan_byte_ranges(ex, INPUT_CSV, args.range_bytes)
+                print(f"Split {INPUT_CSV} into {len(ranges)} byte ranges")
+                fn = sample_byte_range
+                items = ((INPUT_CSV, start, end, header) for start, end in ranges)
+            else:
+                # Stream-read in chunks in the parent and filter in parallel
+                chunk_iter = pd.read_csv(
+                    INPUT_CSV,
+                    usecols=["lang", "text"],
+                    chunksize=CHUNKSIZE,
+                    encoding="utf-8",
+                    low_memory=True,
+                )
+                fn = sample_chunk
+                items = ((chunk,) for chunk in chunk_iter)
+
+            submit_args = lambda: (specs, thresholds())
+            all_idx = list(range(len(specs)))
+            for n_rows, results in stream_tasks(ex, fn, items, args.max_in_flight, submit_args):
+                stats["rows"] += n_rows
+                merge(results, all_idx)
+    elapsed = time.perf_counter() - t0
 
-    with ProcessPoolExecutor() as ex:
-        futures = []
-        for chunk in chunk_iter:
-            futures.append(ex.submit(filter_chunk, chunk))
-
-        for fut in as_completed(futures):
-            texts = fut.result()
-            if texts:
-                seen = reservoir_update(reservoir, texts, SAMPLE_SIZE, seen)
-
-    # Final sampled texts
-    sampled = reservoir[:SAMPLE_SIZE]
-    # Split into 50 and 20
-    part1 = sampled[:120]
-    part2 = sampled[120:160]
-
-    with open(OUT1, "w", encoding="utf-8") as f:
-        f.write("\n\n\n".join(part1))
-    with open(OUT2, "w", encoding="utf-8") as f:
-        f.write("\n\n\n".join(part2))
-
-    print(f"Input: {INPUT_CSV}")
-    print(f"Seen GA texts: {seen}, sampled: {len(sampled)}")
-    print(f"Wrote {len(part1)} to {OUT1}")
-    print(f"Wrote {len(part2)} to {OUT2}")
+    print(f"Input: {source}")
+    for spec, reservoir, n in zip(specs, reservoirs, seen):
+        written = write_spec(spec, reservoir)
+        print(f"[{spec['name']}] lang={spec['lang']} len={spec['min_chars']}-{spec['max_chars']} seed={spec['seed']}: "
+              f"seen {n}, sampled {sum(written)}")
+        for size, path in zip(written, spec["outputs"]):
+            print(f"  Wrote {size} to {path}")
+    if stats["rows"]:
+        print(f"Rows read: {stats['rows']} in {elapsed:.1f}s ({stats['rows'] / max(elapsed, 1e-9):,.0f} rows/sec)")
+    rss = peak_rss_mb()
+    if rss:
+        print(f"Peak RSS: parent {rss['parent']:.0f} MB, largest worker {rss['workers']:.0f} MB")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
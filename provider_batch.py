@@ -0,0 +1,304 @@
+# Provider batch APIs for bulk offline jobs (no interactive latency, ~50% price,
+# no per-minute quotas):
+#   openai     Batch API: JSONL of /v1/chat/completions requests, file upload
+#   anthropic  Message Batches: requests posted inline
+#   google     Gemini API batch: JSONL file upload (keyed requests), or, with
+#              gcs_uri set, Vertex batch prediction from/to Cloud Storage
+#
+# One batch per (provider, model). Submitted job ids are checkpointed to a JSON
+# file straight after submission, so an interrupted run resumes polling the same
+# jobs instead of resubmitting. Results are handed to on_result(provider, model,
+# custom_id, obj, error) where obj is the JSON object the model returned; it
+# returns True when the result was accepted. Each result is also recorded in
+# the token/cost ledger (llm_ledger.py) at batch prices.
+#
+# Endpoints come from OPENAI_BASE_URL / ANTHROPIC_BASE_URL / GEMINI_BASE_URL,
+# so a local stand-in server can be used for dry runs.
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import llm_ledger
+from rate_limiter import extract_usage
+
+POLL_SEC = 60.0
+WORK_DIR = Path("./outputs/batch")
+
+OPENAI_ENDPOINT = "/v1/chat/completions"
+# terminal job states per provider -> "done" (results available) or "failed"
+_OPENAI_STATES = {"completed": "done", "failed": "failed", "expired": "done", "cancelled": "done"}
+_GOOGLE_STATES = {"JOB_STATE_SUCCEEDED": "done", "JOB_STATE_PARTIALLY_SUCCEEDED": "done",
+                  "JOB_STATE_FAILED": "failed", "JOB_STATE_CANCELLED": "failed", "JOB_STATE_EXPIRED": "failed"}
+
+Request = Tuple[str, dict]  # (custom_id, provider-specific request body)
+
+
+# ----------------------- Clients / request bodies -----------------------
+def make_client(provider: str, api_key: Optional[str] = None, **kw):
+    """Shared sync client for batch calls (llm_clients); base URL from the environment."""
+    import llm_clients
+    if provider == "openai":
+        return llm_clients.openai_client(api_key)
+    if provider == "anthropic":
+        return llm_clients.anthropic_client(api_key)
+    if provider == "google":
+        return llm_clients.genai_client(api_key, project=kw.get("project"), location=kw.get("location"))
+    raise ValueError(f"unknown provider {provider!r}")
+
+
+def openai_body(model: str, prompt: str, **params) -> dict:
+    return {"model": model, "messages": [{"role": "user", "content": prompt}], **params}
+
+
+def anthropic_params(model: str, prompt: str, **params) -> dict:
+    return {"model": model, "messages": [{"role": "user", "content": prompt}], **params}
+
+
+def google_request(prompt: str, generation_config: Optional[dict] = None) -> dict:
+    req = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    if generation_config:
+        req["generationConfig"] = generation_config
+    return req
+
+
+# ----------------------- Result parsing -----------------------
+def _loads(text: Optional[str]):
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def _dump(obj) -> dict:
+    return obj.model_dump() if hasattr(obj, "model_dump") else obj
+
+
+def extract_json(provider: str, response) -> Optional[dict]:
+    """The JSON object a (structured-output) response carries, or None."""
+    response = _dump(response) or {}
+    if provider == "openai":
+        choices = response.get("choices") or [{}]
+        return _loads((choices[0].get("message") or {}).get("content"))
+    if provider == "anthropic":
+        for block in response.get("content") or []:
+            if block.get("type") == "tool_use":
+                return block.get("input")
+        return _loads("".join(b.get("text", "") for b in response.get("content") or []))
+    if provider == "google":
+        cands = response.get("candidates") or [{}]
+        parts = (cands[0].get("content") or {}).get("parts") or []
+        return _loads("".join(p.get("text", "") for p in parts))
+    raise ValueError(f"unknown provider {provider!r}")
+
+
+_GOOGLE_USAGE_KEYS = {"promptTokenCount": "prompt_token_count", "candidatesTokenCount": "candidates_token_count",
+                      "thoughtsTokenCount": "thoughts_token_count",
+                      "cachedContentTokenCount": "cached_content_token_count"}
+
+
+def batch_usage(provider: str, response) -> Dict[str, int]:
+    """extract_usage for batch result payloads (Gemini/Vertex JSONL is camelCase)."""
+    response = _dump(response) or {}
+    if provider == "google" and "usageMetadata" in response:
+        meta = response["usageMetadata"]
+        response = {"usage_metadata": {_GOOGLE_USAGE_KEYS.get(k, k): v for k, v in meta.items()}}
+    return extract_usage(provider, response)
+
+
+# ----------------------- Submit / poll / fetch -----------------------
+def _write_jsonl(path: Path, lines: List[dict]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for obj in lines:
+            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+
+def _gcs_bucket(gcs_uri: str):
+    from google.cloud import storage  # only needed for Vertex batch
+    bucket, _, prefix = gcs_uri[len("gs://"):].partition("/")
+    return storage.Client().bucket(bucket), prefix.rstrip("/")
+
+
+def submit(provider: str, client, model: str, requests: List[Request], name: str,
+           gcs_uri: Optional[str] = None) -> str:
+    """Submit one batch; returns the provider job id."""
+    if provider == "openai":
+        path = WORK_DIR / f"{name}.jsonl"
+        _write_jsonl(path, [{"custom_id": cid, "method": "POST", "url": OPENAI_ENDPOINT, "body": body}
+                            for cid, body in requests])
+        with open(path, "rb") as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        return client.batches.create(input_file_id=uploaded.id, endpoint=OPENAI_ENDPOINT,
+                                     completion_window="24h").id
+    if provider == "anthropic":
+        return client.messages.batches.create(
+            requests=[{"custom_id": cid, "params": params} for cid, params in requests]).id
+    if provider == "google":
+        path = WORK_DIR / f"{name}.jsonl"
+        if gcs_uri:
+            # Vertex echoes each request in its output; labels carry the id
+            _write_jsonl(path, [{"request": {**req, "labels": {"custom_id": cid}}} for cid, req in requests])
+            bucket, prefix = _gcs_bucket(gcs_uri)
+            bucket.blob(f"{prefix}/{name}.jsonl").upload_from_filename(str(path))
+            job = client.batches.create(model=model, src=f"{gcs_uri.rstrip('/')}/{name}.jsonl",
+                                        config={"display_name": name, "dest": f"{gcs_uri.rstrip('/')}/{name}-out"})
+        else:
+            _write_jsonl(path, [{"key": cid, "request": req} for cid, req in requests])
+            uploaded = client.files.upload(file=str(path), config={"display_name": name, "mime_type": "jsonl"})
+            job = client.batches.create(model=model, src=uploaded.name, config={"display_name": name})
+        return job.name
+    raise ValueError(f"unknown provider {provider!r}")
+
+
+def poll(provider: str, client, job_id: str) -> str:
+    """'running', 'done' or 'failed'."""
+    if provider == "openai":
+        return _OPENAI_STATES.get(client.batches.retrieve(job_id).status, "running")
+    if provider == "anthropic":
+        return "done" if client.messages.batches.retrieve(job_id).processing_status == "ended" else "running"
+    if provider == "google":
+        state = client.batches.get(name=job_id).state
+        return _GOOGLE_STATES.get(getattr(state, "name", str(state)), "running")
+    raise ValueError(f"unknown provider {provider!r}")
+
+
+def fetch_results(provider: str, client, job_id: str,
+                  gcs_uri: Optional[str] = None) -> Iterator[Tuple[str, Optional[dict], Optional[str], dict]]:
+    """Yields (custom_id, obj, error, usage) for every request of a finished job."""
+    if provider == "openai":
+        b = client.batches.retrieve(job_id)
+        for file_id in (b.output_file_id, b.error_file_id):
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                resp = rec.get("response") or {}
+                if resp.get("status_code") == 200:
+                    body = resp.get("body")
+                    yield rec["custom_id"], extract_json(provider, body), None, batch_usage(provider, body)
+                else:
+                    yield rec["custom_id"], None, str(rec.get("error") or resp.get("body")), {}
+        return
+    if provider == "anthropic":
+        for rec in client.messages.batches.results(job_id):
+            if rec.result.type == "succeeded":
+                msg = rec.result.message
+                yield rec.custom_id, extract_json(provider, msg), None, batch_usage(provider, msg)
+            else:
+                yield rec.custom_id, None, rec.result.type, {}
+        return
+    if provider == "google":
+        job = client.batches.get(name=job_id)
+        if gcs_uri:
+            bucket, _ = _gcs_bucket(gcs_uri)
+            out_prefix = job.dest.gcs_uri[len("gs://"):].partition("/")[2]
+            lines = []
+            for blob in bucket.list_blobs(prefix=out_prefix):
+                if blob.name.endswith(".jsonl"):
+                    lines.extend(blob.download_as_text().splitlines())
+        else:
+            lines = client.files.download(file=job.dest.file_name).decode("utf-8").splitlines()
+        for line in lines:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            cid = rec.get("key") or ((rec.get("request") or {}).get("labels") or {}).get("custom_id")
+            if rec.get("response"):
+                yield cid, extract_json(provider, rec["response"]), None, batch_usage(provider, rec["response"])
+            else:
+                yield cid, None, str(rec.get("error") or rec.get("status")), {}
+        return
+    raise ValueError(f"unknown provider {provider!r}")
+
+
+# ----------------------- Checkpointed driver -----------------------
+def load_checkpoint(path: Path) -> dict:
+    if Path(path).exists():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"batches": []}
+
+
+def save_checkpoint(path: Path, state: dict):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def run_batches(groups: Dict[Tuple[str, str], List[Request]], clients: Dict[str, object],
+                checkpoint_path: Path, on_result: Callable[[str, str, str, Optional[dict], Optional[str]], Optional[bool]],
+                poll_sec: float = POLL_SEC, gcs_uri: Optional[str] = None,
+                kind: str = "generate", sync: Optional[Callable[[], None]] = None) -> Dict[str, int]:
+    """
+    Submit one batch per (provider, model) for requests not already in an open
+    (submitted, not yet ingested) batch, then poll every open batch until all
+    finish, ingesting results as each one completes. on_result must be
+    idempotent: a crash mid-ingest re-delivers that batch on the next run.
+    sync() must make everything on_result wrote durable; it runs before a
+    batch is checkpointed as ingested, so results are never lost to a crash.
+    """
+    state = load_checkpoint(checkpoint_path)
+    stats = {"submitted": 0, "resumed": 0, "results": 0, "errors": 0, "failed_batches": 0}
+    open_ids = {(b["provider"], b["model"], cid)
+                for b in state["batches"] if b["status"] == "submitted" for cid in b["custom_ids"]}
+    stats["resumed"] = sum(b["status"] == "submitted" for b in state["batches"])
+
+    for (provider, model), requests in groups.items():
+        new = [(cid, body) for cid, body in requests if (provider, model, cid) not in open_ids]
+        if not new:
+            continue
+        name = f"{provider}-{model}-{time.strftime('%Y%m%d-%H%M%S')}".replace(".", "-").replace("/", "-")
+        job_id = submit(provider, clients[provider], model, new, name, gcs_uri)
+        state["batches"].append({"provider": provider, "model": model, "job_id": job_id, "name": name,
+                                 "custom_ids": [cid for cid, _ in new], "status": "submitted",
+                                 "submitted_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+        save_checkpoint(checkpoint_path, state)
+        stats["submitted"] += 1
+        print(f"Submitted {provider}/{model} batch {job_id} ({len(new)} requests)")
+
+    while True:
+        pending = [b for b in state["batches"] if b["status"] == "submitted"]
+        if not pending:
+            break
+        for b in pending:
+            provider, client = b["provider"], clients[b["provider"]]
+            status = poll(provider, client, b["job_id"])
+            if status == "running":
+                continue
+            if status == "done":
+                for cid, obj, err, usage in fetch_results(provider, client, b["job_id"], gcs_uri):
+                    stats["results" if obj is not None else "errors"] += 1
+                    accepted = on_result(provider, b["model"], cid, obj, err)
+                    llm_ledger.record(kind, provider, b["model"], usage, ok=bool(accepted), batch=True)
+                if sync is not None:
+                    sync()
+                b["status"] = "ingested"
+            else:
+                # requests stay pending and are resubmitted by the next run
+                b["status"] = "failed"
+                stats["failed_batches"] += 1
+                print(f"[WARN] batch {b['job_id']} ({provider}/{b['model']}) failed")
+            b["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            save_checkpoint(checkpoint_path, state)
+            print(f"Batch {b['job_id']} {b['status']}")
+        if any(b["status"] == "submitted" for b in state["batches"]):
+            print(f"{sum(b['status'] == 'submitted' for b in state['batches'])} batch(es) running; "
+                  f"next poll in {poll_sec:.0f}s (safe to interrupt, rerun resumes)")
+            time.sleep(poll_sec)
+    return stats
+
+
+def add_batch_args(parser):
+    parser.add_argument("--batch", action="store_true",
+                        help="Use provider batch APIs (submit, poll, ingest) instead of live calls")
+    parser.add_argument("--batch-poll", type=float, default=POLL_SEC, help="Seconds between batch status polls")
@@ -0,0 +1,241 @@
+# Quota-aware rate limiting for provider calls.
+# One limiter per (provider, model) with two token buckets:
+#   - requests: refills at RPM/60 per second
+#   - tokens:   refills at TPM/60 per second
+# Callers reserve (1 request, estimated tokens) before sending, reconcile the
+# estimate against the usage reported in the response, and report 429s so a
+# Retry-After pauses every caller of that model, not just the one that failed.
+#
+# Buckets go into debt instead of refusing: a reservation debits immediately and
+# returns how long to wait, so concurrent callers queue fairly in arrival order.
+#
+#   est = acquire("openai", "gpt-5", prompt)          # blocks until allowed
+#   r = client.responses.create(...)
+#   record_usage("openai", "gpt-5", est, r)
+#   ...
+#   except Exception as e: time.sleep(on_error("openai", "gpt-5", e, RETRY_SLEEP))
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+QUOTAS_PATH = "quotas.json"  # optional overrides: {"openai/gpt-5": {"rpm": 500, "tpm": 500000}}
+# Conservative defaults; set the account's real limits in quotas.json
+DEFAULT_QUOTAS: Dict[str, Dict[str, int]] = {
+    "openai/gpt-5": {"rpm": 500, "tpm": 500_000},
+    "openai/gpt-5-mini": {"rpm": 500, "tpm": 500_000},
+    "anthropic/claude-sonnet-4-20250514": {"rpm": 50, "tpm": 30_000},
+    "anthropic/claude-3-5-haiku-20241022": {"rpm": 50, "tpm": 50_000},
+    "google/gemini-2.5-pro": {"rpm": 150, "tpm": 2_000_000},
+    "google/gemini-2.5-flash": {"rpm": 1_000, "tpm": 1_000_000},
+}
+FALLBACK_QUOTA = {"rpm": 60, "tpm": 100_000}
+# Bucket capacity in seconds of quota: small bursts are fine, a full minute's
+# quota at once is what triggers 429 storms
+BURST_SECONDS = 10
+CHARS_PER_TOKEN = 3.0  # Irish tokenizes worse than English; over-estimate
+DEFAULT_MAX_OUTPUT = 800
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Debit amount (may go negative) and return seconds until it is covered."""
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def credit(self, amount: float, now: float):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class ModelLimiter:
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm, self.tpm = rpm, tpm
+        self.requests = TokenBucket(rpm / 60.0, max(1.0, rpm * BURST_SECONDS / 60.0))
+        self.tokens = TokenBucket(tpm / 60.0, max(1.0, tpm * BURST_SECONDS / 60.0))
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "waited_s": 0.0, "retry_after": 0, "est_tokens": 0, "actual_tokens": 0}
+
+    def reserve(self, tokens: int) -> float:
+        with self.lock:
+            now = time.monotonic()
+            wait = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                self.blocked_until - now,
+            )
+            self.stats["requests"] += 1
+            self.stats["waited_s"] += wait
+            self.stats["est_tokens"] += tokens
+            return wait
+
+    def reconcile(self, estimated: int, actual: int):
+        # give back over-estimates, charge under-estimates
+        with self.lock:
+            self.tokens.credit(estimated - actual, time.monotonic())
+            self.stats["actual_tokens"] += actual
+
+    def penalize(self, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.stats["retry_after"] += 1
+
+
+_limiters: Dict[Tuple[str, str], ModelLimiter] = {}
+_registry_lock = threading.Lock()
+_quotas: Optional[Dict[str, Dict[str, int]]] = None
+
+
+def load_quotas(path: str = QUOTAS_PATH) -> Dict[str, Dict[str, int]]:
+    quotas = dict(DEFAULT_QUOTAS)
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            quotas.update(json.load(f))
+    return quotas
+
+
+def get_limiter(provider: str, model: str) -> ModelLimiter:
+    global _quotas
+    key = (provider, model)
+    with _registry_lock:
+        if key not in _limiters:
+            if _quotas is None:
+                _quotas = load_quotas()
+            q = _quotas.get(f"{provider}/{model}", FALLBACK_QUOTA)
+            _limiters[key] = ModelLimiter(q["rpm"], q["tpm"])
+        return _limiters[key]
+
+
+def estimate_tokens(prompt: str, max_output: int = DEFAULT_MAX_OUTPUT) -> int:
+    # TPM limits count input plus the requested output budget
+    return int(len(prompt) / CHARS_PER_TOKEN) + max_output
+
+
+def acquire(provider: str, model: str, prompt: str, max_output: int = DEFAULT_MAX_OUTPUT) -> int:
+    """Block until the call fits the quota; returns the token estimate to reconcile."""
+    est = estimate_tokens(prompt, max_output)
+    wait = get_limiter(provider, model).reserve(est)
+    if wait > 0:
+        time.sleep(wait)
+    return est
+
+
+async def acquire_async(provider: str, model: str, prompt: str, max_output: int = DEFAULT_MAX_OUTPUT) -> int:
+    est = estimate_tokens(prompt, max_output)
+    wait = get_limiter(provider, model).reserve(est)
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return est
+
+
+def _get(obj, *names, default=0):
+    # attribute-or-key lookup along a path, tolerant of missing fields
+    for n in names:
+        if obj is None:
+            return default
+        obj = obj.get(n) if isinstance(obj, dict) else getattr(obj, n, None)
+    return default if obj is None else obj
+
+
+def extract_usage(provider: str, response) -> Dict[str, int]:
+    """Normalized {input, output, cached} token counts from a provider response."""
+    if provider == "openai":
+        u = _get(response, "usage", default=None)
+        if _get(u, "input_tokens", default=None) is not None:  # Responses API
+            return {
+                "input": _get(u, "input_tokens"),
+                "output": _get(u, "output_tokens"),
+                "cached": _get(u, "input_tokens_details", "cached_tokens"),
+            }
+        return {  # Chat Completions
+            "input": _get(u, "prompt_tokens"),
+            "output": _get(u, "completion_tokens"),
+            "cached": _get(u, "prompt_tokens_details", "cached_tokens"),
+        }
+    if provider == "anthropic":
+        u = _get(response, "usage", default=None)
+        cached = _get(u, "cache_read_input_tokens")
+        return {
+            # input_tokens excludes cache reads/writes; report the full prompt
+            "input": _get(u, "input_tokens") + cached + _get(u, "cache_creation_input_tokens"),
+            "output": _get(u, "output_tokens"),
+            "cached": cached,
+        }
+    if provider == "google":
+        u = _get(response, "usage_metadata", default=None)
+        return {
+            "input": _get(u, "prompt_token_count"),
+            "output": _get(u, "candidates_token_count") + _get(u, "thoughts_token_count"),
+            "cached": _get(u, "cached_content_token_count"),
+        }
+    return {"input": 0, "output": 0, "cached": 0}
+
+
+def record_usage(provider: str, model: str, estimated: int, response) -> Dict[str, int]:
+    usage = extract_usage(provider, response)
+    actual = usage["input"] + usage["output"]
+    if actual:
+        get_limiter(provider, model).reconcile(estimated, actual)
+    return usage
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Retry-After from an SDK exception (OpenAI/Anthropic headers, Gemini RetryInfo)."""
+    headers = _get(exc, "response", "headers", default=None)
+    if headers is not None:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            try:
+                return float(ms) / 1000.0
+            except ValueError:
+                pass
+        ra = headers.get("retry-after")
+        if ra:
+            try:
+                return float(ra)
+            except ValueError:
+                pass  # HTTP-date form: fall through to default backoff
+    # google.genai / google.api_core: "retryDelay": "7s" somewhere in the details
+    m = re.search(r"retry[_ ]?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(exc), re.IGNORECASE)
+    if m:
+        return float(m.group(1))
+    return None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    code = _get(exc, "status_code", default=None) or _get(exc, "code", default=None)
+    return code == 429 or "429" in str(exc)[:200] or "RESOURCE_EXHAUSTED" in str(exc)[:500]
+
+
+def on_error(provider: str, model: str, exc: BaseException, default_sleep: float) -> float:
+    """
+    Seconds to wait before retrying. A Retry-After (or bare 429) pauses the
+    whole (provider, model) limiter so other in-flight callers back off too.
+    """
+    ra = retry_after_seconds(exc)
+    if ra is None and is_rate_limited(exc):
+        ra = default_sleep
+    if ra is not None:
+        get_limiter(provider, model).penalize(ra)
+        return ra
+    return default_sleep
+
+
+def limiter_stats() -> Dict[str, Dict[str, float]]:
+    return {f"{p}/{m}": dict(l.stats) for (p, m), l in _limiters.items()}
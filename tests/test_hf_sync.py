@@ -0,0 +1,119 @@
+# Shard upload, resume, tombstones and compaction with LocalHub standing in for the Hub.
+import pandas as pd
+import pytest
+
+import hf_sync
+
+MAIN = "annotations_Wiki_Native.csv"
+KEYS = ["text_hash", "annotator_type"]
+
+
+def row(i, annotator="GPT_5", choice="A"):
+    return {"text_hash": f"h{i}", "annotator_type": annotator, "choice": choice}
+
+
+@pytest.fixture
+def hub(tmp_path):
+    return hf_sync.LocalHub(tmp_path / "hub")
+
+
+def make_sync(hub, tmp_path, **kw):
+    kw.setdefault("shard_rows", 3)
+    kw.setdefault("commit_seconds", 3600)  # uploads happen at close unless a test waits
+    return hf_sync.ShardSync(hub, MAIN, local_dir=tmp_path / "shards", **kw)
+
+
+def test_shards_upload_in_one_commit(hub, tmp_path, monkeypatch):
+    commits = []
+    real_commit = hub.commit
+
+    def commit(adds, deletes, message):
+        commits.append(sorted(adds))
+        real_commit(adds, deletes, message)
+
+    monkeypatch.setattr(hub, "commit", commit)
+    sync = make_sync(hub, tmp_path)
+    for i in range(7):
+        sync.add(row(i))
+    assert sync.close()
+    assert len(commits) == 1 and len(commits[0]) == 3  # 3 + 3 + 1 rows
+    assert hf_sync.list_shards(hub.list_files(), MAIN) == commits[0]
+    assert not list((tmp_path / "shards").iterdir())
+    assert sorted(hf_sync.load_all(hub, MAIN, KEYS)["text_hash"]) == sorted(f"h{i}" for i in range(7))
+
+
+def test_failed_upload_is_resumed_by_next_run(hub, tmp_path, monkeypatch):
+    def offline(*args):
+        raise OSError("offline")
+
+    sync = make_sync(hub, tmp_path)
+    monkeypatch.setattr(hub, "commit", offline)
+    for i in range(4):
+        sync.add(row(i))
+    assert not sync.close()
+    assert len(list((tmp_path / "shards").iterdir())) == 2
+    monkeypatch.undo()
+
+    # the votes left locally count as done before they are re-uploaded
+    assert len(hf_sync.load_all(hub, MAIN, KEYS)) == 0
+    assert len(hf_sync.load_all(hub, MAIN, KEYS, local_dir=tmp_path / "shards")) == 4
+
+    assert make_sync(hub, tmp_path).close()
+    assert len(hf_sync.load_all(hub, MAIN, KEYS)) == 4
+    assert not list((tmp_path / "shards").iterdir())
+
+
+def test_last_row_wins_and_tombstones(hub, tmp_path):
+    pd.DataFrame([row(0), row(1), row(2)]).to_csv(hub.root / MAIN, index=False)
+    sync = make_sync(hub, tmp_path)
+    sync.add(row(0, choice="B"))                           # replacement
+    sync.delete({"text_hash": "h1", "annotator_type": "GPT_5"})  # no replacement
+    sync.delete({"text_hash": "h2", "annotator_type": "GPT_5"})
+    sync.add(row(2, choice="B"))                           # re-added after the tombstone
+    assert sync.close()
+    df = hf_sync.load_all(hub, MAIN, KEYS)
+    assert hf_sync.TOMBSTONE_COL not in df.columns
+    assert dict(zip(df["text_hash"], df["choice"])) == {"h0": "B", "h2": "B"}
+
+
+def test_compact_folds_shards_into_main_file(hub, tmp_path):
+    pd.DataFrame([row(0), row(1)]).to_csv(hub.root / MAIN, index=False)
+    sync = make_sync(hub, tmp_path)
+    sync.add(row(0, choice="B"))
+    sync.add(row(3))
+    sync.delete({"text_hash": "h1", "annotator_type": "GPT_5"})
+    sync.add(row(4, annotator="Aggregate_LLM"))
+    assert sync.close()
+    before = hf_sync.load_all(hub, MAIN, KEYS)
+
+    assert hf_sync.compact(hub, MAIN, KEYS, columns=["annotator_type", "text_hash"]) == 2
+    assert hub.list_files() == [MAIN]
+    main = pd.read_csv(hub.root / MAIN)
+    assert list(main.columns) == ["annotator_type", "text_hash", "choice"]
+    pd.testing.assert_frame_equal(main[before.columns].sort_values("text_hash").reset_index(drop=True),
+                                  before.sort_values("text_hash").reset_index(drop=True), check_dtype=False)
+    assert hf_sync.compact(hub, MAIN, KEYS) == 0
+
+
+def test_background_thread_uploads_before_close(hub, tmp_path):
+    sync = make_sync(hub, tmp_path, shard_rows=2, commit_seconds=0.05)
+    sync.add(row(0))
+    sync.add(row(1))
+    for _ in range(100):
+        if hf_sync.list_shards(hub.list_files(), MAIN):
+            break
+        sync.stop.wait(0.05)
+    assert len(hf_sync.list_shards(hub.list_files(), MAIN)) == 1
+    assert sync.close()
+
+
+def test_compact_requires_key_columns(hub, tmp_path):
+    sync = make_sync(hub, tmp_path)
+    sync.add(row(0))
+    sync.delete({"text_hash": "h0", "annotator_type": "GPT_5"})
+    assert sync.close()
+    with pytest.raises(ValueError, match="key columns"):
+        hf_sync.compact(hub, MAIN)  # annotation keys are not in this file
+    assert len(hf_sync.list_shards(hub.list_files(), MAIN)) == 1
+    assert hf_sync.compact(hub, MAIN, KEYS) == 1
+    assert pd.read_csv(hub.root / MAIN).empty
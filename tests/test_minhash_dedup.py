@@ -0,0 +1,31 @@
+# LSH candidates and near-duplicate clustering.
+import numpy as np
+
+import minhash_dedup as md
+
+
+def test_false_positive_first_member_does_not_hide_duplicates():
+    # all three share band 0, the only band 1 and 2 share (they agree on one
+    # row of every other band); 0 is the false positive
+    rng = np.random.default_rng(0)
+    sigs = rng.integers(0, 1 << 32, size=(3, 8), dtype=np.uint64).astype(np.uint32)
+    sigs[:, :2] = sigs[0, :2]
+    sigs[2, 2::2] = sigs[1, 2::2]
+    pairs = md.candidate_pairs(sigs, bands=4, rows=2)
+    assert (1, 2) in pairs
+
+
+def test_bucket_window_caps_pairs():
+    sigs = np.zeros((200, 4), dtype=np.uint32)  # one bucket per band
+    pairs = md.candidate_pairs(sigs, bands=2, rows=2, window=5)
+    assert len(pairs) == sum(200 - k for k in range(1, 6))
+    assert all(0 < j - i <= 5 for i, j in pairs)
+
+
+def test_near_duplicates_keeps_first_of_cluster():
+    base = "Tá an Dáil ag plé an Bhille um Oideachas inniu agus tá go leor ceisteanna le freagairt. " * 3
+    texts = ["Rud eile ar fad, gan baint ar bith leis an gcuid eile den téacs seo anseo. " * 3,
+             base, base + "!", base.replace("inniu", "inné")]
+    keep, dropped = md.near_duplicates(texts, threshold=0.8, workers=1)
+    assert keep == [0, 1]
+    assert dropped == {2: 1, 3: 1}
@@ -0,0 +1,44 @@
+# Lang-partitioned Parquet conversion: each row group stays within one length
+# bucket across CSV chunks, so iter_ga_texts can prune on text_len.
+import random
+
+import pandas as pd
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+import oireachtas_parquet as op
+
+
+@pytest.fixture
+def debates_csv(tmp_path):
+    rng = random.Random(0)
+    rows = [{"lang": rng.choice(["ga", "ga", "en"]), "text": "a" * rng.randint(1, 2500)} for _ in range(3000)]
+    rows.append({"lang": "ga", "text": None})
+    path = tmp_path / "debates.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path, rows
+
+
+def test_row_groups_cover_one_length_bucket(debates_csv, tmp_path):
+    path, rows = debates_csv
+    out = tmp_path / "parquet"
+    counts = op.convert(str(path), str(out), chunksize=250, row_group_size=40)
+    assert counts == {"ga": sum(r["lang"] == "ga" for r in rows), "en": sum(r["lang"] == "en" for r in rows)}
+
+    meta = pq.ParquetFile(out / "lang=ga" / "part-0.parquet").metadata
+    col = meta.schema.to_arrow_schema().get_field_index("text_len")
+    edges = [0] + op.LENGTH_BUCKETS + [float("inf")]
+    for g in range(meta.num_row_groups):
+        stats = meta.row_group(g).column(col).statistics
+        assert any(lo <= stats.min and stats.max < hi for lo, hi in zip(edges, edges[1:]))
+
+
+def test_iter_ga_texts_window(debates_csv, tmp_path):
+    path, rows = debates_csv
+    out = tmp_path / "parquet"
+    op.convert(str(path), str(out), chunksize=250, row_group_size=40)
+    got = sorted(len(t) for batch in op.iter_ga_texts(200, 1000, str(out)) for t in batch)
+    want = sorted(len(r["text"]) for r in rows
+                  if r["lang"] == "ga" and r["text"] and 200 <= len(r["text"]) <= 1000)
+    assert got == want
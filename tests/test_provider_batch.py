@@ -0,0 +1,173 @@
+# Checkpointed batch driver against a local stand-in for the OpenAI Batch API
+# (file upload, batch create/retrieve, output file download).
+import email
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import llm_ledger
+import provider_batch as pb
+
+MODEL = "gpt-5"
+
+
+class BatchServer:
+    def __init__(self):
+        self.files, self.batches = {}, {}
+        self.created = 0
+        self.fail_next = False  # next batch ends "failed"
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, obj=None, raw=None):
+                body = raw if raw is not None else json.dumps(obj).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream" if raw is not None else "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                data = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.path.endswith("/files"):
+                    msg = email.message_from_bytes(
+                        b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + data)
+                    content = next(p.get_payload(decode=True) for p in msg.get_payload()
+                                   if p.get_param("name", header="content-disposition") == "file")
+                    return self._send(server.add_file(content))
+                if self.path.endswith("/batches"):
+                    return self._send(server.create(json.loads(data)))
+                self.send_error(404)
+
+            def do_GET(self):
+                parts = self.path.rstrip("/").split("/")
+                if parts[-1] == "content":
+                    return self._send(raw=server.files[parts[-2]])
+                if parts[-2] == "batches":
+                    return self._send(server.retrieve(parts[-1]))
+                self.send_error(404)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def add_file(self, content: bytes) -> dict:
+        fid = "file-" + uuid.uuid4().hex[:8]
+        self.files[fid] = content
+        return {"id": fid, "object": "file", "bytes": len(content), "created_at": 0,
+                "filename": "batch.jsonl", "purpose": "batch", "status": "processed"}
+
+    def create(self, req: dict) -> dict:
+        self.created += 1
+        out = []
+        for line in self.files[req["input_file_id"]].decode().splitlines():
+            r = json.loads(line)
+            prompt = r["body"]["messages"][0]["content"]
+            body = {"choices": [{"message": {"content": json.dumps({"instruction": prompt, "response": "Freagra"})}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+            out.append({"id": "r", "custom_id": r["custom_id"], "error": None,
+                        "response": {"status_code": 200, "body": body}})
+        bid = "batch_" + uuid.uuid4().hex[:8]
+        self.batches[bid] = {"polls": 0, "output": self.add_file("\n".join(map(json.dumps, out)).encode())["id"],
+                             "fail": self.fail_next}
+        self.fail_next = False
+        return self.retrieve(bid, poll=False)
+
+    def retrieve(self, bid: str, poll: bool = True) -> dict:
+        b = self.batches[bid]
+        b["polls"] += poll
+        status = "in_progress" if b["polls"] < 2 else ("failed" if b["fail"] else "completed")
+        return {"id": bid, "object": "batch", "endpoint": pb.OPENAI_ENDPOINT, "input_file_id": "f",
+                "completion_window": "24h", "status": status, "created_at": 0, "error_file_id": None,
+                "output_file_id": b["output"] if status == "completed" else None}
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(pb, "WORK_DIR", tmp_path / "batch")
+    monkeypatch.setattr(llm_ledger, "LEDGER_PATH", str(tmp_path / "ledger.jsonl"))
+    monkeypatch.setattr(llm_ledger, "_file", None)
+    s = BatchServer()
+    yield s
+    s.close()
+    if llm_ledger._file is not None:
+        llm_ledger._file.close()
+
+
+@pytest.fixture
+def client(server):
+    openai = pytest.importorskip("openai")
+    return openai.OpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+
+
+def groups(n: int = 4):
+    return {("openai", MODEL): [(f"c{i}", pb.openai_body(MODEL, f"prompt {i}")) for i in range(n)]}
+
+
+class Crash(Exception):
+    pass
+
+
+def test_resume_after_crash_mid_ingest(server, client, tmp_path):
+    ckpt = tmp_path / "batches.json"
+    got = {}
+
+    def crashing(provider, model, cid, obj, err):
+        if len(got) == 2:
+            raise Crash()
+        got[cid] = obj
+        return True
+
+    with pytest.raises(Crash):
+        pb.run_batches(groups(), {"openai": client}, ckpt, crashing, poll_sec=0)
+    state = pb.load_checkpoint(ckpt)
+    assert [b["status"] for b in state["batches"]] == ["submitted"]
+    job_id = state["batches"][0]["job_id"]
+
+    def on_result(provider, model, cid, obj, err):
+        got[cid] = obj  # idempotent: a re-delivered result overwrites
+        return True
+
+    stats = pb.run_batches(groups(), {"openai": client}, ckpt, on_result, poll_sec=0)
+    assert server.created == 1 and stats["submitted"] == 0 and stats["resumed"] == 1
+    assert sorted(got) == ["c0", "c1", "c2", "c3"]
+    assert got["c3"] == {"instruction": "prompt 3", "response": "Freagra"}
+    state = pb.load_checkpoint(ckpt)
+    assert [(b["job_id"], b["status"]) for b in state["batches"]] == [(job_id, "ingested")]
+
+    # everything ingested: a third run submits nothing new for the same ids
+    pb.run_batches({("openai", MODEL): []}, {"openai": client}, ckpt, on_result, poll_sec=0)
+    assert server.created == 1
+
+
+def test_sync_runs_before_ingested_checkpoint(server, client, tmp_path):
+    ckpt = tmp_path / "batches.json"
+    seen_at_sync = []
+
+    def sync():
+        seen_at_sync.append([b["status"] for b in pb.load_checkpoint(ckpt)["batches"]])
+
+    pb.run_batches(groups(), {"openai": client}, ckpt, lambda *a: True, poll_sec=0, sync=sync)
+    assert seen_at_sync == [["submitted"]]
+    assert pb.load_checkpoint(ckpt)["batches"][0]["status"] == "ingested"
+
+
+def test_failed_batch_is_resubmitted(server, client, tmp_path):
+    ckpt = tmp_path / "batches.json"
+    server.fail_next = True
+    got = set()
+    stats = pb.run_batches(groups(2), {"openai": client}, ckpt, lambda p, m, cid, o, e: got.add(cid), poll_sec=0)
+    assert stats["failed_batches"] == 1 and not got
+    pb.run_batches(groups(2), {"openai": client}, ckpt, lambda p, m, cid, o, e: got.add(cid), poll_sec=0)
+    assert server.created == 2 and got == {"c0", "c1"}
+    assert [b["status"] for b in pb.load_checkpoint(ckpt)["batches"]] == ["failed", "ingested"]